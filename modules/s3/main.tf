@@ -174,6 +174,18 @@ resource "aws_iam_role_policy" "scan_lambda" {
           "arn:aws:s3:::${local.tenant_bucket_prefix}*/*"
         ]
       },
+      # Reading objects of SSE-KMS encrypted tenant buckets
+      {
+        Effect   = "Allow",
+        Action   = ["kms:Decrypt"],
+        Resource = "*",
+        Condition = {
+          StringLike = {
+            "kms:ViaService"                   = "s3.*.amazonaws.com"
+            "kms:EncryptionContext:aws:s3:arn" = "arn:aws:s3:::${local.tenant_bucket_prefix}*"
+          }
+        }
+      },
       {
         Effect = "Allow",
         Action = [
@@ -219,14 +231,25 @@ resource "aws_cloudwatch_event_rule" "s3_object_created" {
   name        = "${var.project_name}-${var.environment}-s3-object-created"
   description = "Invoke scanner for tenant buckets"
 
+  # Tenant buckets deliver object events to EventBridge (enabled by the
+  # tenant provisioner); the key prefix filter is optional
   event_pattern = jsonencode({
     "source" : ["aws.s3"],
     "detail-type" : ["Object Created"],
-    "detail" : {
-      "bucket" : {
-        "name" : [{ "prefix" : local.tenant_bucket_prefix }]
+    "detail" : merge(
+      {
+        "bucket" : {
+          "name" : [{ "prefix" : local.tenant_bucket_prefix }]
+        }
+      },
+      {
+        for field, filter in {
+          "object" : {
+            "key" : [for prefix in var.scan_key_prefixes : { "prefix" : prefix }]
+          }
+        } : field => filter if length(var.scan_key_prefixes) > 0
       }
-    }
+    )
   })
 }
 
@@ -317,6 +340,22 @@ resource "aws_iam_policy" "tenant_bucket_data_access" {
             "s3:prefix" = "${local.tenant_bucket_prefix}*"
           }
         }
+      },
+      {
+        # Tenant buckets encrypted with SSE-KMS (shared or per-tenant keys)
+        Sid    = "AllowTenantBucketKeys"
+        Effect = "Allow",
+        Action = [
+          "kms:GenerateDataKey",
+          "kms:Decrypt"
+        ],
+        Resource = "*"
+        Condition = {
+          StringLike = {
+            "kms:ViaService"                   = "s3.*.amazonaws.com"
+            "kms:EncryptionContext:aws:s3:arn" = "arn:aws:s3:::${local.tenant_bucket_prefix}*"
+          }
+        }
       }
     ]
   })
@@ -11,3 +11,9 @@ variable "tenant_bucket_prefix_override" {
   type        = string
   default     = ""
 }
+
+variable "scan_key_prefixes" {
+  description = "Only scan objects whose keys start with one of these prefixes (default: every object)"
+  type        = list(string)
+  default     = []
+}
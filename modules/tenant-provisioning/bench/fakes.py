@@ -0,0 +1,790 @@
+"""
+In-process stand-ins for the services the provisioner talks to.
+
+- FakeS3:             the subset of the S3 client API used by the provisioner,
+                      keeping buckets, configuration, objects and object versions
+                      in memory
+- FakeSecretsManager: returns a fixed callback token
+- FakeLambda:         records asynchronous self-invocations (teardown continuations)
+- FakeSQS:            holds messages sent to the callback outbox
+- CallbackServer:     a local HTTP server standing in for the API callback endpoint
+
+Every stand-in counts calls and records per-operation latency. Latency and
+throttling are injectable. A throttled S3 call is retried with backoff inside
+the stand-in, as botocore's standard retry mode would, and only surfaces as
+SlowDown once max_attempts is exhausted. Like a botocore client, FakeS3
+emits before-send and needs-retry events around every attempt, so the
+provisioner's rate limiter (ratelimit.attach) works on it unchanged.
+"""
+
+import base64
+import bisect
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qsl
+
+
+class ClientError(Exception):
+    """Shape-compatible with botocore.exceptions.ClientError."""
+
+    def __init__(self, code: str, operation: str, status: int = 400, message: str = ""):
+        self.response = {
+            "Error": {"Code": code, "Message": message or code},
+            "ResponseMetadata": {"HTTPStatusCode": status},
+        }
+        self.operation_name = operation
+        super().__init__(f"An error occurred ({code}) when calling the {operation} operation: {message or code}")
+
+
+class _Exceptions:
+    ClientError = ClientError
+
+
+class Events:
+    """Minimal stand-in for botocore's hierarchical event emitter."""
+
+    def __init__(self):
+        self.handlers = {}
+
+    def register(self, event_name: str, handler, unique_id: str | None = None) -> None:
+        self.handlers[unique_id or id(handler)] = (event_name, handler)
+
+    def emit(self, event_name: str, **kwargs) -> None:
+        for prefix, handler in list(self.handlers.values()):
+            if event_name == prefix or event_name.startswith(f"{prefix}."):
+                handler(event_name=event_name, **kwargs)
+
+
+class Paginator:
+    """Minimal stand-in for a botocore paginator over ContinuationToken pages."""
+
+    def __init__(self, method, token_field: str):
+        self.method = method
+        self.token_field = token_field
+
+    def paginate(self, **kwargs):
+        while True:
+            page = self.method(**kwargs)
+            yield page
+            token = page.get(self.token_field)
+            if not token:
+                return
+            kwargs = dict(kwargs, ContinuationToken=token)
+
+
+class Recorder:
+    """Thread-safe call counts and latency samples per operation."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.throttles = Counter()
+        self.latencies = defaultdict(list)
+
+    def record(self, operation: str, seconds: float) -> None:
+        with self.lock:
+            self.calls[operation] += 1
+            self.latencies[operation].append(seconds * 1000)
+
+    def throttled(self, operation: str) -> None:
+        with self.lock:
+            self.throttles[operation] += 1
+
+
+class FakeS3:
+    """
+    In-memory S3 client.
+
+    latency_ms applies to every call (or per operation via op_latency_ms),
+    with +/- jitter. throttle_rate is the chance that an attempt of a
+    bucket-level write gets SlowDown; with capacity_rps set, attempts beyond
+    that many per second also get SlowDown, as S3 does under a burst. A
+    created bucket answers NoSuchBucket (404 on HeadBucket) for its first
+    visibility_ms.
+
+    Objects keep their bodies, metadata and tags. Conditional writes and
+    reads (IfNoneMatch, IfMatch, CopySourceIfMatch), ranged reads and
+    multipart uploads behave as in S3, including multipart ETags and the
+    minimum part size, so pool claims, copies and exports run unchanged.
+    Every object write also adds a version, which the purge then deletes.
+    """
+
+    exceptions = _Exceptions
+
+    # Operations that S3 throttles per bucket/account (control plane)
+    THROTTLED_OPERATIONS = {
+        "CreateBucket", "DeleteBucket", "DeleteObjects",
+        "PutBucketVersioning", "PutBucketEncryption", "PutPublicAccessBlock",
+        "PutBucketLifecycleConfiguration", "PutBucketPolicy", "PutBucketTagging",
+        "PutBucketCors",
+    }
+
+    # Operations available through get_paginator, with their token field
+    PAGINATED = {"list_buckets": "ContinuationToken", "list_objects_v2": "NextContinuationToken"}
+
+    # Smallest part of a multipart upload other than the last
+    MIN_PART_SIZE = 5 * 1024 * 1024
+
+    def __init__(
+        self,
+        latency_ms: float = 20,
+        jitter: float = 0.25,
+        throttle_rate: float = 0.0,
+        max_attempts: int = 5,
+        op_latency_ms: dict | None = None,
+        region: str = "eu-west-2",
+        visibility_ms: float = 0,
+        capacity_rps: float = 0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.max_attempts = max_attempts
+        self.op_latency_ms = op_latency_ms or {}
+        self.region = region
+        self.visibility_ms = visibility_ms
+        self.capacity_rps = capacity_rps
+        self.meta = SimpleNamespace(events=Events(), region_name=region)
+        self.recorder = Recorder()
+        self.recent = deque()
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.uploads = {}
+
+    # ------------------------------------------------------------------
+    # Plumbing
+    # ------------------------------------------------------------------
+
+    def _sleep(self, operation: str) -> None:
+        base = self.op_latency_ms.get(operation, self.latency_ms) / 1000
+        if base > 0:
+            time.sleep(base * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def _over_capacity(self) -> bool:
+        # Sliding one-second window over attempts of throttled operations
+        with self.recorder.lock:
+            now = time.monotonic()
+            while self.recent and self.recent[0] < now - 1.0:
+                self.recent.popleft()
+            self.recent.append(now)
+            return len(self.recent) > self.capacity_rps
+
+    def _throttled(self, operation: str) -> bool:
+        if operation not in self.THROTTLED_OPERATIONS:
+            return False
+        if self.capacity_rps and self._over_capacity():
+            return True
+        return random.random() < self.throttle_rate
+
+    def _call(self, operation: str, fn, *args):
+        events = self.meta.events
+        started = time.perf_counter()
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                events.emit(f"before-send.s3.{operation}", request=None)
+                self._sleep(operation)
+                if self._throttled(operation):
+                    self.recorder.throttled(operation)
+                    error = ClientError("SlowDown", operation, 503, "Please reduce your request rate.")
+                    events.emit(f"needs-retry.s3.{operation}", response=(None, error.response), attempts=attempt)
+                    if attempt == self.max_attempts:
+                        raise error
+                    time.sleep(random.uniform(0, min(20.0, 0.05 * 2 ** attempt)))
+                    continue
+                try:
+                    with self.lock:
+                        result = fn(*args)
+                except ClientError as e:
+                    events.emit(f"needs-retry.s3.{operation}", response=(None, e.response), attempts=attempt)
+                    raise
+                events.emit(
+                    f"needs-retry.s3.{operation}",
+                    response=(None, {"ResponseMetadata": {"HTTPStatusCode": 200}}),
+                    attempts=attempt
+                )
+                return result
+        finally:
+            self.recorder.record(operation, time.perf_counter() - started)
+
+    def _bucket(self, name: str, operation: str) -> dict:
+        bucket = self.buckets.get(name)
+        if bucket is None or bucket["visible_at"] > time.monotonic():
+            raise ClientError("NoSuchBucket", operation, 404, "The specified bucket does not exist")
+        return bucket
+
+    def _put_config(self, operation: str, name: str, step: str, value) -> dict:
+        def put():
+            self._bucket(name, operation)["config"][step] = value
+            return {}
+        return self._call(operation, put)
+
+    def _get_config(self, operation: str, name: str, step: str, missing_code: str):
+        def get():
+            value = self._bucket(name, operation)["config"].get(step)
+            if value is None:
+                raise ClientError(missing_code, operation, 404)
+            return json.loads(json.dumps(value))
+        return self._call(operation, get)
+
+    def _object(self, bucket_name: str, key: str, operation: str, if_match: str | None = None) -> dict:
+        obj = self._bucket(bucket_name, operation)["objects"].get(key)
+        if obj is None:
+            if operation == "HeadObject":
+                raise ClientError("404", operation, 404, "Not Found")
+            raise ClientError("NoSuchKey", operation, 404, "The specified key does not exist.")
+        if if_match is not None and if_match.strip('"') != obj["ETag"].strip('"'):
+            code = "412" if operation == "HeadObject" else "PreconditionFailed"
+            raise ClientError(code, operation, 412, "At least one of the pre-conditions you specified did not hold")
+        return obj
+
+    def _store(self, bucket_name: str, key: str, body: bytes, etag: str, part_sizes: list | None = None, **attrs) -> dict:
+        # A new current version of the key, as in a versioned bucket
+        bucket = self.buckets[bucket_name]
+        version = (key, uuid.uuid4().hex)
+        bucket["live"].add(version)
+        bisect.insort(bucket["versions"], version)
+        bucket["objects"][key] = {
+            "Body": body,
+            "ETag": etag,
+            "VersionId": version[1],
+            "LastModified": datetime.now(timezone.utc),
+            "PartSizes": part_sizes,
+            "Metadata": attrs.get("Metadata") or {},
+            "ContentType": attrs.get("ContentType") or "binary/octet-stream",
+            "TagSet": attrs.get("TagSet") or [],
+        }
+        return bucket["objects"][key]
+
+    def _upload(self, upload_id: str, operation: str) -> dict:
+        upload = self.uploads.get(upload_id)
+        if upload is None:
+            raise ClientError("NoSuchUpload", operation, 404, "The specified upload does not exist.")
+        return upload
+
+    @staticmethod
+    def _etag(body: bytes) -> str:
+        return f'"{hashlib.md5(body).hexdigest()}"'
+
+    @staticmethod
+    def _range(header: str | None, size: int, operation: str) -> tuple:
+        if not header:
+            return 0, size - 1
+        first, _, last = header.removeprefix("bytes=").partition("-")
+        first, last = int(first), min(int(last) if last else size - 1, size - 1)
+        if first >= size or first > last:
+            raise ClientError("InvalidRange", operation, 416, "The requested range is not satisfiable")
+        return first, last
+
+    # ------------------------------------------------------------------
+    # Test setup helpers (not part of the S3 API, not counted)
+    # ------------------------------------------------------------------
+
+    def add_bucket(self, name: str) -> None:
+        self.buckets[name] = {
+            "config": {}, "objects": {}, "versions": [], "live": set(), "region": self.region, "visible_at": 0.0
+        }
+
+    def add_object(self, name: str, key: str, body: bytes, part_size: int | None = None) -> None:
+        """Add an object, uploaded in parts of part_size if given (multipart ETag)."""
+        if not part_size or part_size >= len(body):
+            self._store(name, key, body, self._etag(body))
+            return
+        parts = [body[i:i + part_size] for i in range(0, len(body), part_size)]
+        digest = hashlib.md5(b"".join(hashlib.md5(part).digest() for part in parts)).hexdigest()
+        self._store(name, key, body, f'"{digest}-{len(parts)}"', [len(part) for part in parts])
+
+    def object_body(self, name: str, key: str) -> bytes | None:
+        obj = self.buckets[name]["objects"].get(key)
+        return obj["Body"] if obj else None
+
+    def object_keys(self, name: str, prefix: str = "") -> list:
+        return sorted(key for key in self.buckets[name]["objects"] if key.startswith(prefix))
+
+    def add_versions(self, name: str, count: int, keys: int | None = None) -> None:
+        """Add count object versions spread over `keys` keys (default: one version each)."""
+        keys = keys or count
+        bucket = self.buckets[name]
+        added = [(f"documents/{i % keys:08d}.pdf", uuid.uuid4().hex) for i in range(count)]
+        bucket["live"].update(added)
+        bucket["versions"] = sorted(bucket["live"])
+
+    def version_count(self, name: str) -> int:
+        return len(self.buckets[name]["live"])
+
+    # ------------------------------------------------------------------
+    # S3 API
+    # ------------------------------------------------------------------
+
+    def head_bucket(self, Bucket: str) -> dict:
+        def head():
+            if Bucket not in self.buckets or self.buckets[Bucket]["visible_at"] > time.monotonic():
+                raise ClientError("404", "HeadBucket", 404, "Not Found")
+            return {"BucketRegion": self.buckets[Bucket]["region"]}
+        return self._call("HeadBucket", head)
+
+    def create_bucket(self, Bucket: str, CreateBucketConfiguration: dict | None = None) -> dict:
+        def create():
+            if Bucket in self.buckets:
+                raise ClientError("BucketAlreadyOwnedByYou", "CreateBucket", 409)
+            self.add_bucket(Bucket)
+            self.buckets[Bucket]["visible_at"] = time.monotonic() + self.visibility_ms / 1000
+            if CreateBucketConfiguration:
+                self.buckets[Bucket]["region"] = CreateBucketConfiguration["LocationConstraint"]
+            return {"Location": f"/{Bucket}"}
+        return self._call("CreateBucket", create)
+
+    def delete_bucket(self, Bucket: str) -> dict:
+        def delete():
+            if self._bucket(Bucket, "DeleteBucket")["live"]:
+                raise ClientError("BucketNotEmpty", "DeleteBucket", 409)
+            del self.buckets[Bucket]
+            return {}
+        return self._call("DeleteBucket", delete)
+
+    def get_paginator(self, operation_name: str) -> Paginator:
+        return Paginator(getattr(self, operation_name), self.PAGINATED[operation_name])
+
+    def list_buckets(self, Prefix: str = "", ContinuationToken: str = "", MaxBuckets: int = 10000, **kwargs) -> dict:
+        def list_page():
+            names = [name for name in sorted(self.buckets) if name.startswith(Prefix) and name > ContinuationToken]
+            response = {"Buckets": [{"Name": name} for name in names[:MaxBuckets]]}
+            if len(names) > MaxBuckets:
+                response["ContinuationToken"] = names[MaxBuckets - 1]
+            return response
+        return self._call("ListBuckets", list_page)
+
+    def get_bucket_location(self, Bucket: str) -> dict:
+        def location():
+            region = self._bucket(Bucket, "GetBucketLocation")["region"]
+            return {"LocationConstraint": None if region == "us-east-1" else region}
+        return self._call("GetBucketLocation", location)
+
+    def put_bucket_versioning(self, Bucket: str, VersioningConfiguration: dict) -> dict:
+        return self._put_config("PutBucketVersioning", Bucket, "versioning", VersioningConfiguration)
+
+    def get_bucket_versioning(self, Bucket: str) -> dict:
+        return self._call(
+            "GetBucketVersioning",
+            lambda: dict(self._bucket(Bucket, "GetBucketVersioning")["config"].get("versioning", {}))
+        )
+
+    def put_bucket_encryption(self, Bucket: str, ServerSideEncryptionConfiguration: dict) -> dict:
+        return self._put_config("PutBucketEncryption", Bucket, "encryption", ServerSideEncryptionConfiguration)
+
+    def get_bucket_encryption(self, Bucket: str) -> dict:
+        value = self._get_config(
+            "GetBucketEncryption", Bucket, "encryption", "ServerSideEncryptionConfigurationNotFoundError"
+        )
+        return {"ServerSideEncryptionConfiguration": value}
+
+    def put_public_access_block(self, Bucket: str, PublicAccessBlockConfiguration: dict) -> dict:
+        return self._put_config("PutPublicAccessBlock", Bucket, "public_access_block", PublicAccessBlockConfiguration)
+
+    def get_public_access_block(self, Bucket: str) -> dict:
+        value = self._get_config(
+            "GetPublicAccessBlock", Bucket, "public_access_block", "NoSuchPublicAccessBlockConfiguration"
+        )
+        return {"PublicAccessBlockConfiguration": value}
+
+    def put_bucket_lifecycle_configuration(self, Bucket: str, LifecycleConfiguration: dict) -> dict:
+        return self._put_config("PutBucketLifecycleConfiguration", Bucket, "lifecycle", LifecycleConfiguration)
+
+    def get_bucket_lifecycle_configuration(self, Bucket: str) -> dict:
+        return self._get_config(
+            "GetBucketLifecycleConfiguration", Bucket, "lifecycle", "NoSuchLifecycleConfiguration"
+        )
+
+    def put_bucket_policy(self, Bucket: str, Policy: str) -> dict:
+        return self._put_config("PutBucketPolicy", Bucket, "policy", json.loads(Policy))
+
+    def get_bucket_policy(self, Bucket: str) -> dict:
+        value = self._get_config("GetBucketPolicy", Bucket, "policy", "NoSuchBucketPolicy")
+        return {"Policy": json.dumps(value)}
+
+    def put_bucket_tagging(self, Bucket: str, Tagging: dict) -> dict:
+        return self._put_config("PutBucketTagging", Bucket, "tagging", Tagging)
+
+    def get_bucket_tagging(self, Bucket: str) -> dict:
+        return self._get_config("GetBucketTagging", Bucket, "tagging", "NoSuchTagSet")
+
+    def put_bucket_cors(self, Bucket: str, CORSConfiguration: dict) -> dict:
+        return self._put_config("PutBucketCors", Bucket, "cors", CORSConfiguration)
+
+    def get_bucket_cors(self, Bucket: str) -> dict:
+        return self._get_config("GetBucketCors", Bucket, "cors", "NoSuchCORSConfiguration")
+
+    def put_bucket_notification_configuration(self, Bucket: str, NotificationConfiguration: dict, **kwargs) -> dict:
+        return self._put_config("PutBucketNotificationConfiguration", Bucket, "notification", NotificationConfiguration)
+
+    def get_bucket_notification_configuration(self, Bucket: str) -> dict:
+        def get():
+            # S3 answers an empty configuration rather than an error when unset
+            return json.loads(json.dumps(self._bucket(Bucket, "GetBucketNotificationConfiguration")["config"].get("notification", {})))
+        return self._call("GetBucketNotificationConfiguration", get)
+
+    def list_object_versions(
+        self, Bucket: str, KeyMarker: str = "", VersionIdMarker: str = "", MaxKeys: int = 1000, **kwargs
+    ) -> dict:
+        def list_page():
+            bucket = self._bucket(Bucket, "ListObjectVersions")
+            versions, live = bucket["versions"], bucket["live"]
+
+            if not KeyMarker:
+                start = 0
+            elif VersionIdMarker:
+                start = bisect.bisect_right(versions, (KeyMarker, VersionIdMarker))
+            else:
+                start = bisect.bisect_right(versions, (KeyMarker, "￿"))
+
+            page = []
+            index = start
+            while index < len(versions) and len(page) < MaxKeys:
+                if versions[index] in live:
+                    page.append(versions[index])
+                index += 1
+
+            while index < len(versions) and versions[index] not in live:
+                index += 1
+            truncated = index < len(versions)
+            response = {
+                "Versions": [{"Key": key, "VersionId": vid, "IsLatest": False} for key, vid in page],
+                "DeleteMarkers": [],
+                "IsTruncated": truncated,
+            }
+            if truncated:
+                response["NextKeyMarker"], response["NextVersionIdMarker"] = page[-1]
+            return response
+        return self._call("ListObjectVersions", list_page)
+
+    def delete_objects(self, Bucket: str, Delete: dict) -> dict:
+        def delete():
+            bucket = self._bucket(Bucket, "DeleteObjects")
+            objects = bucket["objects"]
+            for obj in Delete["Objects"]:
+                bucket["live"].discard((obj["Key"], obj.get("VersionId")))
+                current = objects.get(obj["Key"])
+                if current and current["VersionId"] == obj.get("VersionId"):
+                    del objects[obj["Key"]]
+            return {} if Delete.get("Quiet") else {"Deleted": Delete["Objects"]}
+        return self._call("DeleteObjects", delete)
+
+    def list_objects_v2(
+        self, Bucket: str, Prefix: str = "", StartAfter: str = "", ContinuationToken: str = "",
+        MaxKeys: int = 1000, **kwargs
+    ) -> dict:
+        def list_page():
+            after = ContinuationToken or StartAfter
+            keys = [
+                key for key in sorted(self._bucket(Bucket, "ListObjectsV2")["objects"])
+                if key.startswith(Prefix) and key > after
+            ]
+            objects = self.buckets[Bucket]["objects"]
+            page = keys[:MaxKeys]
+            response = {
+                "Contents": [
+                    {
+                        "Key": key,
+                        "Size": len(objects[key]["Body"]),
+                        "ETag": objects[key]["ETag"],
+                        "LastModified": objects[key]["LastModified"],
+                        "StorageClass": "STANDARD",
+                    }
+                    for key in page
+                ],
+                "KeyCount": len(page),
+                "IsTruncated": len(keys) > MaxKeys,
+            }
+            if response["IsTruncated"]:
+                response["NextContinuationToken"] = page[-1]
+            if not page:
+                del response["Contents"]
+            return response
+        return self._call("ListObjectsV2", list_page)
+
+    def put_object(
+        self, Bucket: str, Key: str, Body: bytes | str = b"", IfNoneMatch: str | None = None,
+        IfMatch: str | None = None, **kwargs
+    ) -> dict:
+        def put():
+            body = Body.encode("utf-8") if isinstance(Body, str) else bytes(Body)
+            if IfNoneMatch == "*" and Key in self._bucket(Bucket, "PutObject")["objects"]:
+                raise ClientError(
+                    "PreconditionFailed", "PutObject", 412, "At least one of the pre-conditions you specified did not hold"
+                )
+            if IfMatch is not None:
+                self._object(Bucket, Key, "PutObject", IfMatch)
+            obj = self._store(Bucket, Key, body, self._etag(body), **kwargs)
+            return {"ETag": obj["ETag"], "VersionId": obj["VersionId"]}
+        return self._call("PutObject", put)
+
+    def get_object(self, Bucket: str, Key: str, Range: str | None = None, IfMatch: str | None = None, **kwargs) -> dict:
+        def get():
+            obj = self._object(Bucket, Key, "GetObject", IfMatch)
+            size = len(obj["Body"])
+            first, last = self._range(Range, size, "GetObject") if size else (0, -1)
+            response = {
+                "Body": io.BytesIO(obj["Body"][first:last + 1]),
+                "ContentLength": last - first + 1,
+                "ETag": obj["ETag"],
+                "LastModified": obj["LastModified"],
+                "ContentType": obj["ContentType"],
+                "Metadata": dict(obj["Metadata"]),
+            }
+            if Range:
+                response["ContentRange"] = f"bytes {first}-{last}/{size}"
+            return response
+        return self._call("GetObject", get)
+
+    def head_object(self, Bucket: str, Key: str, PartNumber: int | None = None, IfMatch: str | None = None, **kwargs) -> dict:
+        def head():
+            obj = self._object(Bucket, Key, "HeadObject", IfMatch)
+            sizes = obj["PartSizes"] or [len(obj["Body"])]
+            response = {
+                "ContentLength": len(obj["Body"]),
+                "ETag": obj["ETag"],
+                "LastModified": obj["LastModified"],
+                "ContentType": obj["ContentType"],
+                "Metadata": dict(obj["Metadata"]),
+            }
+            if PartNumber is not None:
+                if not 1 <= PartNumber <= len(sizes):
+                    raise ClientError("416", "HeadObject", 416, "Requested Range Not Satisfiable")
+                response["ContentLength"] = sizes[PartNumber - 1]
+                response["PartsCount"] = len(sizes)
+            return response
+        return self._call("HeadObject", head)
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        def delete():
+            # Removes the current version outright, as in an unversioned bucket
+            bucket = self._bucket(Bucket, "DeleteObject")
+            obj = bucket["objects"].pop(Key, None)
+            if obj:
+                bucket["live"].discard((Key, obj["VersionId"]))
+            return {}
+        return self._call("DeleteObject", delete)
+
+    def get_object_tagging(self, Bucket: str, Key: str, **kwargs) -> dict:
+        return self._call("GetObjectTagging", lambda: {
+            "TagSet": [dict(tag) for tag in self._object(Bucket, Key, "GetObjectTagging")["TagSet"]]
+        })
+
+    def copy_object(
+        self, Bucket: str, Key: str, CopySource: dict, MetadataDirective: str = "COPY",
+        TaggingDirective: str = "COPY", CopySourceIfMatch: str | None = None, **kwargs
+    ) -> dict:
+        def copy():
+            source = self._object(CopySource["Bucket"], CopySource["Key"], "CopyObject", CopySourceIfMatch)
+            self._bucket(Bucket, "CopyObject")
+            obj = self._store(
+                Bucket, Key, source["Body"], self._etag(source["Body"]),
+                Metadata=source["Metadata"] if MetadataDirective == "COPY" else kwargs.get("Metadata"),
+                ContentType=source["ContentType"] if MetadataDirective == "COPY" else kwargs.get("ContentType"),
+                TagSet=source["TagSet"] if TaggingDirective == "COPY" else None,
+            )
+            return {"CopyObjectResult": {"ETag": obj["ETag"], "LastModified": obj["LastModified"]}}
+        return self._call("CopyObject", copy)
+
+    def create_multipart_upload(self, Bucket: str, Key: str, Tagging: str = "", **kwargs) -> dict:
+        def create():
+            self._bucket(Bucket, "CreateMultipartUpload")
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = {
+                "Bucket": Bucket,
+                "Key": Key,
+                "Parts": {},
+                "Metadata": kwargs.get("Metadata"),
+                "ContentType": kwargs.get("ContentType"),
+                "TagSet": [{"Key": k, "Value": v} for k, v in parse_qsl(Tagging)],
+            }
+            return {"Bucket": Bucket, "Key": Key, "UploadId": upload_id}
+        return self._call("CreateMultipartUpload", create)
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes, **kwargs) -> dict:
+        def upload():
+            part = {"Body": bytes(Body), "ETag": self._etag(Body)}
+            self._upload(UploadId, "UploadPart")["Parts"][PartNumber] = part
+            return {
+                "ETag": part["ETag"],
+                "ChecksumSHA256": base64.b64encode(hashlib.sha256(Body).digest()).decode("ascii"),
+            }
+        return self._call("UploadPart", upload)
+
+    def upload_part_copy(
+        self, Bucket: str, Key: str, UploadId: str, PartNumber: int, CopySource: dict,
+        CopySourceRange: str | None = None, CopySourceIfMatch: str | None = None, **kwargs
+    ) -> dict:
+        def copy():
+            upload = self._upload(UploadId, "UploadPartCopy")
+            source = self._object(CopySource["Bucket"], CopySource["Key"], "UploadPartCopy", CopySourceIfMatch)
+            first, last = self._range(CopySourceRange, len(source["Body"]), "UploadPartCopy")
+            body = source["Body"][first:last + 1]
+            upload["Parts"][PartNumber] = {"Body": body, "ETag": self._etag(body)}
+            return {"CopyPartResult": {"ETag": upload["Parts"][PartNumber]["ETag"]}}
+        return self._call("UploadPartCopy", copy)
+
+    def list_parts(
+        self, Bucket: str, Key: str, UploadId: str, PartNumberMarker: int = 0, MaxParts: int = 1000, **kwargs
+    ) -> dict:
+        def list_page():
+            stored = self._upload(UploadId, "ListParts")["Parts"]
+            numbers = [number for number in sorted(stored) if number > PartNumberMarker]
+            page = numbers[:MaxParts]
+            response = {
+                "Parts": [
+                    {"PartNumber": n, "ETag": stored[n]["ETag"], "Size": len(stored[n]["Body"])} for n in page
+                ],
+                "IsTruncated": len(numbers) > MaxParts,
+            }
+            if response["IsTruncated"]:
+                response["NextPartNumberMarker"] = page[-1]
+            return response
+        return self._call("ListParts", list_page)
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: dict, **kwargs) -> dict:
+        def complete():
+            upload = self._upload(UploadId, "CompleteMultipartUpload")
+            listed = MultipartUpload["Parts"]
+            numbers = [part["PartNumber"] for part in listed]
+            if numbers != sorted(set(numbers)):
+                raise ClientError("InvalidPartOrder", "CompleteMultipartUpload", 400)
+
+            parts = []
+            for part in listed:
+                stored = upload["Parts"].get(part["PartNumber"])
+                if stored is None or stored["ETag"].strip('"') != part["ETag"].strip('"'):
+                    raise ClientError("InvalidPart", "CompleteMultipartUpload", 400)
+                parts.append(stored["Body"])
+            if any(len(body) < self.MIN_PART_SIZE for body in parts[:-1]):
+                raise ClientError("EntityTooSmall", "CompleteMultipartUpload", 400)
+
+            digest = hashlib.md5(b"".join(hashlib.md5(body).digest() for body in parts)).hexdigest()
+            obj = self._store(
+                Bucket, Key, b"".join(parts), f'"{digest}-{len(parts)}"', [len(body) for body in parts],
+                Metadata=upload["Metadata"], ContentType=upload["ContentType"], TagSet=upload["TagSet"]
+            )
+            del self.uploads[UploadId]
+            return {"Bucket": Bucket, "Key": Key, "ETag": obj["ETag"]}
+        return self._call("CompleteMultipartUpload", complete)
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str, **kwargs) -> dict:
+        def abort():
+            self._upload(UploadId, "AbortMultipartUpload")
+            del self.uploads[UploadId]
+            return {}
+        return self._call("AbortMultipartUpload", abort)
+
+
+class FakeSecretsManager:
+    """Secrets Manager stand-in returning a fixed token."""
+
+    def __init__(self, token: str = "bench-token", latency_ms: float = 15):
+        self.token = token
+        self.latency_ms = latency_ms
+        self.recorder = Recorder()
+
+    def get_secret_value(self, SecretId: str) -> dict:
+        started = time.perf_counter()
+        time.sleep(self.latency_ms / 1000)
+        self.recorder.record("GetSecretValue", time.perf_counter() - started)
+        return {"SecretString": json.dumps({"token": self.token})}
+
+
+class FakeLambda:
+    """Lambda stand-in that queues asynchronous invocations for the harness to run."""
+
+    def __init__(self):
+        self.recorder = Recorder()
+        self.invocations = []
+
+    def invoke(self, FunctionName: str, InvocationType: str, Payload: bytes) -> dict:
+        self.recorder.record("Invoke", 0.0)
+        self.invocations.append(json.loads(Payload))
+        return {"StatusCode": 202}
+
+
+class FakeSQS:
+    """SQS stand-in keeping sent messages for the harness to deliver."""
+
+    def __init__(self, latency_ms: float = 5):
+        self.latency_ms = latency_ms
+        self.recorder = Recorder()
+        self.lock = threading.Lock()
+        self.messages = []
+
+    def send_message(self, QueueUrl: str, MessageBody: str) -> dict:
+        started = time.perf_counter()
+        time.sleep(self.latency_ms / 1000)
+        message_id = str(uuid.uuid4())
+        with self.lock:
+            self.messages.append({"messageId": message_id, "body": MessageBody})
+        self.recorder.record("SendMessage", time.perf_counter() - started)
+        return {"MessageId": message_id}
+
+    def receive(self, batch_size: int) -> list:
+        """Take up to batch_size messages, as an SQS event source would."""
+        with self.lock:
+            batch, self.messages = self.messages[:batch_size], self.messages[batch_size:]
+        return batch
+
+
+class CallbackServer:
+    """
+    Local stand-in for the API callback endpoint.
+
+    Responds 200 after latency_ms, or with failure_status for a failure_rate
+    share of requests. Keeps connections alive like the real API.
+    """
+
+    def __init__(self, latency_ms: float = 30, failure_rate: float = 0.0, failure_status: int = 503):
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.recorder = Recorder()
+        self.connections = set()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                started = time.perf_counter()
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server.connections.add(self.client_address)
+                time.sleep(server.latency_ms / 1000)
+
+                failed = random.random() < server.failure_rate
+                status = server.failure_status if failed else 200
+                body = b'{"ok": false}' if failed else b'{"ok": true}'
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                server.recorder.record(f"POST {status}", time.perf_counter() - started)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/api"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
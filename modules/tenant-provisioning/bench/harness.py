@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+Offline Benchmark Suite for the Tenant Provisioner
+
+Runs the real lambda_handler against in-process stand-ins (see fakes.py):
+an in-memory S3, Secrets Manager and Lambda, plus a local HTTP server for
+the API callback. S3 and callback latency, S3 throttling and callback
+failures are injectable. No AWS account, network or boto3 is needed, only
+urllib3 (used by the callback client).
+
+Scenarios:
+- single_create: one TenantCreated event
+- burst:         200 TenantCreated events arriving as SQS batches (batch mode)
+- delete_100k:   TenantDeleted for a bucket holding 100k object versions,
+                 following teardown continuations until the bucket is gone
+- pool_claim:    refills the bucket pool (see refill.py), then TenantCreated
+                 for more tenants than it holds, as SQS batches; checks that
+                 no pool bucket went to two tenants
+- migrate:       TenantMigrated for a bucket of --objects objects, through
+                 copy and verify; checks every copied body against the source
+- export_delete: TenantDeleted with export for the same kind of bucket;
+                 unpacks the export and checks it against the source
+
+The migrate and export_delete buckets include objects over the copy and
+archive size thresholds, which those scenarios lower so the large-object
+paths run on a few MiB.
+
+With --outbox, callbacks are queued instead (see outbox.py) and delivered
+in bulk requests of --outbox-batch-size once the scenario's events are done.
+
+For each scenario it reports wall time, API call counts, throttles and the
+p50/p99 of every provisioning step, taken from the handler's own EMF
+metrics, and the S3 rate limiter's counters per API family (see
+ratelimit.py). --s3-capacity-rps makes the in-memory S3 throttle attempts
+beyond that rate, as S3 does under a burst; compare with --no-rate-limit to
+see the limiter's effect. Use --save to record a baseline and --baseline to fail (exit 1)
+when a scenario's wall time regresses beyond --tolerance.
+
+Usage:
+    python harness.py
+    python harness.py --scenario burst --s3-latency-ms 40 --throttle-rate 0.05
+    python harness.py --scenario burst --outbox
+    python harness.py --scenario burst --s3-capacity-rps 100 [--no-rate-limit]
+    python harness.py --save baseline.json
+    python harness.py --baseline baseline.json --tolerance 0.2
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, redirect_stdout
+
+from fakes import CallbackServer, FakeLambda, FakeS3, FakeSecretsManager, FakeSQS
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda")
+
+SCENARIOS = ("single_create", "burst", "delete_100k", "pool_claim", "migrate", "export_delete")
+
+STATE_BUCKET = "bench-provisioner-state"
+EXPORT_BUCKET = "bench-tenant-exports"
+
+# Objects above the lowered copy and archive thresholds in the migrate and
+# export_delete scenarios
+LARGE_OBJECT_SIZE = 12 * 1024 * 1024
+LARGE_OBJECT_THRESHOLD = 8 * 1024 * 1024
+
+
+class BenchContext:
+    """Minimal Lambda context with a real deadline."""
+
+    invoked_function_arn = "arn:aws:lambda:eu-west-2:000000000000:function:bench-tenant-provisioner"
+
+    def __init__(self, timeout_seconds: float):
+        self.deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self.deadline - time.monotonic()) * 1000))
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return round(ordered[index], 2)
+
+
+def load_provisioner(callback_url: str):
+    """Import the handler with settings pointing at the stand-ins."""
+    os.environ.update({
+        "API_CALLBACK_URL": callback_url,
+        "API_CALLBACK_SECRET_ARN": "arn:aws:secretsmanager:eu-west-2:000000000000:secret:bench",
+        "ENVIRONMENT": "bench",
+        "EXPORT_BUCKET": EXPORT_BUCKET,
+        "LOG_EVENT_SAMPLE_RATE": "0",
+        "METRICS_ENABLED": "true",
+    })
+    sys.path.insert(0, LAMBDA_DIR)
+    import provisioner
+    return provisioner
+
+
+def install(provisioner, s3: FakeS3, secrets: FakeSecretsManager, lambda_client: FakeLambda, sqs: FakeSQS) -> None:
+    """Swap the provisioner's cached clients for stand-ins and reset its caches."""
+    import ratelimit
+
+    ratelimit.limiters.update({
+        family: ratelimit.AdaptiveTokenBucket(family, limiter.ceiling)
+        for family, limiter in ratelimit.limiters.items()
+    })
+    ratelimit.attach(s3)
+
+    provisioner._clients.clear()
+    provisioner._clients.update({"s3": s3, "secretsmanager": secrets, "lambda": lambda_client, "sqs": sqs})
+    provisioner.invalidate_api_token()
+
+
+@contextmanager
+def settings(module, **values):
+    """Override a module's settings (its constants read from the environment) for a scenario."""
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+def flush_outbox(sqs: FakeSQS, batch_size: int, args) -> int:
+    """Deliver every queued callback through the outbox flusher. Returns the batches sent."""
+    import outbox
+
+    batches = 0
+    while True:
+        records = sqs.receive(batch_size)
+        if not records:
+            return batches
+        outbox.lambda_handler({"Records": records}, BenchContext(args.timeout))
+        batches += 1
+
+
+def step_latencies(log: str) -> dict:
+    """p50/p99 of every step from the EMF records in captured output."""
+    samples = {}
+    for line in log.splitlines():
+        if not line.startswith('{"_aws"'):
+            continue
+        record = json.loads(line)
+        if "Duration" in record:
+            samples.setdefault(record["Step"], []).append(record["Duration"])
+
+    return {
+        step: {"count": len(values), "p50_ms": percentile(values, 50), "p99_ms": percentile(values, 99)}
+        for step, values in sorted(samples.items())
+    }
+
+
+def run_single_create(provisioner, s3: FakeS3, lambda_client: FakeLambda, args) -> dict:
+    event = {"detail-type": "TenantCreated", "detail": {"tenant_id": "1"}}
+    result = provisioner.lambda_handler(event, BenchContext(args.timeout))
+    return {"events": 1, "failed": int(result.get("status") != "success")}
+
+
+def run_batches(provisioner, details: list, args) -> int:
+    """Deliver TenantCreated events as SQS batches to concurrent invocations. Returns the failed count."""
+    records = [
+        {"messageId": f"msg-{i}", "body": json.dumps({"detail-type": "TenantCreated", "detail": detail})}
+        for i, detail in enumerate(details)
+    ]
+    batches = [records[i:i + args.batch_size] for i in range(0, len(records), args.batch_size)]
+
+    # Concurrent invocations of one warm container, each handling one SQS batch
+    with ThreadPoolExecutor(max_workers=args.invocations) as pool:
+        responses = list(pool.map(
+            lambda batch: provisioner.lambda_handler({"Records": batch}, BenchContext(args.timeout)),
+            batches,
+        ))
+
+    return sum(len(r["batchItemFailures"]) for r in responses)
+
+
+def run_until_done(provisioner, lambda_client: FakeLambda, event: dict, args) -> tuple:
+    """Run an event and its continuations until it finishes. Returns (result, invocations)."""
+    invocations = 0
+    while event:
+        invocations += 1
+        result = provisioner.lambda_handler(event, BenchContext(args.timeout))
+        event = lambda_client.invocations.pop() if result["status"] == "in_progress" else None
+    return result, invocations
+
+
+def add_tenant_objects(s3: FakeS3, bucket: str, args) -> dict:
+    """
+    Fill a bucket with --objects documents and two large scans among them,
+    one uploaded in parts. Returns {key: body} for checking copies.
+    """
+    rng = random.Random(args.objects)
+    for i in range(args.objects):
+        s3.add_object(bucket, f"documents/{i:06d}.pdf", rng.randbytes(rng.randint(1, 2 * args.object_size_kb) * 1024))
+    s3.add_object(bucket, f"documents/{args.objects // 3:06d}-scan.tiff", rng.randbytes(LARGE_OBJECT_SIZE))
+    s3.add_object(
+        bucket, f"documents/{2 * args.objects // 3:06d}-scan.tiff", rng.randbytes(LARGE_OBJECT_SIZE),
+        part_size=FakeS3.MIN_PART_SIZE
+    )
+    return {key: s3.object_body(bucket, key) for key in s3.object_keys(bucket)}
+
+
+def run_burst(provisioner, s3: FakeS3, lambda_client: FakeLambda, args) -> dict:
+    failed = run_batches(provisioner, [{"tenant_id": str(i)} for i in range(args.tenants)], args)
+    return {"events": args.tenants, "failed": failed}
+
+
+def run_delete(provisioner, s3: FakeS3, lambda_client: FakeLambda, args) -> dict:
+    bucket = f"{provisioner.TENANT_BUCKET_PREFIX}1-{provisioner.ENVIRONMENT}"
+    s3.add_bucket(bucket)
+    s3.add_versions(bucket, args.versions, keys=max(1, args.versions // 3))
+
+    event = {"detail-type": "TenantDeleted", "detail": {"tenant_id": "1"}}
+    result, invocations = run_until_done(provisioner, lambda_client, event, args)
+
+    purge = result["result"].get("purge", {})
+    return {
+        "events": 1,
+        "failed": int(result.get("status") != "success"),
+        "invocations": invocations,
+        "objects_deleted": purge.get("total_deleted", 0),
+    }
+
+
+def run_pool_claim(provisioner, s3: FakeS3, lambda_client: FakeLambda, args) -> dict:
+    import pool
+    import refill
+
+    s3.add_bucket(STATE_BUCKET)
+    tenants = [str(i) for i in range(args.pool_size * 3 // 2)]
+
+    with settings(pool, STATE_BUCKET=STATE_BUCKET, BUCKET_POOL_SIZE=args.pool_size):
+        refill.refill_pool(size=args.pool_size)
+        failed = run_batches(provisioner, [{"tenant_id": tenant} for tenant in tenants], args)
+
+        claims = pool.assignments(s3)
+        assigned = {tenant: pool.assigned_bucket(s3, tenant) for tenant in tenants}
+
+    # Every claim lock must match the tenant's assignment, one bucket per tenant
+    conflicts = sum(assigned.get(tenant) != bucket for bucket, tenant in claims.items())
+    return {
+        "events": len(tenants),
+        "failed": failed + conflicts,
+        "pool_claimed": len(claims),
+        "pool_conflicts": conflicts,
+    }
+
+
+def run_migrate(provisioner, s3: FakeS3, lambda_client: FakeLambda, args) -> dict:
+    import migrate
+
+    source = f"{provisioner.TENANT_BUCKET_PREFIX}1-{provisioner.ENVIRONMENT}"
+    s3.add_bucket(source)
+    bodies = add_tenant_objects(s3, source, args)
+
+    event = {"detail-type": "TenantMigrated", "detail": {"tenant_id": "1", "target_tenant_id": "2"}}
+    with settings(migrate, COPY_MULTIPART_THRESHOLD=LARGE_OBJECT_THRESHOLD):
+        result, invocations = run_until_done(provisioner, lambda_client, event, args)
+
+    target = result["result"].get("bucket", "")
+    mismatched = sum(
+        s3.object_body(target, key) != body for key, body in bodies.items()
+    ) if target in s3.buckets else len(bodies)
+    return {
+        "events": 1,
+        "failed": int(result.get("status") != "success" or mismatched > 0),
+        "invocations": invocations,
+        "objects_checked": len(bodies),
+        "mismatched": mismatched,
+    }
+
+
+def exported_bodies(s3: FakeS3, manifest_key: str) -> tuple:
+    """Unpack an export. Returns ({key: body}, parts whose checksum does not match)."""
+    manifest = json.loads(s3.object_body(EXPORT_BUCKET, manifest_key))
+    bodies, bad_parts = {}, 0
+    for part in manifest["parts"]:
+        body = s3.object_body(EXPORT_BUCKET, part["key"]) or b""
+        if part["type"] == "object":
+            bodies[part["source_key"]] = body
+            continue
+        bad_parts += hashlib.sha256(body).hexdigest() != part["sha256"]
+        with tarfile.open(fileobj=io.BytesIO(body), mode="r:gz") as tar:
+            for member in tar:
+                bodies[member.name] = tar.extractfile(member).read()
+    return bodies, bad_parts
+
+
+def run_export_delete(provisioner, s3: FakeS3, lambda_client: FakeLambda, args) -> dict:
+    import export
+
+    bucket = f"{provisioner.TENANT_BUCKET_PREFIX}1-{provisioner.ENVIRONMENT}"
+    s3.add_bucket(bucket)
+    s3.add_bucket(EXPORT_BUCKET)
+    bodies = add_tenant_objects(s3, bucket, args)
+
+    event = {"detail-type": "TenantDeleted", "detail": {"tenant_id": "1", "export": True}}
+    with settings(
+        export,
+        EXPORT_ARCHIVE_MAX_OBJECT_SIZE=LARGE_OBJECT_THRESHOLD,
+        EXPORT_COPY_PART_SIZE=FakeS3.MIN_PART_SIZE,
+        EXPORT_PART_SIZE=2 * LARGE_OBJECT_THRESHOLD,
+    ):
+        result, invocations = run_until_done(provisioner, lambda_client, event, args)
+
+    mismatched = len(bodies)
+    if result.get("status") == "success":
+        manifest = result["result"]["export"]["manifest"]
+        exported, bad_parts = exported_bodies(s3, manifest.removeprefix(f"s3://{EXPORT_BUCKET}/"))
+        mismatched = bad_parts + len(exported.keys() ^ bodies.keys()) + sum(
+            exported[key] != body for key, body in bodies.items() if key in exported
+        )
+    return {
+        "events": 1,
+        "failed": int(result.get("status") != "success" or mismatched > 0 or bucket in s3.buckets),
+        "invocations": invocations,
+        "objects_checked": len(bodies),
+        "mismatched": mismatched,
+        "objects_deleted": result["result"].get("purge", {}).get("total_deleted", 0),
+    }
+
+
+RUNNERS = {
+    "single_create": run_single_create,
+    "burst": run_burst,
+    "delete_100k": run_delete,
+    "pool_claim": run_pool_claim,
+    "migrate": run_migrate,
+    "export_delete": run_export_delete,
+}
+
+
+def run_scenario(name: str, provisioner, server: CallbackServer, args) -> dict:
+    s3 = FakeS3(
+        latency_ms=args.s3_latency_ms,
+        throttle_rate=args.throttle_rate,
+        visibility_ms=args.bucket_visibility_ms,
+        capacity_rps=args.s3_capacity_rps,
+    )
+    secrets = FakeSecretsManager(latency_ms=args.secret_latency_ms)
+    lambda_client = FakeLambda()
+    sqs = FakeSQS()
+    install(provisioner, s3, secrets, lambda_client, sqs)
+    provisioner.CALLBACK_OUTBOX_URL = "https://sqs.bench/callback-outbox" if args.outbox else ""
+
+    callbacks_before = sum(server.recorder.calls.values())
+    connections_before = len(server.connections)
+
+    log = io.StringIO()
+    started = time.perf_counter()
+    with redirect_stdout(log):
+        outcome = RUNNERS[name](provisioner, s3, lambda_client, args)
+        wall = time.perf_counter() - started
+        if args.outbox:
+            flush_started = time.perf_counter()
+            outcome["outbox_batches"] = flush_outbox(sqs, args.outbox_batch_size, args)
+            outcome["outbox_flush_s"] = round(time.perf_counter() - flush_started, 3)
+
+    report = {
+        "wall_s": round(wall, 3),
+        **outcome,
+        "s3_calls": sum(s3.recorder.calls.values()),
+        "s3_calls_by_operation": dict(sorted(s3.recorder.calls.items())),
+        "s3_throttles": sum(s3.recorder.throttles.values()),
+        "s3_rate_limits": {
+            family: stats for family, stats in provisioner.ratelimit.stats().items() if stats["requests"]
+        },
+        "secret_fetches": sum(secrets.recorder.calls.values()),
+        "callbacks": sum(server.recorder.calls.values()) - callbacks_before,
+        "callback_connections": len(server.connections) - connections_before,
+        "steps": step_latencies(log.getvalue()),
+    }
+    if "objects_deleted" in outcome:
+        report["objects_per_second"] = round(outcome["objects_deleted"] / wall, 1)
+    if args.verbose:
+        sys.stderr.write(log.getvalue())
+
+    return report
+
+
+def print_report(results: dict) -> None:
+    for name, r in results.items():
+        print(f"\n== {name}: {r['wall_s']}s wall, {r['events']} events, {r['failed']} failed")
+        print(
+            f"   S3 calls {r['s3_calls']} (throttled {r['s3_throttles']}), "
+            f"secret fetches {r['secret_fetches']}, callbacks {r['callbacks']} "
+            f"over {r['callback_connections']} connections"
+        )
+        for family, limit in r["s3_rate_limits"].items():
+            if limit["rate"] is None:
+                pacing = "unpaced"
+            elif limit["ceiling"] is None:
+                pacing = f"settled at {limit['rate']} per second"
+            else:
+                pacing = f"settled at {limit['rate']}/{limit['ceiling']} per second"
+            print(
+                f"   rate limit {family}: {limit['requests']} requests, {limit['throttles']} throttled, "
+                f"waited {limit['waited_seconds']}s, {pacing}"
+            )
+        if "outbox_batches" in r:
+            print(f"   outbox: {r['outbox_batches']} bulk callbacks, flushed in {r['outbox_flush_s']}s")
+        if "objects_per_second" in r:
+            print(
+                f"   deleted {r['objects_deleted']} versions in {r['invocations']} invocations "
+                f"({r['objects_per_second']} objects/sec)"
+            )
+        if "pool_claimed" in r:
+            print(f"   {r['pool_claimed']} tenants got pool buckets, {r['pool_conflicts']} conflicting claims")
+        if "mismatched" in r:
+            print(f"   {r['objects_checked']} objects checked against the source, {r['mismatched']} mismatched")
+        print(f"   {'step':<24}{'count':>7}{'p50 ms':>10}{'p99 ms':>10}")
+        for step, s in r["steps"].items():
+            print(f"   {step:<24}{s['count']:>7}{s['p50_ms']:>10}{s['p99_ms']:>10}")
+
+
+def check_baseline(results: dict, baseline_path: str, tolerance: float) -> list:
+    """Return a message for every scenario slower than its baseline allows."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for name, r in results.items():
+        if name not in baseline:
+            continue
+        limit = baseline[name]["wall_s"] * (1 + tolerance)
+        if r["wall_s"] > limit:
+            regressions.append(f"{name}: {r['wall_s']}s > {limit:.3f}s (baseline {baseline[name]['wall_s']}s)")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the tenant provisioner")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="scenario to run (repeatable, default all)")
+    parser.add_argument("--s3-latency-ms", type=float, default=20, help="latency of every S3 call")
+    parser.add_argument("--bucket-visibility-ms", type=float, default=0, help="delay before a new bucket is visible")
+    parser.add_argument("--secret-latency-ms", type=float, default=15, help="latency of Secrets Manager")
+    parser.add_argument("--callback-latency-ms", type=float, default=30, help="latency of the API callback")
+    parser.add_argument("--callback-failure-rate", type=float, default=0.0, help="share of callbacks answered 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="chance an S3 write attempt gets SlowDown")
+    parser.add_argument("--s3-capacity-rps", type=float, default=0, help="S3 write attempts per second before SlowDown")
+    parser.add_argument("--no-rate-limit", action="store_true", help="disable the provisioner's S3 rate limiter")
+    parser.add_argument("--tenants", type=int, default=200, help="tenants in the burst scenario")
+    parser.add_argument("--batch-size", type=int, default=10, help="SQS batch size in the burst scenario")
+    parser.add_argument("--invocations", type=int, default=4, help="concurrent invocations in the burst scenario")
+    parser.add_argument("--versions", type=int, default=100_000, help="object versions in the delete scenario")
+    parser.add_argument("--pool-size", type=int, default=20, help="pool buckets in the pool_claim scenario")
+    parser.add_argument("--objects", type=int, default=500, help="objects in the migrate and export_delete scenarios")
+    parser.add_argument("--object-size-kb", type=int, default=32, help="average object size in those scenarios")
+    parser.add_argument("--outbox", action="store_true", help="queue callbacks and deliver them in bulk")
+    parser.add_argument("--outbox-batch-size", type=int, default=100, help="callbacks per bulk request with --outbox")
+    parser.add_argument("--timeout", type=float, default=60, help="simulated Lambda timeout in seconds")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--save", help="write results to this file (use as a baseline)")
+    parser.add_argument("--baseline", help="fail if wall times regress against this results file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed wall time regression (0.2 = 20%%)")
+    parser.add_argument("--verbose", action="store_true", help="echo handler output to stderr")
+    args = parser.parse_args()
+
+    with CallbackServer(args.callback_latency_ms, args.callback_failure_rate) as server:
+        provisioner = load_provisioner(server.url)
+        provisioner.ratelimit.S3_RATE_LIMIT_ENABLED = not args.no_rate_limit
+        results = {
+            name: run_scenario(name, provisioner, server, args)
+            for name in (args.scenario or SCENARIOS)
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        regressions = check_baseline(results, args.baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
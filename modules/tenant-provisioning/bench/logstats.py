@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+Log Analyzer for the Tenant Provisioner
+
+Reads exported logs of /aws/lambda/<project>-<env>-tenant-provisioner (an S3
+export, `aws logs tail` output or plain files, optionally gzipped) and
+reports:
+- invocations: end-to-end duration per action from the runtime's REPORT
+               lines, with timeouts, errors and cold starts
+- steps:       p50/p90/p99 of every provisioning step, taken from the
+               handler's EMF records; when metrics are disabled, from the
+               gaps between timestamped milestones ("Bucket created", ...)
+- throughput:  purge, copy and export rates from their summary lines
+- callbacks:   delivered, failed, retried and skipped API callbacks
+- trend:       invocations, p50/p99 and callback failure rate per day/hour
+
+Handler output carries no request id, so lines are correlated through the
+runtime's START/END/REPORT RequestId lines: invocations in one log stream
+never overlap. Each file is one stream, except numbered chunks of an S3
+export (000000.gz, 000001.gz, ...), which share their directory's stream.
+
+Latencies go into log-bucketed histograms (about 1% relative error), so
+memory stays flat however many lines are read. With --state, histograms,
+per-file read offsets and invocations still open at the end of a chunk are
+saved; the next run only reads what was appended or added since, so a
+cron job over new exports tracks trends without a logging service.
+
+Usage:
+    python logstats.py exported-logs/
+    python logstats.py --state stats.json exported-logs/   # incremental
+    aws logs tail /aws/lambda/envelope-prod-tenant-provisioner --since 1h | python logstats.py -
+    python logstats.py --state stats.json --period hour --json
+"""
+
+import argparse
+import gzip
+import json
+import math
+import os
+import re
+import sys
+from datetime import datetime, timezone
+
+STATE_VERSION = 1
+
+# Bucket growth factor of the latency histograms: ~1% relative error
+HISTOGRAM_GAMMA = 1.02
+
+# Invocations left open (no END seen) beyond this many are dropped
+MAX_OPEN_REQUESTS = 10_000
+
+TIMESTAMP = re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?)\s+")
+LAMBDA_STREAM = re.compile(r"^(\d{4}/\d{2}/\d{2}/\[[^\]]*\][0-9a-f]+)\s+")
+EXPORT_CHUNK = re.compile(r"^\d+(\.gz)?$")
+
+START = re.compile(r"^START RequestId: (\S+)")
+END = re.compile(r"^END RequestId: (\S+)")
+REPORT = re.compile(r"^REPORT RequestId: (\S+)")
+REPORT_FIELD = re.compile(r"(?:^|\t)(Duration|Init Duration|Status): ([^\t]+?)(?: ms)?(?=\t|$)")
+# Output of the logging module: "[LEVEL]\t<time>\t<request id>\t<message>"
+LOGGER_PREFIX = re.compile(r"^\[[A-Z]+\]\t\S+\t\S+\t")
+
+RECEIVED = re.compile(r"^Received (\w+) for tenant ")
+THROUGHPUT = {
+    "purge": re.compile(r"^Purged (\d+) objects/versions in ([\d.]+)s"),
+    "copy": re.compile(r"^Copied (\d+) objects \((\d+) bytes\) in ([\d.]+)s"),
+    "export": re.compile(r"^Exported (\d+) objects \((\d+) bytes\) in ([\d.]+)s"),
+}
+CALLBACKS = {
+    "delivered": re.compile(r"^API callback success: "),
+    "failed": re.compile(r"^API callback failed: "),
+    "gave_up": re.compile(r"^API callback error: .*giving up"),
+    "retried": re.compile(r"^API callback attempt \d+ failed"),
+    "queued": re.compile(r"^API callback queued: "),
+    "skipped": re.compile(r"^Warning: API_CALLBACK_URL not configured"),
+}
+
+# Milestone lines and the step that ends with them, used when a request
+# has no EMF records (METRICS_ENABLED=false)
+MILESTONES = [
+    (re.compile(r"^Bucket created: "), "create_bucket"),
+    (re.compile(r"^Versioning enabled"), "versioning"),
+    (re.compile(r"^Encryption enabled"), "encryption"),
+    (re.compile(r"^EventBridge notifications enabled"), "notification"),
+    (re.compile(r"^Purged \d+ objects/versions"), "purge"),
+    (re.compile(r"^Copied \d+ objects"), "copy"),
+    (re.compile(r"^Exported \d+ objects"), "export"),
+    (re.compile(r"^API callback (success|failed|error)"), "callback"),
+]
+
+# Detail types as mapped to actions by provisioner.EVENT_ACTIONS
+EVENT_ACTIONS = {
+    "TenantCreated": "create",
+    "TenantDeleted": "delete",
+    "TenantMigrated": "migrate",
+}
+
+
+class Histogram:
+    """Log-bucketed histogram with bounded size and ~1% percentile error."""
+
+    def __init__(self, data: dict | None = None):
+        data = data or {}
+        self.bins = {int(k): v for k, v in data.get("bins", {}).items()}
+        self.count = data.get("count", 0)
+        self.total = data.get("total", 0.0)
+        self.max = data.get("max", 0.0)
+
+    def add(self, value: float) -> None:
+        index = math.ceil(math.log(max(value, 0.001), HISTOGRAM_GAMMA))
+        self.bins[index] = self.bins.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, pct: float) -> float:
+        """Upper bound of the bucket holding the nearest-rank percentile."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen >= rank:
+                return round(min(HISTOGRAM_GAMMA ** index, self.max), 2)
+        return round(self.max, 2)
+
+    def summary(self, percentiles: list) -> dict:
+        result = {"count": self.count}
+        for pct in percentiles:
+            result[f"p{pct:g}"] = self.percentile(pct)
+        result["max"] = round(self.max, 2)
+        result["mean"] = round(self.total / self.count, 2) if self.count else 0.0
+        return result
+
+    def to_dict(self) -> dict:
+        return {"bins": self.bins, "count": self.count, "total": self.total, "max": self.max}
+
+
+def parse_time(text: str) -> float | None:
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class Analyzer:
+    """Aggregates log lines into histograms and counters; state is JSON-serialisable."""
+
+    def __init__(self, state: dict | None = None, period: str = "day", keep_periods: int = 30):
+        state = state or {}
+        self.period = period
+        self.keep_periods = keep_periods
+        self.files = state.get("files", {})
+        self.open = state.get("open", {})
+        self.counters = state.get("counters", {"lines": 0, "invocations": 0, "unterminated": 0})
+        self.invocations = self._load(state.get("invocations", {}))
+        self.init = Histogram(state.get("init"))
+        self.outcomes = state.get("outcomes", {})
+        self.steps = self._load(state.get("steps", {}))
+        self.step_errors = state.get("step_errors", {})
+        self.throughput = state.get("throughput", {})
+        self.rates = self._load(state.get("rates", {}))
+        self.callbacks = state.get("callbacks", {name: 0 for name in CALLBACKS})
+        self.periods = state.get("periods", {})
+        self.period_durations = self._load(state.get("period_durations", {}))
+
+    @staticmethod
+    def _load(data: dict) -> dict:
+        return {key: Histogram(value) for key, value in data.items()}
+
+    def state(self) -> dict:
+        dump = lambda histograms: {key: h.to_dict() for key, h in histograms.items()}
+        return {
+            "version": STATE_VERSION,
+            "files": self.files,
+            "open": self.open,
+            "counters": self.counters,
+            "invocations": dump(self.invocations),
+            "init": self.init.to_dict(),
+            "outcomes": self.outcomes,
+            "steps": dump(self.steps),
+            "step_errors": self.step_errors,
+            "throughput": self.throughput,
+            "rates": dump(self.rates),
+            "callbacks": self.callbacks,
+            "periods": self.periods,
+            "period_durations": dump(self.period_durations),
+        }
+
+    def period_key(self, ts: float | None) -> str:
+        if ts is None:
+            return "unknown"
+        fmt = "%Y-%m-%dT%H:00" if self.period == "hour" else "%Y-%m-%d"
+        return datetime.fromtimestamp(ts, timezone.utc).strftime(fmt)
+
+    def period_stats(self, ts: float | None) -> dict:
+        key = self.period_key(ts)
+        if key not in self.periods:
+            self.periods[key] = {"invocations": 0, "callbacks": 0, "callback_failures": 0}
+            for old in sorted(self.periods)[:-self.keep_periods]:
+                del self.periods[old]
+                self.period_durations.pop(old, None)
+        # Lines older than every kept period are counted nowhere
+        return self.periods.get(key, {"invocations": 0, "callbacks": 0, "callback_failures": 0})
+
+    def histogram(self, histograms: dict, key: str) -> Histogram:
+        if key not in histograms:
+            histograms[key] = Histogram()
+        return histograms[key]
+
+    def feed(self, stream: str, line: str) -> None:
+        """Process one log line of a stream."""
+        self.counters["lines"] += 1
+        line = line.rstrip("\r\n")
+
+        ts = None
+        match = TIMESTAMP.match(line)
+        if match:
+            ts = parse_time(match.group(1))
+            line = line[match.end():]
+        match = LAMBDA_STREAM.match(line)
+        if match:
+            stream = match.group(1)
+            line = line[match.end():]
+        match = LOGGER_PREFIX.match(line)
+        if match:
+            line = line[match.end():]
+
+        if line.startswith("START RequestId: "):
+            self.start(stream, START.match(line).group(1), ts)
+            return
+        if line.startswith("END RequestId: "):
+            return
+        if line.startswith("REPORT RequestId: "):
+            self.report(stream, REPORT.match(line).group(1), line, ts)
+            return
+
+        request = self.open.get(stream)
+
+        if line.startswith("{") and '"_aws"' in line:
+            self.emf(request, line)
+            return
+
+        match = RECEIVED.match(line)
+        if match and request is not None:
+            action = EVENT_ACTIONS.get(match.group(1), "unknown")
+            if action not in request["actions"]:
+                request["actions"].append(action)
+            return
+
+        for kind, pattern in THROUGHPUT.items():
+            match = pattern.match(line)
+            if match:
+                count, seconds = int(match.group(1)), float(match.group(match.lastindex))
+                totals = self.throughput.setdefault(kind, {"runs": 0, "objects": 0, "bytes": 0, "seconds": 0.0})
+                totals["runs"] += 1
+                totals["objects"] += count
+                totals["seconds"] += seconds
+                if match.lastindex == 3:
+                    totals["bytes"] += int(match.group(2))
+                if seconds > 0:
+                    self.histogram(self.rates, kind).add(count / seconds)
+                break
+
+        for outcome, pattern in CALLBACKS.items():
+            if pattern.match(line):
+                self.callbacks[outcome] = self.callbacks.get(outcome, 0) + 1
+                if outcome in ("delivered", "failed", "gave_up"):
+                    stats = self.period_stats(ts)
+                    stats["callbacks"] += 1
+                    stats["callback_failures"] += outcome != "delivered"
+                break
+
+        if request is not None and ts is not None:
+            for pattern, step in MILESTONES:
+                if pattern.match(line) and request["mark"] is not None:
+                    request["milestones"].append([step, round((ts - request["mark"]) * 1000, 2)])
+                    request["mark"] = ts
+                    break
+
+    def start(self, stream: str, request_id: str, ts: float | None) -> None:
+        if stream in self.open:
+            self.counters["unterminated"] += 1
+        elif len(self.open) >= MAX_OPEN_REQUESTS:
+            del self.open[next(iter(self.open))]
+            self.counters["unterminated"] += 1
+        self.open[stream] = {"id": request_id, "actions": [], "emf": False, "milestones": [], "mark": ts}
+
+    def emf(self, request: dict | None, line: str) -> None:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return
+        if "Duration" not in record or "Step" not in record:
+            return
+        key = f"{record.get('Action', 'unknown')}/{record['Step']}"
+        self.histogram(self.steps, key).add(float(record["Duration"]))
+        if record.get("Status") == "error":
+            self.step_errors[key] = self.step_errors.get(key, 0) + 1
+        if request is not None:
+            request["emf"] = True
+
+    def report(self, stream: str, request_id: str, line: str, ts: float | None) -> None:
+        fields = dict(REPORT_FIELD.findall(line))
+        request = self.open.get(stream)
+        if request is not None and request["id"] != request_id:
+            request = None
+        if request is not None:
+            del self.open[stream]
+
+        actions = request["actions"] if request else []
+        action = actions[0] if len(actions) == 1 else ("batch" if actions else "unknown")
+
+        self.counters["invocations"] += 1
+        self.period_stats(ts)["invocations"] += 1
+        if "Duration" in fields:
+            duration = float(fields["Duration"])
+            self.histogram(self.invocations, action).add(duration)
+            if self.period_key(ts) in self.periods:
+                self.histogram(self.period_durations, self.period_key(ts)).add(duration)
+        if "Init Duration" in fields:
+            self.init.add(float(fields["Init Duration"]))
+
+        outcomes = self.outcomes.setdefault(action, {"ok": 0, "timeout": 0, "error": 0, "cold": 0})
+        status = fields.get("Status", "ok").strip()
+        outcomes[status if status in outcomes else "error"] += 1
+        outcomes["cold"] += "Init Duration" in fields
+
+        # Without EMF records, fall back to the gaps between milestones
+        if request is not None and not request["emf"] and action != "batch":
+            for step, ms in request["milestones"]:
+                self.histogram(self.steps, f"{action}/{step}").add(ms)
+
+    def report_dict(self, percentiles: list) -> dict:
+        callbacks = {name: self.callbacks.get(name, 0) for name in CALLBACKS}
+        attempted = callbacks["delivered"] + callbacks["failed"] + callbacks["gave_up"]
+        throughput = {}
+        for kind, totals in sorted(self.throughput.items()):
+            throughput[kind] = {
+                **totals,
+                "objects_per_second": round(totals["objects"] / totals["seconds"], 1) if totals["seconds"] else 0.0,
+                "run_objects_per_second": self.rates[kind].summary(percentiles) if kind in self.rates else {},
+            }
+        return {
+            "lines": self.counters["lines"],
+            "invocations": {
+                action: {**h.summary(percentiles), **self.outcomes.get(action, {})}
+                for action, h in sorted(self.invocations.items())
+            },
+            "init": self.init.summary(percentiles),
+            "steps": {
+                key: {**h.summary(percentiles), "errors": self.step_errors.get(key, 0)}
+                for key, h in sorted(self.steps.items())
+            },
+            "throughput": throughput,
+            "callbacks": {
+                **callbacks,
+                "failure_rate": round((callbacks["failed"] + callbacks["gave_up"]) / attempted, 4) if attempted else 0.0,
+            },
+            "trend": {
+                key: {
+                    **stats,
+                    **(self.period_durations[key].summary(percentiles) if key in self.period_durations else {}),
+                }
+                for key, stats in sorted(self.periods.items())
+            },
+            "open_invocations": len(self.open),
+            "unterminated": self.counters["unterminated"],
+        }
+
+
+def iter_paths(inputs: list, skip: str | None):
+    """Expand files and directories (recursively) into sorted file paths."""
+    for path in inputs:
+        if path == "-" or not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                if not name.startswith(".") and os.path.abspath(full) != skip:
+                    yield full
+
+
+def stream_name(path: str) -> str:
+    """Numbered export chunks of one log stream share their directory."""
+    if EXPORT_CHUNK.match(os.path.basename(path)):
+        return os.path.dirname(path)
+    return path
+
+
+def read_file(analyzer: Analyzer, path: str) -> None:
+    """Feed the unread part of a file, recording how far it was read."""
+    if path == "-":
+        for line in sys.stdin.buffer:
+            analyzer.feed("-", line.decode("utf-8", "replace"))
+        return
+
+    stat = os.stat(path)
+    seen = analyzer.files.get(path, {})
+    if seen.get("size") == stat.st_size and seen.get("mtime") == stat.st_mtime:
+        return
+
+    compressed = path.endswith(".gz")
+    offset = seen.get("offset", 0)
+    # A plain file smaller than before was replaced or truncated
+    if not compressed and stat.st_size < seen.get("size", 0):
+        offset = 0
+
+    stream = stream_name(path)
+    with (gzip.open if compressed else open)(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            # Leave a partly written last line for the next run
+            if not line.endswith(b"\n") and not compressed:
+                break
+            analyzer.feed(stream, line.decode("utf-8", "replace"))
+            offset += len(line)
+
+    analyzer.files[path] = {"offset": offset, "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def print_report(report: dict) -> None:
+    pcts = [key for key in report["init"] if key.startswith("p")]
+
+    def row(label: str, summary: dict, width: int = 28) -> str:
+        values = "".join(f"{summary.get(p, 0):>10}" for p in pcts)
+        return f"{label:<{width}}{summary['count']:>8}{values}{summary['max']:>10}"
+
+    header = "".join(f"{p:>10}" for p in pcts)
+    print(f"{'invocation (ms)':<28}{'count':>8}{header}{'max':>10}{'timeout':>9}{'error':>7}{'cold':>7}")
+    for action, s in report["invocations"].items():
+        print(f"{row(action, s)}{s.get('timeout', 0):>9}{s.get('error', 0):>7}{s.get('cold', 0):>7}")
+    if report["init"]["count"]:
+        print(row("init", report["init"]))
+
+    print(f"\n{'step (ms)':<28}{'count':>8}{header}{'max':>10}{'errors':>9}")
+    for key, s in report["steps"].items():
+        print(f"{row(key, s)}{s['errors']:>9}")
+
+    if report["throughput"]:
+        print(f"\n{'throughput':<28}{'runs':>8}{'objects':>12}{'seconds':>10}{'objects/s':>11}{'run p50':>10}")
+        for kind, t in report["throughput"].items():
+            p50 = t["run_objects_per_second"].get("p50", "-")
+            print(f"{kind:<28}{t['runs']:>8}{t['objects']:>12}{t['seconds']:>10.1f}{t['objects_per_second']:>11}{p50:>10}")
+
+    c = report["callbacks"]
+    print(
+        f"\ncallbacks: {c['delivered']} delivered, {c['failed']} failed, {c['gave_up']} gave up, "
+        f"{c['retried']} retried, {c['queued']} queued, {c['skipped']} skipped "
+        f"(failure rate {c['failure_rate']:.2%})"
+    )
+
+    if report["trend"]:
+        print(f"\n{'period':<20}{'invocations':>12}{'p50 ms':>10}{'p99 ms':>10}{'callback failures':>19}")
+        for key, t in report["trend"].items():
+            rate = t["callback_failures"] / t["callbacks"] if t["callbacks"] else 0.0
+            print(f"{key:<20}{t['invocations']:>12}{t.get('p50', 0):>10}{t.get('p99', 0):>10}{rate:>19.2%}")
+
+    if report["unterminated"] or report["open_invocations"]:
+        print(f"\n{report['open_invocations']} invocations still open, {report['unterminated']} never ended")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Latency and failure statistics from exported provisioner logs")
+    parser.add_argument("inputs", nargs="*", help="log files or directories (.gz allowed), - for stdin")
+    parser.add_argument("--state", help="load and save running totals here; only new log data is read")
+    parser.add_argument("--period", choices=["day", "hour"], default="day", help="granularity of the trend table")
+    parser.add_argument("--keep-periods", type=int, default=30, help="trend periods kept in the state")
+    parser.add_argument("--percentiles", default="50,90,99", help="comma-separated percentiles to report")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    state = None
+    if args.state and os.path.exists(args.state):
+        with open(args.state) as f:
+            state = json.load(f)
+        if state.get("version") != STATE_VERSION:
+            parser.error(f"{args.state} was written by an incompatible version; remove it to start over")
+
+    analyzer = Analyzer(state, args.period, args.keep_periods)
+    skip = os.path.abspath(args.state) if args.state else None
+    for path in iter_paths(args.inputs, skip):
+        read_file(analyzer, path)
+
+    if args.state:
+        with open(args.state + ".tmp", "w") as f:
+            json.dump(analyzer.state(), f)
+        os.replace(args.state + ".tmp", args.state)
+
+    report = analyzer.report_dict([float(p) for p in args.percentiles.split(",")])
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Cold Start Benchmark for the Tenant Provisioner
+
+Measures what a cold container pays before and during its first invocation,
+for each event type. Every sample runs in a fresh interpreter and records:
+- import_ms:     importing provisioner.py
+- sdk_import_ms: importing boto3/botocore (deferred until first AWS use)
+- first_call_ms: the first lambda_handler call, including client creation
+
+AWS requests are answered in-process through botocore's before-send hook, so
+serialisation and parsing are measured but no network or credentials are
+needed. API callbacks are disabled.
+
+Install: pip install boto3
+
+Usage: python startup.py [--runs 5] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda")
+
+EVENTS = {
+    "TenantCreated": {"detail-type": "TenantCreated", "detail": {"tenant_id": "1001"}},
+    "TenantDeleted": {"detail-type": "TenantDeleted", "detail": {"tenant_id": "1001"}},
+    "Invalid": {"detail-type": "TenantCreated", "detail": {}},
+}
+
+# Runs inside the fresh interpreter; prints one JSON line of timings
+SAMPLE_SCRIPT = r'''
+import json, sys, time
+
+started = time.perf_counter()
+import provisioner
+import_ms = (time.perf_counter() - started) * 1000
+
+event = json.loads(sys.argv[1])
+needs_aws = bool(event["detail"])
+
+sdk_import_ms = 0.0
+if needs_aws:
+    started = time.perf_counter()
+    import boto3
+    from botocore.awsrequest import AWSResponse
+    sdk_import_ms = (time.perf_counter() - started) * 1000
+
+    EMPTY_VERSIONS = (
+        b'<?xml version="1.0" encoding="UTF-8"?>'
+        b'<ListVersionsResult><IsTruncated>false</IsTruncated></ListVersionsResult>'
+    )
+
+    class Body:
+        def __init__(self, data):
+            self.data = data
+
+        def stream(self, **kwargs):
+            yield self.data
+
+    created = set()
+
+    def respond(request, event_name, **kwargs):
+        operation = event_name.rsplit(".", 1)[-1]
+        status, body = 200, b""
+        if operation == "HeadBucket":
+            exists = event["detail-type"] == "TenantDeleted" or request.url in created
+            status = 200 if exists else 404
+        elif operation == "CreateBucket":
+            created.add(request.url)
+        elif operation == "ListObjectVersions":
+            body = EMPTY_VERSIONS
+        elif operation in ("DeleteBucket", "PutBucketPolicy"):
+            status = 204
+        return AWSResponse(request.url, status, {}, Body(body))
+
+    boto3.setup_default_session(
+        aws_access_key_id="bench", aws_secret_access_key="bench", region_name="eu-west-2"
+    )
+    boto3.DEFAULT_SESSION.events.register("before-send", respond)
+
+started = time.perf_counter()
+provisioner.lambda_handler(event, None)
+first_call_ms = (time.perf_counter() - started) * 1000
+
+print(json.dumps({
+    "import_ms": import_ms,
+    "sdk_import_ms": sdk_import_ms,
+    "first_call_ms": first_call_ms,
+}))
+'''
+
+
+def run_sample(event: dict) -> dict:
+    """Run one cold start in a fresh interpreter and return its timings."""
+    env = dict(os.environ, API_CALLBACK_URL="", PYTHONDONTWRITEBYTECODE="1")
+    output = subprocess.run(
+        [sys.executable, "-c", SAMPLE_SCRIPT, json.dumps(event)],
+        cwd=LAMBDA_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarise(samples: list) -> dict:
+    """Median and max of each timing across samples."""
+    summary = {}
+    for key in ("import_ms", "sdk_import_ms", "first_call_ms"):
+        values = [s[key] for s in samples]
+        summary[key] = {
+            "median": round(statistics.median(values), 1),
+            "max": round(max(values), 1),
+        }
+    summary["total_ms"] = round(
+        statistics.median(s["import_ms"] + s["sdk_import_ms"] + s["first_call_ms"] for s in samples), 1
+    )
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cold start benchmark for the tenant provisioner")
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per event type")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = {
+        name: summarise([run_sample(event) for _ in range(args.runs)])
+        for name, event in EVENTS.items()
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'event':<15}{'import':>10}{'sdk import':>12}{'first call':>12}{'total':>10}   (median ms, {args.runs} runs)")
+    for name, r in results.items():
+        print(
+            f"{name:<15}{r['import_ms']['median']:>10}{r['sdk_import_ms']['median']:>12}"
+            f"{r['first_call_ms']['median']:>12}{r['total_ms']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,527 @@
+"""
+Tenant Bucket Export
+
+Streams the current objects of a tenant bucket into compressed archive
+parts (tar.gz) in a retention bucket, so a departing tenant's documents are
+handed over before the purge deletes them.
+
+Objects are read with ranged GETs of EXPORT_CHUNK_SIZE, several in flight
+at once and in key order, at most EXPORT_READ_AHEAD chunks ahead of the
+archive writer. The archive stream is gzip-compressed and uploaded as a
+multipart upload while it is written. Memory therefore stays bounded by the
+read-ahead and one upload chunk, whatever the size of the objects.
+
+An archive part is closed at the next object boundary once it holds
+EXPORT_PART_SIZE compressed bytes. Each part has a manifest (JSON lines)
+with the key, size, ETag and SHA-256 of every object in it.
+
+An archive cannot be checkpointed inside an object, so objects over
+EXPORT_ARCHIVE_MAX_OBJECT_SIZE are not archived: they are copied as they
+are, server-side and in parallel parts of EXPORT_COPY_PART_SIZE, to
+objects/{key}. Such a copy can stop between parts and resume its multipart
+upload in a later run.
+
+When everything is written a manifest.json lists the archive parts (with
+their sizes and SHA-256 checksums) and the copied objects:
+
+    exports/{tenant_id}/{export_id}/part-00001.tar.gz
+    exports/{tenant_id}/{export_id}/part-00001.jsonl
+    exports/{tenant_id}/{export_id}/objects/{key}
+    exports/{tenant_id}/{export_id}/manifest.json
+
+Like the purge (see purge.py), an export can be bounded by the invocation
+deadline. When the remaining time drops below EXPORT_RESERVE_MS the current
+part is closed early, or a large copy stops after its parts in flight, and
+a checkpoint is returned; passing it to a later export_bucket call
+continues from there. EXPORT_ARCHIVE_MAX_OBJECT_SIZE must be small enough
+to archive within EXPORT_RESERVE_MS.
+
+The list of parts written so far grows with the export, so a paused export
+keeps it in parts.json next to the parts rather than in the checkpoint,
+which travels in an asynchronous invocation payload (at most 256 KB).
+parts.json is removed once manifest.json is written.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tarfile
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+EXPORT_BUCKET = os.environ.get("EXPORT_BUCKET", "")
+EXPORT_PART_SIZE = int(os.environ.get("EXPORT_PART_SIZE", str(256 * 1024 * 1024)))
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", str(8 * 1024 * 1024)))
+EXPORT_READ_WORKERS = int(os.environ.get("EXPORT_READ_WORKERS", "4"))
+EXPORT_READ_AHEAD = int(os.environ.get("EXPORT_READ_AHEAD", "8"))
+EXPORT_COMPRESSION_LEVEL = int(os.environ.get("EXPORT_COMPRESSION_LEVEL", "1"))
+EXPORT_RESERVE_MS = int(os.environ.get("EXPORT_RESERVE_MS", "15000"))
+EXPORT_ARCHIVE_MAX_OBJECT_SIZE = int(os.environ.get("EXPORT_ARCHIVE_MAX_OBJECT_SIZE", str(128 * 1024 * 1024)))
+EXPORT_COPY_PART_SIZE = int(os.environ.get("EXPORT_COPY_PART_SIZE", str(256 * 1024 * 1024)))
+EXPORT_COPY_WORKERS = int(os.environ.get("EXPORT_COPY_WORKERS", "8"))
+
+EXPORTS_PREFIX = "exports/"
+
+# Size of the multipart upload parts of an archive (S3 minimum is 5 MiB)
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# A multipart upload has at most this many parts
+MAX_PARTS = 10000
+
+
+class ArchiveUpload:
+    """
+    Write-only file object that uploads what is written as a multipart upload.
+
+    Full chunks are uploaded in the background, one at a time, while the
+    next one fills. S3 verifies each chunk against a SHA-256 checksum; the
+    SHA-256 of the whole archive is computed as it is written.
+    """
+
+    def __init__(self, s3: Any, bucket: str, key: str):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self._buffer = bytearray()
+        self._parts = []
+        self._pending = None
+        self._uploader = ThreadPoolExecutor(max_workers=1)
+        self.upload_id = s3.create_multipart_upload(
+            Bucket=bucket,
+            Key=key,
+            ContentType="application/gzip",
+            ChecksumAlgorithm="SHA256"
+        )["UploadId"]
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        self.size += len(data)
+        self.sha256.update(data)
+        if len(self._buffer) >= UPLOAD_CHUNK_SIZE:
+            self._upload(bytes(self._buffer))
+            self._buffer.clear()
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def _upload_part(self, number: int, body: bytes) -> dict:
+        response = self.s3.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=number,
+            Body=body,
+            ChecksumAlgorithm="SHA256"
+        )
+        return {"PartNumber": number, "ETag": response["ETag"], "ChecksumSHA256": response["ChecksumSHA256"]}
+
+    def _upload(self, body: bytes) -> None:
+        # At most one chunk uploading while the next fills
+        if self._pending:
+            self._parts.append(self._pending.result())
+        self._pending = self._uploader.submit(self._upload_part, len(self._parts) + 1, body)
+
+    def close(self) -> None:
+        """Upload the rest and complete the upload."""
+        if self._buffer or not self._parts and not self._pending:
+            self._upload(bytes(self._buffer))
+            self._buffer.clear()
+        self._parts.append(self._pending.result())
+        self._uploader.shutdown()
+        self.s3.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": self._parts}
+        )
+
+    def abort(self) -> None:
+        self._uploader.shutdown(cancel_futures=True)
+        self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+
+class ObjectReader:
+    """
+    Read-only file object over the prefetched chunks of one object.
+
+    Returns exactly the bytes asked for (as tarfile expects) across chunk
+    boundaries, and computes the object's SHA-256 as it is read.
+    """
+
+    def __init__(self, chunks: Callable[[], bytes]):
+        self._next_chunk = chunks
+        self._chunk = memoryview(b"")
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size: int) -> bytes:
+        out = bytearray()
+        while len(out) < size:
+            if not self._chunk:
+                self._chunk = memoryview(self._next_chunk())
+                if not self._chunk:
+                    break
+            taken = self._chunk[:size - len(out)]
+            out += taken
+            self._chunk = self._chunk[len(taken):]
+        self.sha256.update(out)
+        return bytes(out)
+
+
+def read_range(s3: Any, bucket_name: str, obj: dict, first: int, last: int) -> bytes:
+    """Read a byte range of the listed version of an object (by ETag)."""
+    return s3.get_object(
+        Bucket=bucket_name,
+        Key=obj["Key"],
+        Range=f"bytes={first}-{last}",
+        IfMatch=obj["ETag"]
+    )["Body"].read()
+
+
+def iter_objects(s3: Any, bucket_name: str, start_after: str = ""):
+    """Yield every current object after start_after, in key order."""
+    params = {"Bucket": bucket_name}
+    if start_after:
+        params["StartAfter"] = start_after
+
+    while True:
+        page = s3.list_objects_v2(**params)
+        yield from page.get("Contents", [])
+
+        if not page.get("IsTruncated"):
+            return
+        params = {"Bucket": bucket_name, "ContinuationToken": page["NextContinuationToken"]}
+
+
+def export_prefix(tenant_id: str, export_id: str) -> str:
+    return f"{EXPORTS_PREFIX}{tenant_id}/{export_id}/"
+
+
+def save_parts(out_s3: Any, key: str, parts: list) -> None:
+    """Keep the parts written so far while the export is paused."""
+    out_s3.put_object(
+        Bucket=EXPORT_BUCKET,
+        Key=key,
+        Body=json.dumps(parts).encode("utf-8"),
+        ContentType="application/json"
+    )
+
+
+def load_parts(out_s3: Any, key: str) -> list:
+    """The parts written by earlier runs of a paused export."""
+    return json.loads(out_s3.get_object(Bucket=EXPORT_BUCKET, Key=key)["Body"].read())
+
+
+def archived(obj: dict) -> bool:
+    """Whether an object goes into an archive part rather than being copied."""
+    return obj["Size"] <= EXPORT_ARCHIVE_MAX_OBJECT_SIZE
+
+
+def copied_parts(out_s3: Any, key: str, upload_id: str) -> list:
+    """Parts already copied to a multipart upload, from S3 itself."""
+    parts = []
+    params = {"Bucket": EXPORT_BUCKET, "Key": key, "UploadId": upload_id}
+    while True:
+        page = out_s3.list_parts(**params)
+        parts.extend({"PartNumber": p["PartNumber"], "ETag": p["ETag"]} for p in page.get("Parts", []))
+        if not page.get("IsTruncated"):
+            return parts
+        params["PartNumberMarker"] = page["NextPartNumberMarker"]
+
+
+def copy_object(
+    out_s3: Any,
+    bucket_name: str,
+    obj: dict,
+    key: str,
+    state: dict,
+    remaining_ms: Callable[[], int] | None = None,
+) -> bool:
+    """
+    Copy an object to key in EXPORT_BUCKET with parallel UploadPartCopy calls.
+
+    state holds the open upload ({"key", "etag", "upload_id"}) and is kept
+    in the checkpoint; the parts already copied are listed from S3 rather
+    than carried along. Parts are copied from the listed version (by ETag);
+    an upload for an older version is aborted and started over. Returns
+    False when the deadline stopped the copy, after at least one part.
+    """
+    if state.get("upload_id") and (state.get("key") != obj["Key"] or state.get("etag") != obj["ETag"]):
+        out_s3.abort_multipart_upload(Bucket=EXPORT_BUCKET, Key=key, UploadId=state["upload_id"])
+        state.clear()
+
+    if state.get("upload_id"):
+        parts = copied_parts(out_s3, key, state["upload_id"])
+    else:
+        state.update(key=obj["Key"], etag=obj["ETag"], upload_id=out_s3.create_multipart_upload(
+            Bucket=EXPORT_BUCKET,
+            Key=key,
+            ContentType="application/octet-stream"
+        )["UploadId"])
+        parts = []
+
+    size = obj["Size"]
+    part_size = max(EXPORT_COPY_PART_SIZE, -(-size // MAX_PARTS))
+    done = {part["PartNumber"] for part in parts}
+    todo = [
+        (number, first, min(first + part_size, size) - 1)
+        for number, first in enumerate(range(0, size, part_size), start=1)
+        if number not in done
+    ]
+
+    def copy_part(number: int, first: int, last: int) -> dict:
+        response = out_s3.upload_part_copy(
+            Bucket=EXPORT_BUCKET,
+            Key=key,
+            UploadId=state["upload_id"],
+            PartNumber=number,
+            CopySource={"Bucket": bucket_name, "Key": obj["Key"]},
+            CopySourceIfMatch=obj["ETag"],
+            CopySourceRange=f"bytes={first}-{last}"
+        )
+        return {"PartNumber": number, "ETag": response["CopyPartResult"]["ETag"]}
+
+    total = -(-size // part_size)
+    stopped = False
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=EXPORT_COPY_WORKERS) as pool:
+        for item in todo:
+            if len(in_flight) >= EXPORT_COPY_WORKERS:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                parts.extend(future.result() for future in finished)
+            if (in_flight or len(parts) > len(done)) and remaining_ms and remaining_ms() < EXPORT_RESERVE_MS:
+                stopped = True
+                break
+            in_flight.add(pool.submit(copy_part, *item))
+        parts.extend(future.result() for future in wait(in_flight)[0])
+
+    if stopped:
+        print(f"Copy of {obj['Key']} paused after {len(parts)} of {total} parts")
+        return False
+
+    out_s3.complete_multipart_upload(
+        Bucket=EXPORT_BUCKET,
+        Key=key,
+        UploadId=state["upload_id"],
+        MultipartUpload={"Parts": sorted(parts, key=lambda part: part["PartNumber"])}
+    )
+    state.clear()
+    return True
+
+
+def export_bucket(
+    s3: Any,
+    out_s3: Any,
+    bucket_name: str,
+    tenant_id: str,
+    checkpoint: dict | None = None,
+    remaining_ms: Callable[[], int] | None = None,
+) -> dict:
+    """
+    Export the current objects of a bucket to EXPORT_BUCKET.
+
+    s3 reads the tenant bucket, out_s3 writes to EXPORT_BUCKET. At least one
+    object is exported per run. Returns the objects and bytes exported in
+    this run and in total, whether the export is complete and either the
+    location of manifest.json or the checkpoint to resume from.
+    """
+    if not EXPORT_BUCKET:
+        raise ValueError("EXPORT_BUCKET not configured")
+
+    checkpoint = checkpoint or {}
+    export_id = checkpoint.get("export_id") or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    prefix = export_prefix(tenant_id, export_id)
+    parts_key = f"{prefix}parts.json"
+    parts = load_parts(out_s3, parts_key) if checkpoint.get("parts") else []
+    start_after = checkpoint.get("start_after", "")
+    copying = dict(checkpoint.get("copy", {}))
+    started = time.monotonic()
+    exported = 0
+    exported_bytes = 0
+    complete = True
+
+    objects = iter_objects(s3, bucket_name, start_after)
+    current = next(objects, None)
+
+    with ThreadPoolExecutor(max_workers=EXPORT_READ_WORKERS) as readers:
+        # Chunk reads in key order: (object, future), at most EXPORT_READ_AHEAD ahead
+        reads = deque()
+
+        def chunk_plan(obj: dict | None):
+            # Each archived object's chunk ranges, then a marker carrying the next object
+            while obj is not None:
+                for first in range(0, obj["Size"] if archived(obj) else 0, EXPORT_CHUNK_SIZE):
+                    yield obj, first, min(first + EXPORT_CHUNK_SIZE, obj["Size"]) - 1
+                obj = next(objects, None)
+                yield obj, None, None
+
+        plan = chunk_plan(current)
+
+        def fill() -> None:
+            while len(reads) < EXPORT_READ_AHEAD:
+                item = next(plan, None)
+                if item is None:
+                    return
+                obj, first, last = item
+                if first is None:
+                    reads.append((obj, None))
+                else:
+                    reads.append((obj, readers.submit(read_range, s3, bucket_name, obj, first, last)))
+
+        def next_chunk() -> bytes:
+            # Chunks of the object being archived; b"" at its end
+            fill()
+            _, future = reads[0]
+            if future is None:
+                return b""
+            reads.popleft()
+            return future.result()
+
+        while current is not None:
+            if not archived(current):
+                key = f"{prefix}objects/{current['Key']}"
+                if not copy_object(out_s3, bucket_name, current, key, copying, remaining_ms):
+                    complete = False
+                    break
+
+                parts.append({
+                    "type": "object",
+                    "key": key,
+                    "source_key": current["Key"],
+                    "size": current["Size"],
+                    "etag": current["ETag"].strip('"')
+                })
+                print(f"Export object {key} copied: {current['Size']} bytes")
+                exported += 1
+                exported_bytes += current["Size"]
+                start_after = current["Key"]
+
+                fill()
+                current = reads.popleft()[0]
+                if current is not None and remaining_ms and remaining_ms() < EXPORT_RESERVE_MS:
+                    complete = False
+                    break
+                continue
+
+            number = sum(part.get("type", "archive") == "archive" for part in parts) + 1
+            part_key = f"{prefix}part-{number:05d}.tar.gz"
+            upload = ArchiveUpload(out_s3, EXPORT_BUCKET, part_key)
+            manifest = []
+            try:
+                with gzip.GzipFile(fileobj=upload, mode="wb", compresslevel=EXPORT_COMPRESSION_LEVEL) as gz, \
+                        tarfile.open(fileobj=gz, mode="w|", format=tarfile.PAX_FORMAT, copybufsize=1024 * 1024) as tar:
+                    while current is not None:
+                        info = tarfile.TarInfo(current["Key"])
+                        info.size = current["Size"]
+                        info.mtime = current["LastModified"].timestamp()
+                        reader = ObjectReader(next_chunk)
+                        tar.addfile(info, reader)
+                        # Write-only archives need no member list; keep memory flat
+                        tar.members.clear()
+
+                        manifest.append({
+                            "key": current["Key"],
+                            "size": current["Size"],
+                            "etag": current["ETag"].strip('"'),
+                            "sha256": reader.sha256.hexdigest()
+                        })
+                        exported += 1
+                        exported_bytes += current["Size"]
+                        start_after = current["Key"]
+
+                        # Move past the end-of-object marker to the next object
+                        fill()
+                        current = reads.popleft()[0]
+
+                        if current is None or upload.size >= EXPORT_PART_SIZE or not archived(current):
+                            break
+                        if remaining_ms and remaining_ms() < EXPORT_RESERVE_MS:
+                            complete = False
+                            break
+            except Exception:
+                upload.abort()
+                raise
+            upload.close()
+
+            out_s3.put_object(
+                Bucket=EXPORT_BUCKET,
+                Key=f"{prefix}part-{number:05d}.jsonl",
+                Body="".join(json.dumps(entry) + "\n" for entry in manifest).encode("utf-8"),
+                ContentType="application/x-ndjson"
+            )
+            parts.append({
+                "type": "archive",
+                "key": part_key,
+                "size": upload.size,
+                "sha256": upload.sha256.hexdigest(),
+                "objects": len(manifest)
+            })
+            print(f"Export part {part_key} written: {len(manifest)} objects, {upload.size} bytes")
+
+            if not complete:
+                break
+
+        if not complete:
+            print(f"Stopping export before deadline at key {start_after}")
+            for _, future in reads:
+                if future:
+                    future.cancel()
+
+    elapsed = time.monotonic() - started
+    rate = exported_bytes / elapsed if elapsed > 0 else 0.0
+    print(f"Exported {exported} objects ({exported_bytes} bytes) in {elapsed:.2f}s ({rate / 1048576:.1f} MiB/sec)")
+
+    result = {
+        "exported": exported,
+        "bytes": exported_bytes,
+        "seconds": round(elapsed, 3),
+        "bytes_per_second": round(rate, 1),
+        "complete": complete,
+        "total_exported": checkpoint.get("exported", 0) + exported,
+        "total_bytes": checkpoint.get("bytes", 0) + exported_bytes,
+        "runs": checkpoint.get("runs", 0) + 1
+    }
+
+    if not complete:
+        if len(parts) > checkpoint.get("parts", 0):
+            save_parts(out_s3, parts_key, parts)
+        result["checkpoint"] = {
+            "export_id": export_id,
+            "start_after": start_after,
+            "parts": len(parts),
+            **({"copy": copying} if copying else {}),
+            "exported": result["total_exported"],
+            "bytes": result["total_bytes"],
+            "runs": result["runs"]
+        }
+        return result
+
+    manifest_key = f"{prefix}manifest.json"
+    out_s3.put_object(
+        Bucket=EXPORT_BUCKET,
+        Key=manifest_key,
+        Body=json.dumps({
+            "tenant_id": tenant_id,
+            "bucket": bucket_name,
+            "export_id": export_id,
+            "completed": datetime.now(timezone.utc).isoformat(),
+            "objects": result["total_exported"],
+            "bytes": result["total_bytes"],
+            "format": "tar.gz",
+            "parts": parts
+        }, indent=2).encode("utf-8"),
+        ContentType="application/json"
+    )
+    if checkpoint.get("parts"):
+        out_s3.delete_object(Bucket=EXPORT_BUCKET, Key=parts_key)
+    result["manifest"] = f"s3://{EXPORT_BUCKET}/{manifest_key}"
+    return result
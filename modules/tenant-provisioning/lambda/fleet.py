@@ -0,0 +1,189 @@
+"""
+Tenant Bucket Fleet Audit
+
+Audits every tenant bucket of an environment against the desired
+configuration in provisioner.desired_config() and optionally applies the
+fixes. This is how changes to the bucket policy, CORS origins, lifecycle
+rules, tags or event notifications reach buckets created before the change
+was deployed. Buckets from before storage profiles move to the default
+profile.
+
+Buckets are those named {TENANT_BUCKET_PREFIX}{tenant_id}-{ENVIRONMENT},
+plus pool buckets (see pool.py): claimed ones are audited as their tenant's
+bucket, unclaimed ones against the pool configuration. They are audited in
+parallel by a worker pool. Each audit reads all settings concurrently and
+only drifted settings are re-applied.
+
+Usable as a Lambda (handler fleet.lambda_handler) or from the command line:
+
+    ENVIRONMENT=prod TENANT_BUCKET_PREFIX=envelope-tenant- python fleet.py
+    ENVIRONMENT=prod TENANT_BUCKET_PREFIX=envelope-tenant- python fleet.py --apply
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any
+
+import metrics
+import pool
+import provisioner
+import ratelimit
+from provisioner import bucket_storage_profile, desired_config, get_client, pool_config, reconcile_bucket
+
+FLEET_WORKERS = int(os.environ.get("FLEET_WORKERS", "16"))
+
+# Stop auditing when less than this is left in the invocation
+FLEET_RESERVE_MS = 30000
+
+
+def list_tenant_buckets(tenant_ids: list | None = None) -> dict:
+    """
+    Return {bucket_name: tenant_id} for every tenant bucket of this environment.
+
+    Unclaimed pool buckets map to None and are left out when filtering by
+    tenant.
+    """
+    prefix = provisioner.TENANT_BUCKET_PREFIX
+    suffix = f"-{provisioner.ENVIRONMENT}"
+    assigned = pool.assignments(get_client("s3")) if pool.STATE_BUCKET else {}
+
+    # ListBuckets is paginated; a single call only returns the first page
+    pages = get_client("s3").get_paginator("list_buckets").paginate(Prefix=prefix)
+
+    buckets = {}
+    for bucket in (b for page in pages for b in page.get("Buckets", [])):
+        name = bucket["Name"]
+        if not (name.startswith(prefix) and name.endswith(suffix)):
+            continue
+
+        # ListBuckets reports the region, saving later requests a redirect
+        provisioner.remember_bucket_region(name, bucket.get("BucketRegion"))
+        tenant_id = assigned.get(name) if pool.is_pool_bucket(name) else name[len(prefix):-len(suffix)]
+        if tenant_ids is None or tenant_id in tenant_ids:
+            buckets[name] = tenant_id
+
+    return buckets
+
+
+def audit_bucket(bucket_name: str, tenant_id: str, apply: bool) -> dict:
+    """
+    Audit (and with apply=True, fix) one tenant bucket, or an unclaimed pool bucket.
+
+    A tenant bucket is audited against the storage profile recorded on it.
+    """
+    metrics.set_action("audit")
+    if not tenant_id:
+        return reconcile_bucket(bucket_name, pool_config(bucket_name), apply=apply)
+
+    desired = desired_config(bucket_name, tenant_id, bucket_storage_profile(bucket_name))
+    return reconcile_bucket(bucket_name, desired, apply=apply)
+
+
+def audit_fleet(
+    apply: bool = False,
+    workers: int = FLEET_WORKERS,
+    tenant_ids: list | None = None,
+    context: Any = None,
+) -> dict:
+    """
+    Audit all tenant buckets in parallel and return a drift report.
+
+    Inside Lambda, buckets not yet audited when the invocation nears its
+    deadline are reported as skipped so the run can be repeated for them.
+    """
+    started = time.monotonic()
+    buckets = list_tenant_buckets(tenant_ids)
+    print(f"Auditing {len(buckets)} tenant buckets with {workers} workers (apply={apply})")
+
+    report = {
+        "environment": provisioner.ENVIRONMENT,
+        "prefix": provisioner.TENANT_BUCKET_PREFIX,
+        "apply": apply,
+        "buckets": len(buckets),
+        "in_sync": 0,
+        "drifted": {},
+        "applied": {},
+        "errors": {},
+        "skipped": [],
+    }
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(audit_bucket, name, tenant_id, apply): name
+            for name, tenant_id in buckets.items()
+        }
+
+        for future in as_completed(futures):
+            name = futures[future]
+            # Cancelled at the deadline; already reported as skipped
+            if future.cancelled():
+                continue
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Audit of {name} failed: {str(e)}")
+                report["errors"][name] = str(e)
+            else:
+                if result["drift"]:
+                    report["drifted"][name] = result["drift"]
+                else:
+                    report["in_sync"] += 1
+                if result["applied"]:
+                    report["applied"][name] = result["applied"]
+
+            if context and not report["skipped"] and context.get_remaining_time_in_millis() < FLEET_RESERVE_MS:
+                report["skipped"] = [n for f, n in futures.items() if f.cancel()]
+
+    report["seconds"] = round(time.monotonic() - started, 1)
+    report["s3_rate_limits"] = ratelimit.stats()
+    ratelimit.emit_metrics()
+    print(
+        f"Fleet audit complete in {report['seconds']}s: {report['in_sync']} in sync, "
+        f"{len(report['drifted'])} drifted, {len(report['applied'])} fixed, "
+        f"{len(report['errors'])} errors, {len(report['skipped'])} skipped"
+    )
+
+    return report
+
+
+def lambda_handler(event: dict, context: Any) -> dict:
+    """
+    Lambda entry point.
+
+    Event structure (all fields optional):
+    {
+        "apply": false,
+        "workers": 16,
+        "tenant_ids": ["123", "456"]
+    }
+    """
+    return audit_fleet(
+        apply=bool(event.get("apply", False)),
+        workers=int(event.get("workers", FLEET_WORKERS)),
+        tenant_ids=event.get("tenant_ids"),
+        context=context,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Audit tenant buckets for configuration drift")
+    parser.add_argument("--apply", action="store_true", help="fix drifted buckets")
+    parser.add_argument("--workers", type=int, default=FLEET_WORKERS, help="buckets audited in parallel")
+    parser.add_argument("--tenant", action="append", dest="tenant_ids", help="limit to a tenant id (repeatable)")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = audit_fleet(apply=args.apply, workers=args.workers, tenant_ids=args.tenant_ids)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Idempotency Store for Tenant Events
+
+EventBridge delivers at least once and failed async invocations are
+retried, so the same tenant event can arrive several times. Completed
+outcomes are recorded under a key built from the event id and the tenant
+action; a redelivered event returns the recorded outcome without touching
+the tenant bucket or the API again.
+
+Backends share a small interface (get/put with a TTL) and are chosen by
+name through BACKENDS:
+- memory: per-container dict, for tests and local runs
+- file:   a JSON file, for tests and local runs across processes
+- s3:     objects under idempotency/ in the provisioner state bucket
+
+Every store is fronted by a per-container memory cache, so duplicates that
+reach a warm container cost no request at all.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable
+
+# Outcomes stay in the per-container cache at most this many entries
+LOCAL_CACHE_SIZE = 1000
+
+
+def event_key(event: dict) -> str | None:
+    """
+    Idempotency key of an event: its id plus the tenant action.
+
+    Events without an id (manual invocations) have no key and are always
+    processed.
+    """
+    event_id = event.get("id")
+    tenant_id = event.get("detail", {}).get("tenant_id")
+    if not event_id or not tenant_id:
+        return None
+    return f"{event_id}/{event.get('detail-type', '')}/{tenant_id}"
+
+
+class MemoryStore:
+    """Outcomes held in this process only."""
+
+    def __init__(self, max_entries: int | None = None):
+        self.max_entries = max_entries
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item["expires_at"] <= time.time():
+                del self._items[key]
+                return None
+            return item["outcome"]
+
+    def put(self, key: str, outcome: dict, ttl_seconds: int) -> None:
+        with self._lock:
+            self._items[key] = {"expires_at": time.time() + ttl_seconds, "outcome": outcome}
+            # Dicts keep insertion order, so the oldest entries go first
+            while self.max_entries and len(self._items) > self.max_entries:
+                del self._items[next(iter(self._items))]
+
+
+class FileStore:
+    """Outcomes in a local JSON file, shared by processes on one machine."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path) as f:
+                items = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+        now = time.time()
+        return {key: item for key, item in items.items() if item["expires_at"] > now}
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            item = self._load().get(key)
+        return item["outcome"] if item else None
+
+    def put(self, key: str, outcome: dict, ttl_seconds: int) -> None:
+        with self._lock:
+            items = self._load()
+            items[key] = {"expires_at": time.time() + ttl_seconds, "outcome": outcome}
+
+            # Write a sibling file and swap it in so readers never see half a file
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(items, f)
+            os.replace(temp_path, self.path)
+
+
+class S3Store:
+    """
+    Outcomes as objects in the provisioner state bucket.
+
+    Expired records are ignored on read; a lifecycle rule on the prefix
+    removes them.
+    """
+
+    prefix = "idempotency/"
+
+    def __init__(self, bucket: str, client: Callable[[], Any]):
+        if not bucket:
+            raise ValueError("STATE_BUCKET not configured")
+        self.bucket = bucket
+        self.client = client
+
+    def get(self, key: str) -> dict | None:
+        s3 = self.client()
+        try:
+            response = s3.get_object(Bucket=self.bucket, Key=f"{self.prefix}{key}")
+        except s3.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+
+        item = json.loads(response["Body"].read())
+        return item["outcome"] if item["expires_at"] > time.time() else None
+
+    def put(self, key: str, outcome: dict, ttl_seconds: int) -> None:
+        item = {"expires_at": time.time() + ttl_seconds, "outcome": outcome}
+        self.client().put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}{key}",
+            Body=json.dumps(item, default=str).encode("utf-8"),
+            ContentType="application/json"
+        )
+
+
+class CachedStore:
+    """A store fronted by a bounded per-container memory cache."""
+
+    def __init__(self, store: Any):
+        self.store = store
+        self.cache = MemoryStore(max_entries=LOCAL_CACHE_SIZE)
+
+    def get(self, key: str) -> dict | None:
+        outcome = self.cache.get(key)
+        if outcome is None and self.store is not None:
+            outcome = self.store.get(key)
+        return outcome
+
+    def put(self, key: str, outcome: dict, ttl_seconds: int) -> None:
+        self.cache.put(key, outcome, ttl_seconds)
+        if self.store is not None:
+            self.store.put(key, outcome, ttl_seconds)
+
+
+# Backend factories by name; each takes the settings dict of create_store()
+BACKENDS = {
+    "memory": lambda settings: None,
+    "file": lambda settings: FileStore(settings["path"]),
+    "s3": lambda settings: S3Store(settings["bucket"], settings["client"]),
+}
+
+
+def create_store(backend: str, **settings: Any) -> CachedStore:
+    """Build the named backend, fronted by the per-container cache."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown idempotency backend: {backend}")
+    return CachedStore(BACKENDS[backend](settings))
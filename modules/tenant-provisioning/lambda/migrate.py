@@ -0,0 +1,385 @@
+"""
+Bucket Copy Engine
+
+Copies every current object of one bucket to another with server-side
+copies, for tenant migrations (TenantMigrated). No object data passes
+through the Lambda: S3 copies it internally, so a migration is bound by
+S3's copy bandwidth rather than by the number of objects.
+
+Listing runs in the calling thread while a worker pool copies objects,
+several at once. Objects are copied in one CopyObject request, except:
+- objects uploaded in parts, which are copied part by part with
+  UploadPartCopy using the source's own part boundaries, so the copy keeps
+  the source's ETag
+- single-part objects over COPY_MULTIPART_THRESHOLD, which are copied in
+  COPY_PART_SIZE parts so no single request runs for minutes
+Parts of an object are copied in parallel on a separate part pool.
+
+Like the purge engine (see purge.py), a copy can be bounded by the
+invocation deadline: it stops at a page boundary once the remaining time
+drops below COPY_RESERVE_MS and returns a checkpoint to resume from.
+
+verify_copy() then walks both listings side by side and checks that every
+source object exists in the target with the same size and, where the copy
+keeps it, the same ETag. It is resumable the same way.
+"""
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable
+from urllib.parse import urlencode
+
+COPY_WORKERS = int(os.environ.get("COPY_WORKERS", "16"))
+COPY_PART_WORKERS = int(os.environ.get("COPY_PART_WORKERS", "16"))
+COPY_MULTIPART_THRESHOLD = int(os.environ.get("COPY_MULTIPART_THRESHOLD", str(256 * 1024 * 1024)))
+COPY_PART_SIZE = int(os.environ.get("COPY_PART_SIZE", str(64 * 1024 * 1024)))
+COPY_RESERVE_MS = int(os.environ.get("COPY_RESERVE_MS", "20000"))
+
+# Mismatched keys kept in verification results
+VERIFY_SAMPLE_SIZE = 20
+
+# Request size limits of S3 copies
+MAX_PARTS = 10000
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class MigrationError(Exception):
+    """Raised when objects could not be copied or the copy does not match."""
+
+    def __init__(self, source_bucket: str, target_bucket: str, problems: list, count: int | None = None):
+        self.source_bucket = source_bucket
+        self.target_bucket = target_bucket
+        self.problems = problems
+        count = count if count is not None else len(problems)
+        sample = ", ".join(f"{p['Key']} ({p['Problem']})" for p in problems[:5])
+        super().__init__(
+            f"Copy of {source_bucket} to {target_bucket} failed for {count} objects: {sample}"
+        )
+
+
+def part_count(etag: str) -> int:
+    """Number of parts of an object from its ETag (1 unless uploaded in parts)."""
+    _, _, parts = etag.strip('"').partition("-")
+    return int(parts) if parts.isdigit() else 1
+
+
+def keeps_etag(obj: dict) -> bool:
+    """Whether copying an object keeps its ETag (see module docstring)."""
+    return part_count(obj["ETag"]) > 1 or obj["Size"] <= COPY_MULTIPART_THRESHOLD
+
+
+def part_ranges(s3: Any, bucket_name: str, obj: dict) -> list:
+    """
+    Byte ranges (first, last) of the parts to copy an object in.
+
+    Objects uploaded in parts keep their own boundaries. Uploads normally use
+    one part size with a shorter last part; other layouts are read part by
+    part.
+    """
+    size, parts = obj["Size"], part_count(obj["ETag"])
+    if parts == 1:
+        # At most MAX_PARTS parts, so very large objects get larger parts
+        part_size = max(COPY_PART_SIZE, -(-size // MAX_PARTS), MIN_PART_SIZE)
+        return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+    first = s3.head_object(Bucket=bucket_name, Key=obj["Key"], PartNumber=1)["ContentLength"]
+    ranges = [(start, min(start + first, size) - 1) for start in range(0, size, first)]
+    if len(ranges) == parts:
+        return ranges
+
+    ranges, start = [], 0
+    for number in range(1, parts + 1):
+        length = s3.head_object(Bucket=bucket_name, Key=obj["Key"], PartNumber=number)["ContentLength"]
+        ranges.append((start, start + length - 1))
+        start += length
+    return ranges
+
+
+def copy_single(s3: Any, source_bucket: str, target_bucket: str, obj: dict) -> None:
+    """Copy an object in one request, with its metadata and tags."""
+    s3.copy_object(
+        Bucket=target_bucket,
+        Key=obj["Key"],
+        CopySource={"Bucket": source_bucket, "Key": obj["Key"]},
+        MetadataDirective="COPY",
+        TaggingDirective="COPY"
+    )
+
+
+def copy_multipart(
+    source_s3: Any,
+    target_s3: Any,
+    source_bucket: str,
+    target_bucket: str,
+    obj: dict,
+    parts_pool: ThreadPoolExecutor,
+) -> None:
+    """
+    Copy an object part by part, copying the parts in parallel.
+
+    Every part is copied from the listed version of the source (by ETag), so
+    an object overwritten during the copy fails instead of mixing versions.
+    A failed copy aborts its multipart upload.
+    """
+    key = obj["Key"]
+    ranges = part_ranges(source_s3, source_bucket, obj)
+    head = source_s3.head_object(Bucket=source_bucket, Key=key, IfMatch=obj["ETag"])
+    tags = source_s3.get_object_tagging(Bucket=source_bucket, Key=key)["TagSet"]
+
+    params = {
+        "Bucket": target_bucket,
+        "Key": key,
+        "Metadata": head.get("Metadata", {}),
+    }
+    for field in ("ContentType", "ContentEncoding", "ContentDisposition", "ContentLanguage", "CacheControl"):
+        if head.get(field):
+            params[field] = head[field]
+    if tags:
+        params["Tagging"] = urlencode([(tag["Key"], tag["Value"]) for tag in tags])
+
+    upload_id = target_s3.create_multipart_upload(**params)["UploadId"]
+
+    def copy_part(number: int, first: int, last: int) -> dict:
+        response = target_s3.upload_part_copy(
+            Bucket=target_bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=number,
+            CopySource={"Bucket": source_bucket, "Key": key},
+            CopySourceIfMatch=obj["ETag"],
+            CopySourceRange=f"bytes={first}-{last}"
+        )
+        return {"PartNumber": number, "ETag": response["CopyPartResult"]["ETag"]}
+
+    futures = []
+    try:
+        futures = [
+            parts_pool.submit(copy_part, number, first, last)
+            for number, (first, last) in enumerate(ranges, start=1)
+        ]
+        parts = [future.result() for future in futures]
+        target_s3.complete_multipart_upload(
+            Bucket=target_bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts}
+        )
+    except Exception:
+        for future in futures:
+            future.cancel()
+        target_s3.abort_multipart_upload(Bucket=target_bucket, Key=key, UploadId=upload_id)
+        raise
+
+
+def iter_object_pages(s3: Any, bucket_name: str, start_after: str = ""):
+    """
+    Yield (objects, more) for each list_objects_v2 page of current objects
+    after start_after; more is False on the last page.
+    """
+    params = {"Bucket": bucket_name}
+    if start_after:
+        params["StartAfter"] = start_after
+
+    while True:
+        page = s3.list_objects_v2(**params)
+        yield page.get("Contents", []), bool(page.get("IsTruncated"))
+
+        if not page.get("IsTruncated"):
+            return
+        params = {"Bucket": bucket_name, "ContinuationToken": page["NextContinuationToken"]}
+
+
+def copy_bucket(
+    source_s3: Any,
+    target_s3: Any,
+    source_bucket: str,
+    target_bucket: str,
+    workers: int = COPY_WORKERS,
+    checkpoint: dict | None = None,
+    remaining_ms: Callable[[], int] | None = None,
+) -> dict:
+    """
+    Copy all current objects of source_bucket to target_bucket.
+
+    source_s3 lists the source; target_s3, a client for the target bucket's
+    region, sends the copies. At most two objects per worker are queued at
+    any time. With remaining_ms the copy stops before the deadline, always
+    after at least one page so every run makes progress.
+
+    Returns the objects and bytes copied in this run, the elapsed time, the
+    throughput, whether the copy is complete and, if not, the checkpoint to
+    resume from, which also carries the running totals. Objects deleted
+    from the source while copying are skipped; other failures raise
+    MigrationError once the listing is done.
+    """
+    checkpoint = checkpoint or {}
+    started = time.monotonic()
+    copied = 0
+    copied_bytes = 0
+    skipped = 0
+    problems = []
+    start_after = checkpoint.get("start_after", "")
+    complete = True
+
+    def copy(obj: dict) -> None:
+        if obj["Size"] > COPY_MULTIPART_THRESHOLD or part_count(obj["ETag"]) > 1:
+            copy_multipart(source_s3, target_s3, source_bucket, target_bucket, obj, parts_pool)
+        else:
+            copy_single(target_s3, source_bucket, target_bucket, obj)
+
+    def collect(done: set) -> None:
+        nonlocal copied, copied_bytes, skipped
+        for future in done:
+            obj = in_flight.pop(future)
+            try:
+                future.result()
+            except Exception as e:
+                code = getattr(e, "response", {}).get("Error", {}).get("Code", type(e).__name__)
+                if code in ("NoSuchKey", "404"):
+                    skipped += 1
+                    continue
+                problems.append({"Key": obj["Key"], "Problem": code})
+                continue
+            copied += 1
+            copied_bytes += obj["Size"]
+
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool, \
+            ThreadPoolExecutor(max_workers=COPY_PART_WORKERS) as parts_pool:
+        for objects, more in iter_object_pages(source_s3, source_bucket, start_after):
+            for obj in objects:
+                if len(in_flight) >= workers * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight[pool.submit(copy, obj)] = obj
+
+            if objects:
+                start_after = objects[-1]["Key"]
+
+            if more and remaining_ms and remaining_ms() < COPY_RESERVE_MS:
+                print(f"Stopping copy before deadline at key {start_after}")
+                complete = False
+                break
+
+        done, _ = wait(in_flight)
+        collect(done)
+
+    elapsed = time.monotonic() - started
+    rate = copied_bytes / elapsed if elapsed > 0 else 0.0
+    print(f"Copied {copied} objects ({copied_bytes} bytes) in {elapsed:.2f}s ({rate / 1048576:.1f} MiB/sec)")
+
+    if problems:
+        raise MigrationError(source_bucket, target_bucket, problems)
+
+    result = {
+        "copied": copied,
+        "bytes": copied_bytes,
+        "skipped": skipped,
+        "seconds": round(elapsed, 3),
+        "bytes_per_second": round(rate, 1),
+        "complete": complete,
+        "total_copied": checkpoint.get("copied", 0) + copied,
+        "total_bytes": checkpoint.get("bytes", 0) + copied_bytes,
+        "runs": checkpoint.get("runs", 0) + 1
+    }
+
+    if not complete:
+        result["checkpoint"] = {
+            "start_after": start_after,
+            "copied": result["total_copied"],
+            "bytes": result["total_bytes"],
+            "runs": result["runs"]
+        }
+
+    return result
+
+
+def iter_objects(s3: Any, bucket_name: str, start_after: str = ""):
+    """Yield every current object after start_after, in key order."""
+    for objects, _ in iter_object_pages(s3, bucket_name, start_after):
+        yield from objects
+
+
+def verify_copy(
+    source_s3: Any,
+    target_s3: Any,
+    source_bucket: str,
+    target_bucket: str,
+    compare_etags: bool = True,
+    checkpoint: dict | None = None,
+    remaining_ms: Callable[[], int] | None = None,
+) -> dict:
+    """
+    Check that the target holds every source object, unchanged.
+
+    Both listings are in key order, so they are merged page by page with
+    constant memory. Every source object must exist in the target with the
+    same size; with compare_etags, objects whose copy keeps the ETag (see
+    keeps_etag) must also have the same ETag. Objects only in the target
+    are counted but are not a mismatch.
+
+    Returns the counts and a sample of mismatched keys, whether the check is
+    complete and, if stopped before the deadline, the checkpoint to resume
+    from (with the running counts).
+    """
+    counts = {
+        field: (checkpoint or {}).get(field, 0)
+        for field in ("objects", "etag_verified", "missing", "mismatched", "extra")
+    }
+    sample = list((checkpoint or {}).get("sample", []))
+    start_after = (checkpoint or {}).get("start_after", "")
+    complete = True
+    started = time.monotonic()
+
+    targets = iter_objects(target_s3, target_bucket, start_after)
+    target = next(targets, None)
+
+    def mismatch(key: str, problem: str) -> None:
+        counts[problem] += 1
+        if len(sample) < VERIFY_SAMPLE_SIZE:
+            sample.append({"Key": key, "Problem": problem})
+
+    for objects, more in iter_object_pages(source_s3, source_bucket, start_after):
+        for obj in objects:
+            counts["objects"] += 1
+            while target is not None and target["Key"] < obj["Key"]:
+                counts["extra"] += 1
+                target = next(targets, None)
+
+            if target is None or target["Key"] != obj["Key"]:
+                mismatch(obj["Key"], "missing")
+                continue
+
+            if target["Size"] != obj["Size"]:
+                mismatch(obj["Key"], "mismatched")
+            elif compare_etags and keeps_etag(obj):
+                if target["ETag"] != obj["ETag"]:
+                    mismatch(obj["Key"], "mismatched")
+                else:
+                    counts["etag_verified"] += 1
+            target = next(targets, None)
+
+        if objects:
+            start_after = objects[-1]["Key"]
+
+        if more and remaining_ms and remaining_ms() < COPY_RESERVE_MS:
+            print(f"Stopping verification before deadline at key {start_after}")
+            complete = False
+            break
+
+    if complete:
+        while target is not None:
+            counts["extra"] += 1
+            target = next(targets, None)
+
+    elapsed = time.monotonic() - started
+    print(
+        f"Verified {counts['objects']} objects in {elapsed:.2f}s: {counts['missing']} missing, "
+        f"{counts['mismatched']} mismatched, {counts['extra']} only in target"
+    )
+
+    result = dict(counts, sample=sample, complete=complete)
+    if not complete:
+        result["checkpoint"] = dict(counts, sample=sample, start_after=start_after)
+    return result
@@ -0,0 +1,61 @@
+"""
+Callback Outbox Flusher
+
+With the callback outbox enabled, the provisioner queues each provisioning
+update on an SQS queue instead of calling the API (see call_api). This
+Lambda is fed batches from that queue and delivers each batch in a single
+request to the bulk variant of the provisioning endpoint:
+
+    POST {API_CALLBACK_URL}/internal/tenants/provisioning
+    {"updates": [{"id", "tenant_id", "action", "data", "occurred_at"}, ...]}
+
+Updates are sent oldest first. The API may answer {"failed": [id, ...]} to
+reject individual updates. Rejected updates, and the whole batch when the
+request fails, are reported as batch item failures. SQS then redelivers
+them after the visibility timeout and moves updates that keep failing to
+the dead-letter queue.
+"""
+
+import json
+from typing import Any
+
+import metrics
+from provisioner import post_to_api
+
+BULK_CALLBACK_PATH = "/internal/tenants/provisioning"
+
+
+def flush(records: list, context: Any = None) -> list:
+    """Deliver queued updates in one request. Returns the message ids that failed."""
+    updates = {}
+    for record in records:
+        update = json.loads(record["body"])
+        updates[update["id"]] = (record["messageId"], update)
+
+    body = {"updates": sorted((u for _, u in updates.values()), key=lambda u: u["occurred_at"])}
+
+    with metrics.timed("callback_flush", BatchSize=len(updates)):
+        response = post_to_api(BULK_CALLBACK_PATH, body, context)
+
+    if response is None:
+        failed = list(updates)
+    else:
+        try:
+            failed = [i for i in json.loads(response).get("failed", []) if i in updates]
+        except (ValueError, AttributeError):
+            failed = []
+
+    metrics.emit("callback_flush", {
+        "Delivered": (len(updates) - len(failed), "Count"),
+        "Failures": (len(failed), "Count")
+    })
+    print(f"Flushed {len(updates)} queued callbacks: {len(updates) - len(failed)} delivered, {len(failed)} failed")
+
+    return [updates[i][0] for i in failed]
+
+
+def lambda_handler(event: dict, context: Any) -> dict:
+    """Lambda entry point for the outbox queue (SQS event source)."""
+    metrics.set_action("callback")
+    failed = flush(event["Records"], context)
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in failed]}
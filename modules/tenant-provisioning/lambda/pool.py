@@ -0,0 +1,149 @@
+"""
+Pre-warmed Tenant Bucket Pool
+
+Keeps a registry of fully configured, unassigned buckets in the provisioner
+state bucket so TenantCreated can claim one instead of creating a bucket.
+Pool buckets are named {TENANT_BUCKET_PREFIX}pool-{random}-{ENVIRONMENT}.
+
+Registry layout in the provisioner state bucket (STATE_BUCKET):
+- pool/available/{bucket}: ready and unclaimed, written once configured
+- pool/claimed/{bucket}:   claim lock, body is the tenant id
+- tenants/{tenant_id}:     the tenant's assignment, {"bucket": ...}
+
+Claims rely on S3 conditional writes (IfNoneMatch="*"): the claim lock and
+the tenant assignment can each be created only once, so concurrent claims
+never hand one bucket to two tenants or two buckets to one tenant.
+"""
+
+import json
+import os
+import random
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+TENANT_BUCKET_PREFIX = os.environ.get("TENANT_BUCKET_PREFIX", "envelope-tenant-")
+ENVIRONMENT = os.environ.get("ENVIRONMENT", "prod")
+STATE_BUCKET = os.environ.get("STATE_BUCKET", "")
+BUCKET_POOL_SIZE = int(os.environ.get("BUCKET_POOL_SIZE", "0"))
+
+AVAILABLE_PREFIX = "pool/available/"
+CLAIMED_PREFIX = "pool/claimed/"
+TENANTS_PREFIX = "tenants/"
+
+# Available buckets considered per claim, picked from in random order so
+# concurrent claims rarely contend for the same bucket
+CLAIM_CANDIDATES = 10
+
+# Error codes of a conditional write that lost to an existing object
+CONDITIONAL_WRITE_CONFLICTS = ("PreconditionFailed", "ConditionalRequestConflict")
+
+
+def pool_enabled() -> bool:
+    """Whether TenantCreated should claim buckets from the pool."""
+    return bool(STATE_BUCKET) and BUCKET_POOL_SIZE > 0
+
+
+def new_bucket_name() -> str:
+    """A fresh pool bucket name."""
+    return f"{TENANT_BUCKET_PREFIX}pool-{secrets.token_hex(6)}-{ENVIRONMENT}"
+
+
+def is_pool_bucket(bucket_name: str) -> bool:
+    """Whether a bucket name belongs to the pool (claimed or not)."""
+    return bucket_name.startswith(f"{TENANT_BUCKET_PREFIX}pool-")
+
+
+def put_if_absent(s3: Any, key: str, body: str) -> bool:
+    """Create a registry object unless it already exists. Returns True if created."""
+    try:
+        s3.put_object(Bucket=STATE_BUCKET, Key=key, Body=body.encode("utf-8"), IfNoneMatch="*")
+        return True
+    except s3.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] in CONDITIONAL_WRITE_CONFLICTS:
+            return False
+        raise
+
+
+def read(s3: Any, key: str) -> str | None:
+    """Body of a registry object, or None if it does not exist."""
+    try:
+        response = s3.get_object(Bucket=STATE_BUCKET, Key=key)
+    except s3.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return None
+        raise
+    return response["Body"].read().decode("utf-8")
+
+
+def list_keys(s3: Any, prefix: str, limit: int | None = None) -> dict:
+    """Return {name: last_modified} for registry objects under a prefix."""
+    keys = {}
+    params = {"Bucket": STATE_BUCKET, "Prefix": prefix}
+    while True:
+        response = s3.list_objects_v2(**params)
+        for obj in response.get("Contents", []):
+            keys[obj["Key"][len(prefix):]] = obj["LastModified"]
+            if limit is not None and len(keys) >= limit:
+                return keys
+
+        if not response.get("IsTruncated"):
+            return keys
+        params["ContinuationToken"] = response["NextContinuationToken"]
+
+
+def available_buckets(s3: Any, limit: int | None = None) -> list:
+    """Names of ready, unclaimed pool buckets."""
+    return list(list_keys(s3, AVAILABLE_PREFIX, limit))
+
+
+def add_available(s3: Any, bucket_name: str) -> None:
+    """Offer a configured bucket to the pool."""
+    s3.put_object(Bucket=STATE_BUCKET, Key=f"{AVAILABLE_PREFIX}{bucket_name}", Body=b"")
+
+
+def assigned_bucket(s3: Any, tenant_id: str) -> str | None:
+    """The pool bucket assigned to a tenant, if any."""
+    body = read(s3, f"{TENANTS_PREFIX}{tenant_id}")
+    return json.loads(body)["bucket"] if body else None
+
+
+def assignments(s3: Any, workers: int = 8) -> dict:
+    """Return {bucket: tenant_id} for every claimed pool bucket."""
+    claimed = list(list_keys(s3, CLAIMED_PREFIX))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        tenants = executor.map(lambda bucket: read(s3, f"{CLAIMED_PREFIX}{bucket}"), claimed)
+        return {bucket: tenant_id for bucket, tenant_id in zip(claimed, tenants) if tenant_id}
+
+
+def claim_bucket(s3: Any, tenant_id: str) -> str | None:
+    """
+    Claim an available pool bucket for a tenant.
+
+    Returns the bucket name, or None when the pool is empty (or every
+    candidate was taken by concurrent claims). If a concurrent event for the
+    same tenant claimed first, its bucket is returned and ours goes back to
+    the pool.
+    """
+    candidates = available_buckets(s3, limit=CLAIM_CANDIDATES)
+    random.shuffle(candidates)
+
+    for bucket_name in candidates:
+        if not put_if_absent(s3, f"{CLAIMED_PREFIX}{bucket_name}", tenant_id):
+            continue
+
+        assignment = json.dumps({"bucket": bucket_name})
+        if not put_if_absent(s3, f"{TENANTS_PREFIX}{tenant_id}", assignment):
+            s3.delete_object(Bucket=STATE_BUCKET, Key=f"{CLAIMED_PREFIX}{bucket_name}")
+            return assigned_bucket(s3, tenant_id)
+
+        s3.delete_object(Bucket=STATE_BUCKET, Key=f"{AVAILABLE_PREFIX}{bucket_name}")
+        return bucket_name
+
+    return None
+
+
+def release_bucket(s3: Any, tenant_id: str, bucket_name: str) -> None:
+    """Forget a deleted pool bucket and the tenant's assignment."""
+    s3.delete_object(Bucket=STATE_BUCKET, Key=f"{TENANTS_PREFIX}{tenant_id}")
+    s3.delete_object(Bucket=STATE_BUCKET, Key=f"{CLAIMED_PREFIX}{bucket_name}")
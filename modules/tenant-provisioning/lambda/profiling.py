@@ -0,0 +1,240 @@
+"""
+Opt-in Invocation Profiling
+
+Profiles a sampled fraction of provisioner invocations (PROFILING_SAMPLE_RATE,
+0 disables profiling) to show where a slow run spends its time: botocore
+serialisation, JSON handling, TLS or waiting on S3.
+
+A profiled invocation collects:
+- wall profile: the stack of every thread, sampled every
+  PROFILING_INTERVAL_MS, so threads waiting on the network show up too
+- CPU profile:  the same samples weighted by the CPU time each thread used
+  since its previous sample (per-thread CPU clocks, Linux only)
+- memory:       a tracemalloc snapshot (top allocation sites, traced peak)
+  and the process's peak RSS against the function's memory size
+
+Results go to the log as one compact JSON line with the top frames
+(PROFILING_OUTPUT=log), or in full, with complete folded stacks usable by
+flame graph tools, to s3://STATE_BUCKET/profiles/ with a pointer logged
+(PROFILING_OUTPUT=s3).
+"""
+
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_OUTPUT = os.environ.get("PROFILING_OUTPUT", "log")
+PROFILING_INTERVAL_MS = float(os.environ.get("PROFILING_INTERVAL_MS", "10"))
+PROFILING_TOP_N = int(os.environ.get("PROFILING_TOP_N", "15"))
+STATE_BUCKET = os.environ.get("STATE_BUCKET", "")
+
+PROFILES_PREFIX = "profiles/"
+
+# Frames kept per tracemalloc allocation; more frames cost more memory
+TRACEMALLOC_FRAMES = 4
+
+# One invocation is profiled at a time per process; tracemalloc is global
+_active = threading.Lock()
+
+# Leaf frames of threads with nothing to do (idle thread pool workers)
+IDLE_FRAMES = {"thread.py:_worker"}
+
+
+def frame_label(frame: Any) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def thread_cpu_clock(thread_id: int) -> int | None:
+    """The CPU-time clock of a thread, where the platform has one."""
+    try:
+        return time.pthread_getcpuclockid(thread_id)
+    except (AttributeError, OSError):
+        return None
+
+
+class StackSampler:
+    """Samples the stacks of all threads from a background thread."""
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000
+        self.wall = Counter()
+        self.cpu = Counter()
+        self.samples = 0
+        self._clocks = {}
+        self._cpu_seen = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+
+    def _cpu_delta(self, thread_id: int) -> float:
+        if thread_id not in self._clocks:
+            self._clocks[thread_id] = thread_cpu_clock(thread_id)
+        clock = self._clocks[thread_id]
+        if clock is None:
+            return 0.0
+        try:
+            used = time.clock_gettime(clock)
+        except OSError:
+            # The thread has exited
+            return 0.0
+        delta = used - self._cpu_seen.get(thread_id, used)
+        self._cpu_seen[thread_id] = used
+        return delta
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack[0] in IDLE_FRAMES:
+                continue
+            folded = ";".join(reversed(stack))
+
+            self.wall[folded] += 1
+            cpu = self._cpu_delta(thread_id)
+            if cpu > 0:
+                self.cpu[folded] += cpu
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def top_frames(stacks: Counter, n: int) -> list:
+    """
+    The n frames with the most samples, as [frame, self share, total share].
+
+    Self counts samples where the frame was running; total also counts
+    samples where it was waiting on a frame it called.
+    """
+    total = sum(stacks.values()) or 1
+    own = Counter()
+    inclusive = Counter()
+    for folded, weight in stacks.items():
+        frames = folded.split(";")
+        own[frames[-1]] += weight
+        for frame in set(frames):
+            inclusive[frame] += weight
+
+    return [
+        [frame, round(own[frame] / total, 3), round(inclusive[frame] / total, 3)]
+        for frame, _ in own.most_common(n)
+    ]
+
+
+def top_allocations(snapshot: tracemalloc.Snapshot, n: int) -> list:
+    """The n allocation sites holding the most memory, as [site, KiB, blocks]."""
+    return [
+        [f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}", round(stat.size / 1024, 1), stat.count]
+        for stat in snapshot.statistics("lineno")[:n]
+    ]
+
+
+def max_rss_kib() -> int:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def should_profile() -> bool:
+    return PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE
+
+
+def write_profile(profile: dict, stacks: dict, client: Callable[[], Any]) -> None:
+    """Log the compact profile, or store the full one in the state bucket."""
+    if PROFILING_OUTPUT != "s3":
+        print(json.dumps({"profile": profile}, separators=(",", ":")))
+        return
+
+    if not STATE_BUCKET:
+        raise ValueError("STATE_BUCKET not configured")
+    day = datetime.now(timezone.utc).strftime("%Y/%m/%d")
+    key = f"{PROFILES_PREFIX}{day}/{profile['request_id']}.json"
+    client().put_object(
+        Bucket=STATE_BUCKET,
+        Key=key,
+        Body=json.dumps({**profile, **stacks}).encode("utf-8"),
+        ContentType="application/json"
+    )
+    print(f"Profile of {profile['request_id']} written to s3://{STATE_BUCKET}/{key}")
+
+
+@contextmanager
+def profiled(context: Any, client: Callable[[], Any]):
+    """
+    Profile the block for a sampled fraction of invocations.
+
+    client returns the S3 client used with PROFILING_OUTPUT=s3. Profiling
+    never fails the invocation: errors writing a profile are only logged.
+    """
+    if not should_profile() or not _active.acquire(blocking=False):
+        yield
+        return
+
+    try:
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+
+        sampler = StackSampler(PROFILING_INTERVAL_MS)
+        rss_before = max_rss_kib()
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            wall_ms = (time.perf_counter() - started) * 1000
+            cpu_ms = (time.process_time() - cpu_started) * 1000
+            snapshot = tracemalloc.take_snapshot()
+            _, traced_peak = tracemalloc.get_traced_memory()
+            if not tracing:
+                tracemalloc.stop()
+
+            try:
+                profile = {
+                    "request_id": getattr(context, "aws_request_id", None) or f"local-{int(time.time() * 1000)}",
+                    "wall_ms": round(wall_ms, 1),
+                    "cpu_ms": round(cpu_ms, 1),
+                    "samples": sampler.samples,
+                    "memory_limit_mb": int(getattr(context, "memory_limit_in_mb", 0) or 0),
+                    "max_rss_kib": max_rss_kib(),
+                    "rss_growth_kib": max_rss_kib() - rss_before,
+                    "traced_peak_kib": round(traced_peak / 1024, 1),
+                    "wall_top": top_frames(sampler.wall, PROFILING_TOP_N),
+                    "cpu_top": top_frames(sampler.cpu, PROFILING_TOP_N),
+                    "alloc_top": top_allocations(snapshot, PROFILING_TOP_N),
+                }
+                stacks = {
+                    "wall_stacks": dict(sampler.wall.most_common()),
+                    "cpu_stacks": {folded: round(cpu * 1000, 3) for folded, cpu in sampler.cpu.most_common()},
+                }
+                write_profile(profile, stacks, client)
+            except Exception as e:
+                print(f"Could not write profile: {str(e)}")
+    finally:
+        _active.release()
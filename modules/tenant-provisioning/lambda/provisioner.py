@@ -2,191 +2,592 @@
 Tenant S3 Bucket Provisioner Lambda
 
 This Lambda function handles tenant provisioning events from EventBridge:
-- TenantCreated: Creates an S3 bucket with secure configuration
-- TenantDeleted: Deletes the S3 bucket and all objects
+- TenantCreated: Creates an S3 bucket with secure configuration in the
+  tenant's preferred region, or claims a pre-configured one when the bucket
+  pool is enabled (see pool.py)
+- TenantDeleted: Deletes the S3 bucket and all objects, optionally after
+  exporting them to a retention bucket (see export.py)
+- TenantMigrated: Copies the tenant's objects to the bucket of its new id
+  or environment, optionally in another region (see migrate.py)
 
-The Lambda calls back to the API to update the tenant's configuration.
+Events arrive either directly from EventBridge or, in batch mode, through an
+SQS queue that delivers many events per invocation.
+
+The Lambda calls back to the API to update the tenant's configuration,
+either directly or, with the callback outbox enabled, through a queue that
+outbox.py flushes to the API in batches.
+Completed outcomes are recorded per event (see idempotency.py) so that
+redelivered events are answered without repeating the work. Bucket-level
+S3 calls are paced by adaptive rate limits per API family (see ratelimit.py).
 """
 
-import boto3
 import json
 import os
-import urllib.request
-import urllib.error
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from typing import Any
 
-# Initialize AWS clients
-s3 = boto3.client("s3")
-secretsmanager = boto3.client("secretsmanager")
+import idempotency
+import metrics
+import pool
+import ratelimit
+from purge import purge_bucket
+
+# export, migrate and profiling serve rare paths and are imported where they
+# are used, keeping tarfile, gzip and the sampler off the cold start
 
 # Environment variables
 TENANT_BUCKET_PREFIX = os.environ.get("TENANT_BUCKET_PREFIX", "envelope-tenant-")
 ENVIRONMENT = os.environ.get("ENVIRONMENT", "prod")
 REGION = os.environ.get("REGION", "eu-west-2")
+ALLOWED_REGIONS = [r.strip() for r in os.environ.get("ALLOWED_REGIONS", REGION).split(",") if r.strip()]
 API_CALLBACK_URL = os.environ.get("API_CALLBACK_URL", "")
 API_CALLBACK_SECRET_ARN = os.environ.get("API_CALLBACK_SECRET_ARN", "")
+CONFIG_MAX_WORKERS = int(os.environ.get("CONFIG_MAX_WORKERS", "8"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "5"))
+LOG_EVENT_SAMPLE_RATE = float(os.environ.get("LOG_EVENT_SAMPLE_RATE", "0.05"))
+RECONCILE_EXISTING_BUCKETS = os.environ.get("RECONCILE_EXISTING_BUCKETS", "true").lower() == "true"
+API_TOKEN_TTL_SECONDS = int(os.environ.get("API_TOKEN_TTL_SECONDS", "300"))
+API_TOKEN_REFRESH_RATIO = float(os.environ.get("API_TOKEN_REFRESH_RATIO", "0.8"))
+CALLBACK_CONNECT_TIMEOUT = float(os.environ.get("CALLBACK_CONNECT_TIMEOUT", "3"))
+CALLBACK_READ_TIMEOUT = float(os.environ.get("CALLBACK_READ_TIMEOUT", "10"))
+CALLBACK_MAX_ATTEMPTS = int(os.environ.get("CALLBACK_MAX_ATTEMPTS", "4"))
+STATE_BUCKET = os.environ.get("STATE_BUCKET", "")
+IDEMPOTENCY_BACKEND = os.environ.get("IDEMPOTENCY_BACKEND", "memory")
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_FILE = os.environ.get("IDEMPOTENCY_FILE", "/tmp/provisioner-idempotency.json")
+CALLBACK_OUTBOX_URL = os.environ.get("CALLBACK_OUTBOX_URL", "")
+STEP_RESERVE_SECONDS = float(os.environ.get("STEP_RESERVE_SECONDS", "5"))
+STORAGE_PROFILE = os.environ.get("STORAGE_PROFILE", "intelligent_tiering")
+TIER_STORAGE_PROFILES = json.loads(os.environ.get("TIER_STORAGE_PROFILES", "{}"))
+KMS_ENCRYPTION = os.environ.get("KMS_ENCRYPTION", "aes256")
+KMS_KEY_ARNS = json.loads(os.environ.get("KMS_KEY_ARNS", "{}"))
+ACCOUNT_ID = os.environ.get("ACCOUNT_ID", "")
+EVENTBRIDGE_NOTIFICATIONS = os.environ.get("EVENTBRIDGE_NOTIFICATIONS", "true").lower() == "true"
+EXPORT_ON_DELETE = os.environ.get("EXPORT_ON_DELETE", "false").lower() == "true"
+EXPORT_BUCKET = os.environ.get("EXPORT_BUCKET", "")
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
 
+# Callback retry policy
+CALLBACK_RETRY_STATUSES = {429, 500, 502, 503, 504}
+CALLBACK_BASE_BACKOFF = 0.2
+CALLBACK_MAX_BACKOFF = 5.0
+CALLBACK_RESERVE_SECONDS = 1.0
 
-def get_api_token() -> str:
+# Readiness polling of new buckets: exponential intervals between these bounds
+READY_POLL_INITIAL = 0.05
+READY_POLL_MAX = 1.0
+
+# A provisioning paused at the deadline is resumed at most this many times
+PROVISIONING_MAX_RUNS = 10
+
+
+# AWS clients, created on first use and cached per container (and region)
+_clients = {}
+_clients_lock = threading.Lock()
+
+# An export holds its read-ahead and an upload chunk in memory (about
+# 72 MiB by default), so a container runs one at a time (see delete_bucket)
+_export_slot = threading.Semaphore(1)
+
+# Region of each tenant bucket seen by this container
+_bucket_regions = {}
+
+# Tenant KMS key aliases known to point at a usable key
+_tenant_keys = set()
+
+# botocore settings for the cached clients. The pool is sized for the
+# configuration and batch thread pools sharing one S3 client.
+CLIENT_CONFIG = {
+    "max_pool_connections": max(50, CONFIG_MAX_WORKERS * BATCH_CONCURRENCY),
+    "connect_timeout": 5,
+    "read_timeout": 30,
+    "tcp_keepalive": True,
+    "retries": {"mode": "standard", "max_attempts": 5},
+}
+
+
+def get_client(service: str, region: str | None = None) -> Any:
+    """
+    Return the boto3 client for a service, creating it on first use.
+    
+    Clients for other regions than REGION are cached separately. boto3
+    itself is only imported here, so invocations that never reach AWS (such
+    as events failing validation) skip its import cost entirely. S3 clients
+    are paced by the shared rate limiters (see ratelimit.py).
+    """
+    key = service if region in (None, REGION) else f"{service}:{region}"
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    
+    with _clients_lock:
+        if key not in _clients:
+            import boto3
+            from botocore.config import Config
+            
+            params = {"region_name": region} if key != service else {}
+            client = boto3.client(service, config=Config(**CLIENT_CONFIG), **params)
+            if service == "s3":
+                ratelimit.attach(client)
+            _clients[key] = client
+        return _clients[key]
+
+
+def bucket_client(bucket_name: str) -> Any:
+    """
+    The S3 client for the region a bucket lives in.
+    
+    Buckets whose region this container has not seen yet use the default
+    client; S3 redirects those requests to the right region at the cost of
+    an extra round trip.
+    """
+    return get_client("s3", _bucket_regions.get(bucket_name))
+
+
+def remember_bucket_region(bucket_name: str, region: str | None) -> None:
+    """Record the region of a bucket for bucket_client()."""
+    if region:
+        _bucket_regions[bucket_name] = region
+
+
+def get_callback_http() -> Any:
+    """
+    Return the keep-alive connection pool for API callbacks.
+    
+    Created on first use and reused across warm invocations. urllib3 ships
+    with botocore, so it is always available in the runtime.
+    """
+    with _clients_lock:
+        if "callback_http" not in _clients:
+            import urllib3
+            
+            _clients["callback_http"] = urllib3.PoolManager(
+                maxsize=max(BATCH_CONCURRENCY, 1),
+                retries=False
+            )
+        return _clients["callback_http"]
+
+
+def get_idempotency_store() -> Any:
+    """
+    Return the idempotency store selected by IDEMPOTENCY_BACKEND.
+    
+    Created on first use and reused across warm invocations, so its memory
+    cache catches duplicates delivered to the same container. Returns None
+    when IDEMPOTENCY_BACKEND is "none".
+    """
+    if IDEMPOTENCY_BACKEND == "none":
+        return None
+    
+    with _clients_lock:
+        if "idempotency" not in _clients:
+            _clients["idempotency"] = idempotency.create_store(
+                IDEMPOTENCY_BACKEND,
+                path=IDEMPOTENCY_FILE,
+                bucket=STATE_BUCKET,
+                client=lambda: get_client("s3")
+            )
+        return _clients["idempotency"]
+
+
+# API callback token cached across warm invocations
+_token_cache = {"token": None, "fetched_at": 0.0, "refreshing": False}
+_token_lock = threading.Lock()
+
+
+def fetch_api_token() -> str:
     """Retrieve API callback token from Secrets Manager."""
     if not API_CALLBACK_SECRET_ARN:
         raise ValueError("API_CALLBACK_SECRET_ARN not configured")
     
-    response = secretsmanager.get_secret_value(SecretId=API_CALLBACK_SECRET_ARN)
+    with metrics.timed("secret_fetch"):
+        response = get_client("secretsmanager").get_secret_value(SecretId=API_CALLBACK_SECRET_ARN)
     secret = json.loads(response["SecretString"])
     return secret.get("token", "")
 
 
-def call_api(tenant_id: str, action: str, data: dict) -> bool:
-    """Call the API to update tenant configuration."""
-    if not API_CALLBACK_URL:
-        print(f"Warning: API_CALLBACK_URL not configured, skipping callback")
-        return False
+def refresh_api_token() -> None:
+    """Fetch a fresh token into the cache (run in the background)."""
+    try:
+        token = fetch_api_token()
+        with _token_lock:
+            _token_cache["token"] = token
+            _token_cache["fetched_at"] = time.monotonic()
+    except Exception as e:
+        print(f"API token refresh failed: {str(e)}")
+    finally:
+        with _token_lock:
+            _token_cache["refreshing"] = False
+
+
+def get_api_token() -> str:
+    """
+    Return the API callback token, cached for API_TOKEN_TTL_SECONDS.
     
-    # API_CALLBACK_URL already includes /api, so don't duplicate it
-    url = f"{API_CALLBACK_URL}/internal/tenants/{tenant_id}/provisioning"
-    token = get_api_token()
+    Once a cached token is API_TOKEN_REFRESH_RATIO through its TTL it is
+    still returned, but a background refresh is started so callers rarely
+    wait on Secrets Manager.
+    """
+    with _token_lock:
+        token = _token_cache["token"]
+        age = time.monotonic() - _token_cache["fetched_at"]
+        
+        if token is not None and age < API_TOKEN_TTL_SECONDS:
+            if age >= API_TOKEN_TTL_SECONDS * API_TOKEN_REFRESH_RATIO and not _token_cache["refreshing"]:
+                _token_cache["refreshing"] = True
+                threading.Thread(target=refresh_api_token, daemon=True).start()
+            return token
+        
+        # Missing or expired, fetch while holding the lock so concurrent
+        # callers share a single Secrets Manager request
+        token = fetch_api_token()
+        _token_cache["token"] = token
+        _token_cache["fetched_at"] = time.monotonic()
+        return token
+
+
+def invalidate_api_token() -> None:
+    """Drop the cached token, e.g. after the API rejects it."""
+    with _token_lock:
+        _token_cache["token"] = None
+        _token_cache["fetched_at"] = 0.0
+
+
+def remaining_seconds(context: Any) -> float:
+    """Seconds left in the invocation, unbounded outside Lambda."""
+    if context is None:
+        return float("inf")
+    return context.get_remaining_time_in_millis() / 1000
+
+
+def call_api(tenant_id: str, action: str, data: dict, context: Any = None) -> bool:
+    """
+    Call the API to update tenant configuration, recording latency and failures.
     
-    payload = json.dumps({
-        "action": action,
-        "data": data
-    }).encode("utf-8")
+    With CALLBACK_OUTBOX_URL set the update is queued for outbox.py to
+    deliver and this returns once it is queued. It is only sent directly
+    when the queue cannot be reached.
+    """
+    if CALLBACK_OUTBOX_URL:
+        try:
+            enqueue_callback(tenant_id, action, data)
+            return True
+        except Exception as e:
+            print(f"Callback outbox unavailable, calling the API directly: {str(e)}")
     
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}",
-        "X-Provisioner-Source": "lambda"
-    }
+    started = time.perf_counter()
+    delivered = send_callback(tenant_id, action, data, context)
     
-    req = urllib.request.Request(url, data=payload, headers=headers, method="POST")
+    metrics.emit("callback", {
+        "Duration": (round((time.perf_counter() - started) * 1000, 2), "Milliseconds"),
+        "Failures": (0 if delivered else 1, "Count")
+    }, CallbackAction=action)
     
-    try:
-        with urllib.request.urlopen(req, timeout=30) as response:
-            result = response.read().decode("utf-8")
-            print(f"API callback success: {response.status} - {result}")
-            return True
-    except urllib.error.HTTPError as e:
-        print(f"API callback failed: {e.code} - {e.read().decode('utf-8')}")
-        return False
-    except Exception as e:
-        print(f"API callback error: {str(e)}")
-        return False
+    return delivered
 
 
-def create_bucket(tenant_id: str) -> dict:
-    """Create an S3 bucket for a tenant with secure configuration."""
-    bucket_name = f"{TENANT_BUCKET_PREFIX}{tenant_id}-{ENVIRONMENT}"
+def enqueue_callback(tenant_id: str, action: str, data: dict) -> None:
+    """
+    Queue a provisioning update in the callback outbox.
     
-    print(f"Creating bucket: {bucket_name} in region: {REGION}")
+    Each update carries a unique id, so the API can drop redeliveries, and
+    the time it occurred, so it can ignore updates older than one it has
+    already applied.
+    """
+    update = {
+        "id": uuid.uuid4().hex,
+        "tenant_id": tenant_id,
+        "action": action,
+        "data": data,
+        "occurred_at": datetime.now(timezone.utc).isoformat()
+    }
     
-    # Check if bucket already exists
-    try:
-        s3.head_bucket(Bucket=bucket_name)
-        print(f"Bucket {bucket_name} already exists")
-        return {"bucket": bucket_name, "region": REGION, "status": "exists"}
-    except s3.exceptions.ClientError as e:
-        if e.response["Error"]["Code"] != "404":
-            raise
+    with metrics.timed("callback_enqueue", CallbackAction=action):
+        get_client("sqs").send_message(QueueUrl=CALLBACK_OUTBOX_URL, MessageBody=json.dumps(update))
+    print(f"API callback queued: {action} for tenant {tenant_id}")
+
+
+def send_callback(tenant_id: str, action: str, data: dict, context: Any = None) -> bool:
+    """POST a provisioning update for one tenant to the API."""
+    # API_CALLBACK_URL already includes /api, so don't duplicate it
+    path = f"/internal/tenants/{tenant_id}/provisioning"
+    return post_to_api(path, {"action": action, "data": data}, context) is not None
+
+
+def post_to_api(path: str, body: dict, context: Any = None) -> str | None:
+    """
+    POST JSON to the API and return the response body, or None on failure.
     
-    # Create bucket
-    create_params = {"Bucket": bucket_name}
-    if REGION != "us-east-1":
-        create_params["CreateBucketConfiguration"] = {"LocationConstraint": REGION}
+    Requests go over the pooled keep-alive connections from get_callback_http().
+    Connection errors, timeouts and retryable statuses are retried with
+    jittered exponential backoff, up to CALLBACK_MAX_ATTEMPTS and only while
+    the invocation has time left. A 401 invalidates the cached token and is
+    retried once with a freshly fetched one, so secret rotation takes effect
+    at once.
+    """
+    if not API_CALLBACK_URL:
+        print(f"Warning: API_CALLBACK_URL not configured, skipping callback")
+        return None
     
-    s3.create_bucket(**create_params)
-    print(f"Bucket created: {bucket_name}")
+    url = f"{API_CALLBACK_URL}{path}"
     
-    # Wait for bucket to exist
-    waiter = s3.get_waiter("bucket_exists")
-    waiter.wait(Bucket=bucket_name)
+    import urllib3
     
-    # Enable versioning
-    s3.put_bucket_versioning(
-        Bucket=bucket_name,
-        VersioningConfiguration={"Status": "Enabled"}
-    )
-    print("Versioning enabled")
+    http = get_callback_http()
+    payload = json.dumps(body).encode("utf-8")
     
-    # Enable server-side encryption (AES-256)
-    s3.put_bucket_encryption(
-        Bucket=bucket_name,
-        ServerSideEncryptionConfiguration={
-            "Rules": [{
-                "ApplyServerSideEncryptionByDefault": {
-                    "SSEAlgorithm": "AES256"
-                }
-            }]
+    attempt = 0
+    token_refreshed = False
+    while True:
+        attempt += 1
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {get_api_token()}",
+            "X-Provisioner-Source": "lambda"
         }
-    )
-    print("Encryption enabled")
+        
+        # Never wait on the API past the end of the invocation
+        budget = remaining_seconds(context) - CALLBACK_RESERVE_SECONDS
+        timeout = urllib3.Timeout(
+            connect=max(0.1, min(CALLBACK_CONNECT_TIMEOUT, budget)),
+            read=max(0.1, min(CALLBACK_READ_TIMEOUT, budget))
+        )
+        
+        try:
+            response = http.request(
+                "POST", url, body=payload, headers=headers, timeout=timeout
+            )
+        except urllib3.exceptions.HTTPError as e:
+            error = str(e)
+        else:
+            result = response.data.decode("utf-8")
+            if 200 <= response.status < 300:
+                print(f"API callback success: {response.status} - {result}")
+                return result
+            
+            if response.status == 401 and not token_refreshed:
+                print("API callback unauthorized, refreshing token")
+                invalidate_api_token()
+                token_refreshed = True
+                continue
+            
+            if response.status not in CALLBACK_RETRY_STATUSES:
+                print(f"API callback failed: {response.status} - {result}")
+                return None
+            error = f"{response.status} - {result}"
+        
+        delay = random.uniform(0, min(CALLBACK_MAX_BACKOFF, CALLBACK_BASE_BACKOFF * 2 ** attempt))
+        time_left = remaining_seconds(context) - CALLBACK_RESERVE_SECONDS
+        if attempt >= CALLBACK_MAX_ATTEMPTS or time_left < delay + CALLBACK_CONNECT_TIMEOUT:
+            print(f"API callback error: {error} (giving up after {attempt} attempts)")
+            return None
+        
+        print(f"API callback attempt {attempt} failed ({error}), retrying in {delay:.2f}s")
+        time.sleep(delay)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when too little of the invocation is left to start the remaining steps."""
+
+    def __init__(self, pending: list):
+        self.pending = pending
+        super().__init__(f"Invocation deadline reached with steps pending: {', '.join(pending) or '-'}")
+
+
+class BucketConfigurationError(Exception):
+    """Raised when one or more bucket configuration steps fail."""
+
+    def __init__(self, bucket_name: str, failures: dict):
+        self.bucket_name = bucket_name
+        self.failures = failures
+        details = ", ".join(f"{step}: {error}" for step, error in failures.items())
+        super().__init__(f"Configuration of {bucket_name} failed ({details})")
+
+
+# Storage profiles, selected per tenant tier (TIER_STORAGE_PROFILES, falling
+# back to STORAGE_PROFILE). Every tier keeps documents readable in
+# milliseconds. Noncurrent versions expire so versioned buckets stop growing.
+STORAGE_PROFILES = {
+    # Intelligent-Tiering from day one: S3 moves each object between the
+    # frequent, infrequent and archive instant access tiers by how often it
+    # is read. The asynchronous archive tiers are never enabled.
+    "intelligent_tiering": {
+        "transitions": [{"Days": 0, "StorageClass": "INTELLIGENT_TIERING"}],
+        "noncurrent_days": 30
+    },
     
-    # Block all public access
-    s3.put_public_access_block(
-        Bucket=bucket_name,
-        PublicAccessBlockConfiguration={
-            "BlockPublicAcls": True,
-            "IgnorePublicAcls": True,
-            "BlockPublicPolicy": True,
-            "RestrictPublicBuckets": True
-        }
-    )
-    print("Public access blocked")
+    # Everything stays in S3 Standard
+    "standard": {
+        "transitions": [],
+        "noncurrent_days": 30
+    },
     
-    # Add lifecycle rule for archiving old objects
-    s3.put_bucket_lifecycle_configuration(
-        Bucket=bucket_name,
-        LifecycleConfiguration={
-            "Rules": [{
-                "ID": "archive-to-glacier",
-                "Status": "Enabled",
-                "Filter": {"Prefix": ""},
-                "Transitions": [{
-                    "Days": 90,
-                    "StorageClass": "GLACIER"
-                }]
-            }]
-        }
-    )
-    print("Lifecycle rules configured")
+    # Glacier Instant Retrieval after 90 days, for tenants that rarely
+    # reopen old documents
+    "archive_instant": {
+        "transitions": [{"Days": 90, "StorageClass": "GLACIER_IR"}],
+        "noncurrent_days": 90
+    },
+}
+
+# Tag recording a bucket's storage profile, read back by reconciliation
+STORAGE_PROFILE_TAG = "StorageProfile"
+
+
+def storage_profile(tier: str | None = None) -> str:
+    """The storage profile for a tenant tier."""
+    profile = TIER_STORAGE_PROFILES.get(tier, STORAGE_PROFILE) if tier else STORAGE_PROFILE
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown storage profile: {profile}")
+    return profile
+
+
+def lifecycle_config(profile: str) -> dict:
+    """Lifecycle rules of a storage profile."""
+    settings = STORAGE_PROFILES[profile]
+    rule = {
+        "ID": f"storage-profile-{profile}",
+        "Status": "Enabled",
+        "Filter": {"Prefix": ""},
+        "Expiration": {"ExpiredObjectDeleteMarker": True},
+        "NoncurrentVersionExpiration": {"NoncurrentDays": settings["noncurrent_days"]},
+        "AbortIncompleteMultipartUpload": {"DaysAfterInitiation": 7}
+    }
+    if settings["transitions"]:
+        rule["Transitions"] = settings["transitions"]
+    return {"Rules": [rule]}
+
+
+def bucket_storage_profile(bucket_name: str) -> str:
+    """
+    The storage profile recorded on a bucket.
     
-    # Enforce TLS
-    bucket_policy = {
-        "Version": "2012-10-17",
-        "Statement": [{
-            "Sid": "DenyInsecureTransport",
-            "Effect": "Deny",
-            "Principal": "*",
-            "Action": "s3:*",
-            "Resource": [
-                f"arn:aws:s3:::{bucket_name}",
-                f"arn:aws:s3:::{bucket_name}/*"
-            ],
-            "Condition": {
-                "Bool": {"aws:SecureTransport": "false"}
-            }
+    Buckets from before storage profiles have no tag and get the default
+    profile, which replaces their fixed Glacier rule on reconciliation.
+    """
+    tagging = read_config(bucket_name, "tagging") or {"TagSet": []}
+    for tag in tagging["TagSet"]:
+        if tag["Key"] == STORAGE_PROFILE_TAG and tag["Value"] in STORAGE_PROFILES:
+            return tag["Value"]
+    return STORAGE_PROFILE
+
+
+def account_id() -> str:
+    """The AWS account of this function (ACCOUNT_ID, else looked up once)."""
+    global ACCOUNT_ID
+    if not ACCOUNT_ID:
+        ACCOUNT_ID = get_client("sts").get_caller_identity()["Account"]
+    return ACCOUNT_ID
+
+
+def tenant_key_alias(tenant_id: str) -> str:
+    """Alias of a tenant's own KMS key."""
+    return f"alias/{TENANT_BUCKET_PREFIX}{tenant_id}-{ENVIRONMENT}"
+
+
+def encryption_config(tenant_id: str, region: str) -> dict:
+    """
+    Default encryption of a tenant bucket, per KMS_ENCRYPTION.
+    
+    - aes256:     SSE-S3
+    - shared:     SSE-KMS with the shared key of the bucket's region (KMS_KEY_ARNS)
+    - per_tenant: SSE-KMS with the tenant's own key, named by its alias; the
+                  encryption step creates the key if needed. Unclaimed pool
+                  buckets use SSE-S3 until claimed.
+    
+    KMS configurations enable S3 Bucket Keys, so S3 asks KMS for a bucket-level
+    key now and then instead of calling KMS on every object PUT and GET.
+    """
+    if KMS_ENCRYPTION == "aes256" or (KMS_ENCRYPTION == "per_tenant" and not tenant_id):
+        return {"Rules": [{"ApplyServerSideEncryptionByDefault": {"SSEAlgorithm": "AES256"}}]}
+    
+    if KMS_ENCRYPTION == "shared":
+        key = KMS_KEY_ARNS.get(region)
+        if not key:
+            raise ValueError(f"No shared KMS key configured for region {region}")
+    elif KMS_ENCRYPTION == "per_tenant":
+        key = f"arn:aws:kms:{region}:{account_id()}:{tenant_key_alias(tenant_id)}"
+    else:
+        raise ValueError(f"Unknown KMS_ENCRYPTION mode: {KMS_ENCRYPTION}")
+    
+    return {
+        "Rules": [{
+            "ApplyServerSideEncryptionByDefault": {
+                "SSEAlgorithm": "aws:kms",
+                "KMSMasterKeyID": key
+            },
+            "BucketKeyEnabled": True
         }]
     }
-    s3.put_bucket_policy(Bucket=bucket_name, Policy=json.dumps(bucket_policy))
-    print("TLS enforcement policy applied")
+
+
+def desired_config(
+    bucket_name: str,
+    tenant_id: str,
+    profile: str | None = None,
+    region: str | None = None,
+) -> dict:
+    """
+    Desired configuration of a tenant bucket, keyed by configuration step.
     
-    # Tag the bucket
-    s3.put_bucket_tagging(
-        Bucket=bucket_name,
-        Tagging={
+    region defaults to the bucket's region as far as this container knows.
+    """
+    profile = profile or STORAGE_PROFILE
+    region = region or _bucket_regions.get(bucket_name, REGION)
+    config = {
+        # Enable versioning
+        "versioning": {"Status": "Enabled"},
+        
+        # Enable server-side encryption (SSE-S3 or SSE-KMS with Bucket Keys)
+        "encryption": encryption_config(tenant_id, region),
+        
+        # Block all public access
+        "public_access_block": {
+            "BlockPublicAcls": True,
+            "IgnorePublicAcls": True,
+            "BlockPublicPolicy": True,
+            "RestrictPublicBuckets": True
+        },
+        
+        # Tier objects and expire old versions per the storage profile
+        "lifecycle": lifecycle_config(profile),
+        
+        # Enforce TLS
+        "policy": {
+            "Version": "2012-10-17",
+            "Statement": [{
+                "Sid": "DenyInsecureTransport",
+                "Effect": "Deny",
+                "Principal": "*",
+                "Action": "s3:*",
+                "Resource": [
+                    f"arn:aws:s3:::{bucket_name}",
+                    f"arn:aws:s3:::{bucket_name}/*"
+                ],
+                "Condition": {
+                    "Bool": {"aws:SecureTransport": "false"}
+                }
+            }]
+        },
+        
+        # Tag the bucket (sorted by key, as S3 returns them)
+        "tagging": {
             "TagSet": [
-                {"Key": "TenantId", "Value": str(tenant_id)},
                 {"Key": "Environment", "Value": ENVIRONMENT},
                 {"Key": "ManagedBy", "Value": "tenant-provisioner-lambda"},
-                {"Key": "Project", "Value": "envelope"}
+                {"Key": "Project", "Value": "envelope"},
+                {"Key": STORAGE_PROFILE_TAG, "Value": profile},
+                {"Key": "TenantId", "Value": str(tenant_id)}
             ]
-        }
-    )
-    print("Tags applied")
-    
-    # Configure CORS for browser uploads
-    s3.put_bucket_cors(
-        Bucket=bucket_name,
-        CORSConfiguration={
+        },
+        
+        # Configure CORS for browser uploads
+        "cors": {
             "CORSRules": [{
                 "AllowedHeaders": ["*"],
                 "AllowedMethods": ["GET", "PUT", "POST", "HEAD"],
@@ -198,121 +599,1160 @@ def create_bucket(tenant_id: str) -> dict:
                 "ExposeHeaders": ["ETag", "x-amz-meta-*"],
                 "MaxAgeSeconds": 3600
             }]
-        }
+        },
+    }
+    
+    # Send object events to EventBridge, where the malware scan rule picks up
+    # "Object Created" within seconds of an upload
+    if EVENTBRIDGE_NOTIFICATIONS:
+        config["notification"] = {"EventBridgeConfiguration": {}}
+    
+    return config
+
+
+def pool_config(bucket_name: str) -> dict:
+    """
+    Desired configuration of an unclaimed pool bucket.
+    
+    The tenant configuration in the default storage profile, without a
+    TenantId tag; the bucket is marked as pooled instead until a tenant
+    claims it.
+    """
+    config = desired_config(bucket_name, "")
+    config["tagging"] = {
+        "TagSet": sorted(
+            [tag for tag in config["tagging"]["TagSet"] if tag["Key"] != "TenantId"]
+            + [{"Key": "Pool", "Value": "available"}],
+            key=lambda tag: tag["Key"]
+        )
+    }
+    return config
+
+
+def ensure_tenant_key(alias_arn: str) -> None:
+    """
+    Make sure a tenant key alias points at a usable KMS key.
+    
+    The key is created (with rotation enabled) on first use. A key pending
+    deletion, left by a deleted tenant that has been re-created, is
+    restored.
+    """
+    if alias_arn in _tenant_keys:
+        return
+    
+    region, alias_name = alias_arn.split(":")[3], alias_arn.split(":", 5)[5]
+    kms = get_client("kms", region)
+    
+    with metrics.timed("tenant_key"):
+        try:
+            key = kms.describe_key(KeyId=alias_arn)["KeyMetadata"]
+        except kms.exceptions.NotFoundException:
+            key = None
+        
+        if key is None:
+            key_id = kms.create_key(
+                Description=f"Tenant bucket encryption ({alias_name})",
+                Tags=[
+                    {"TagKey": "Environment", "TagValue": ENVIRONMENT},
+                    {"TagKey": "ManagedBy", "TagValue": "tenant-provisioner-lambda"}
+                ]
+            )["KeyMetadata"]["KeyId"]
+            kms.enable_key_rotation(KeyId=key_id)
+            try:
+                kms.create_alias(AliasName=alias_name, TargetKeyId=key_id)
+                print(f"Created KMS key {key_id} as {alias_name}")
+            except kms.exceptions.AlreadyExistsException:
+                # A concurrent run created the tenant's key first
+                kms.schedule_key_deletion(KeyId=key_id, PendingWindowInDays=7)
+        elif key["KeyState"] == "PendingDeletion":
+            kms.cancel_key_deletion(KeyId=key["KeyId"])
+            kms.enable_key(KeyId=key["KeyId"])
+            print(f"Restored KMS key {key['KeyId']} of {alias_name}")
+    
+    _tenant_keys.add(alias_arn)
+
+
+def retire_tenant_key(tenant_id: str, region: str) -> None:
+    """Schedule deletion of a deleted tenant's KMS key (30 day window)."""
+    alias_arn = f"arn:aws:kms:{region}:{account_id()}:{tenant_key_alias(tenant_id)}"
+    kms = get_client("kms", region)
+    
+    try:
+        key = kms.describe_key(KeyId=alias_arn)["KeyMetadata"]
+        if key["KeyState"] != "PendingDeletion":
+            kms.schedule_key_deletion(KeyId=key["KeyId"], PendingWindowInDays=30)
+            print(f"Scheduled deletion of KMS key {key['KeyId']} of tenant {tenant_id}")
+    except kms.exceptions.NotFoundException:
+        pass
+    except Exception as e:
+        print(f"Warning: could not retire KMS key of tenant {tenant_id}: {str(e)}")
+    
+    _tenant_keys.discard(alias_arn)
+
+
+def configure_versioning(bucket_name: str, config: dict) -> None:
+    """Enable versioning."""
+    bucket_client(bucket_name).put_bucket_versioning(
+        Bucket=bucket_name,
+        VersioningConfiguration=config
+    )
+    print("Versioning enabled")
+
+
+def configure_encryption(bucket_name: str, config: dict) -> None:
+    """Enable server-side encryption, creating the tenant's KMS key if needed."""
+    key = config["Rules"][0]["ApplyServerSideEncryptionByDefault"].get("KMSMasterKeyID", "")
+    if KMS_ENCRYPTION == "per_tenant" and ":alias/" in key:
+        ensure_tenant_key(key)
+    
+    bucket_client(bucket_name).put_bucket_encryption(
+        Bucket=bucket_name,
+        ServerSideEncryptionConfiguration=config
+    )
+    print("Encryption enabled")
+
+
+def configure_public_access_block(bucket_name: str, config: dict) -> None:
+    """Block public access."""
+    bucket_client(bucket_name).put_public_access_block(
+        Bucket=bucket_name,
+        PublicAccessBlockConfiguration=config
+    )
+    print("Public access blocked")
+
+
+def configure_lifecycle(bucket_name: str, config: dict) -> None:
+    """Apply lifecycle rules."""
+    bucket_client(bucket_name).put_bucket_lifecycle_configuration(
+        Bucket=bucket_name,
+        LifecycleConfiguration=config
+    )
+    print("Lifecycle rules configured")
+
+
+def configure_policy(bucket_name: str, config: dict) -> None:
+    """Apply the bucket policy."""
+    bucket_client(bucket_name).put_bucket_policy(Bucket=bucket_name, Policy=json.dumps(config))
+    print("TLS enforcement policy applied")
+
+
+def configure_tagging(bucket_name: str, config: dict) -> None:
+    """Tag the bucket."""
+    bucket_client(bucket_name).put_bucket_tagging(
+        Bucket=bucket_name,
+        Tagging=config
+    )
+    print("Tags applied")
+
+
+def configure_cors(bucket_name: str, config: dict) -> None:
+    """Configure CORS."""
+    bucket_client(bucket_name).put_bucket_cors(
+        Bucket=bucket_name,
+        CORSConfiguration=config
     )
     print("CORS configuration applied")
+
+
+def configure_notification(bucket_name: str, config: dict) -> None:
+    """
+    Configure event notifications (EventBridge delivery).
     
-    return {"bucket": bucket_name, "region": REGION, "status": "created"}
+    The put replaces the bucket's whole notification configuration, so the
+    current one is read and merged, keeping any queue, topic or Lambda
+    notifications set up outside the provisioner. Their destinations were
+    validated when they were added and are not validated again.
+    """
+    s3 = bucket_client(bucket_name)
+    current = s3.get_bucket_notification_configuration(Bucket=bucket_name)
+    current.pop("ResponseMetadata", None)
+    
+    s3.put_bucket_notification_configuration(
+        Bucket=bucket_name,
+        NotificationConfiguration={**current, **config},
+        SkipDestinationValidation=True
+    )
+    print("EventBridge notifications enabled")
 
 
-def delete_bucket(tenant_id: str) -> dict:
-    """Delete an S3 bucket and all its contents."""
-    bucket_name = f"{TENANT_BUCKET_PREFIX}{tenant_id}-{ENVIRONMENT}"
+# Bucket configuration steps, applied by run_config_steps()
+CONFIG_STEPS = {
+    "versioning": configure_versioning,
+    "encryption": configure_encryption,
+    "public_access_block": configure_public_access_block,
+    "lifecycle": configure_lifecycle,
+    "policy": configure_policy,
+    "tagging": configure_tagging,
+    "cors": configure_cors,
+    "notification": configure_notification,
+}
+
+# How to read each step's current configuration:
+# (client method, response key or None for the whole response, error code when unset)
+CONFIG_READERS = {
+    "versioning": ("get_bucket_versioning", None, None),
+    "encryption": (
+        "get_bucket_encryption",
+        "ServerSideEncryptionConfiguration",
+        "ServerSideEncryptionConfigurationNotFoundError"
+    ),
+    "public_access_block": (
+        "get_public_access_block",
+        "PublicAccessBlockConfiguration",
+        "NoSuchPublicAccessBlockConfiguration"
+    ),
+    "lifecycle": ("get_bucket_lifecycle_configuration", None, "NoSuchLifecycleConfiguration"),
+    "policy": ("get_bucket_policy", "Policy", "NoSuchBucketPolicy"),
+    "tagging": ("get_bucket_tagging", None, "NoSuchTagSet"),
+    "cors": ("get_bucket_cors", None, "NoSuchCORSConfiguration"),
+    "notification": ("get_bucket_notification_configuration", None, None),
+}
+
+def run_config_step(name: str, bucket_name: str, config: Any, context: Any = None) -> None:
+    """
+    Apply one configuration step, timing it.
     
-    print(f"Deleting bucket: {bucket_name}")
+    A bucket created moments ago may not be visible yet, so NoSuchBucket is
+    retried with short exponential intervals while the invocation has time.
+    """
+    s3 = bucket_client(bucket_name)
+    delay = READY_POLL_INITIAL
+    
+    with metrics.timed(name):
+        while True:
+            try:
+                CONFIG_STEPS[name](bucket_name, config)
+                return
+            except s3.exceptions.ClientError as e:
+                if e.response["Error"]["Code"] != "NoSuchBucket":
+                    raise
+                if remaining_seconds(context) - CALLBACK_RESERVE_SECONDS < delay:
+                    raise
+            time.sleep(delay)
+            delay = min(delay * 2, READY_POLL_MAX)
+
+
+# Steps that may only start once other steps have succeeded.
+# The bucket policy goes on after public access is blocked.
+CONFIG_STEP_DEPENDENCIES = {
+    "policy": ("public_access_block",),
+}
+
+
+def run_config_steps(bucket_name: str, config: dict, context: Any = None) -> list:
+    """
+    Apply bucket configuration steps concurrently.
+    
+    config maps step names to the configuration each step should apply.
+    Independent steps run in a thread pool of CONFIG_MAX_WORKERS; a step
+    starts as soon as everything it depends on has succeeded. Steps whose
+    dependencies failed are skipped. Returns the names of the applied steps
+    and raises BucketConfigurationError listing every failed or skipped step.
+    
+    With a Lambda context no step is started once less than
+    STEP_RESERVE_SECONDS remain. The running steps are finished and
+    DeadlineExceeded is raised with the steps still pending.
+    """
+    pending = [step for step in CONFIG_STEPS if step in config]
+    all_steps = set(pending)
+    applied = []
+    failures = {}
+    
+    with ThreadPoolExecutor(max_workers=CONFIG_MAX_WORKERS) as pool:
+        running = {}
+        while pending or running:
+            # Near the deadline nothing new starts; the running steps finish
+            out_of_time = remaining_seconds(context) < STEP_RESERVE_SECONDS
+            startable = [] if out_of_time else list(pending)
+            
+            for name in startable:
+                deps = [d for d in CONFIG_STEP_DEPENDENCIES.get(name, ()) if d in all_steps]
+                failed_deps = [d for d in deps if d in failures]
+                if failed_deps:
+                    pending.remove(name)
+                    failures[name] = f"skipped, requires {', '.join(failed_deps)}"
+                elif all(d in applied for d in deps):
+                    pending.remove(name)
+                    future = metrics.submit(pool, run_config_step, name, bucket_name, config[name], context)
+                    running[future] = name
+            
+            if not running:
+                # Only unsatisfiable dependencies (or no time) left
+                if not out_of_time:
+                    for name in pending:
+                        failures[name] = "skipped, unresolved dependencies"
+                break
+            
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    future.result()
+                    applied.append(name)
+                except Exception as e:
+                    print(f"Configuration step {name} failed: {str(e)}")
+                    failures[name] = str(e)
+    
+    if failures:
+        raise BucketConfigurationError(bucket_name, failures)
+    
+    if pending:
+        raise DeadlineExceeded(pending)
+    
+    return applied
+
+
+def read_config(bucket_name: str, step: str) -> Any:
+    """Read the current configuration of one step, or None if it is not set."""
+    s3 = bucket_client(bucket_name)
+    method, key, missing_code = CONFIG_READERS[step]
     
-    # Check if bucket exists
     try:
-        s3.head_bucket(Bucket=bucket_name)
+        response = getattr(s3, method)(Bucket=bucket_name)
     except s3.exceptions.ClientError as e:
-        if e.response["Error"]["Code"] == "404":
-            print(f"Bucket {bucket_name} does not exist")
-            return {"bucket": bucket_name, "status": "not_found"}
+        if missing_code and e.response["Error"]["Code"] == missing_code:
+            return None
         raise
     
-    # Delete all objects and versions
-    paginator = s3.get_paginator("list_object_versions")
-    for page in paginator.paginate(Bucket=bucket_name):
-        objects_to_delete = []
+    response.pop("ResponseMetadata", None)
+    current = response.get(key) if key else response
+    
+    if step == "policy":
+        current = json.loads(current)
+    elif step == "tagging":
+        current["TagSet"] = sorted(current["TagSet"], key=lambda tag: tag["Key"])
+    elif step == "notification":
+        # Only EventBridge delivery is managed; other notifications are not drift
+        current = {k: v for k, v in current.items() if k == "EventBridgeConfiguration"}
+    
+    return current
+
+
+def config_matches(desired: Any, current: Any) -> bool:
+    """
+    Check whether the current configuration satisfies the desired one.
+    
+    Dicts only need to contain the desired keys, since S3 fills in defaults
+    (e.g. BucketKeyEnabled) when returning a configuration. Lists must match
+    element by element.
+    """
+    if isinstance(desired, dict):
+        return isinstance(current, dict) and all(
+            key in current and config_matches(value, current[key])
+            for key, value in desired.items()
+        )
+    
+    if isinstance(desired, list):
+        return isinstance(current, list) and len(desired) == len(current) and all(
+            config_matches(d, c) for d, c in zip(desired, current)
+        )
+    
+    return desired == current
+
+
+def reconcile_bucket(bucket_name: str, desired: dict, apply: bool = True, context: Any = None) -> dict:
+    """
+    Bring an existing bucket to its desired configuration.
+    
+    Every step is read concurrently and compared with the desired state;
+    only drifted steps are re-applied. A bucket that is already correct
+    costs read calls only. With apply=False the drift is only reported.
+    """
+    with metrics.timed("reconcile_read"), ThreadPoolExecutor(max_workers=CONFIG_MAX_WORKERS) as pool:
+        current = dict(zip(desired, pool.map(lambda step: read_config(bucket_name, step), desired)))
+    
+    drift = [step for step in desired if not config_matches(desired[step], current[step])]
+    
+    if not drift:
+        print(f"Bucket {bucket_name} configuration up to date")
+        return {"drift": [], "applied": []}
+    
+    print(f"Bucket {bucket_name} configuration drift: {', '.join(drift)}")
+    
+    if not apply:
+        return {"drift": drift, "applied": []}
+    
+    applied = run_config_steps(bucket_name, {step: desired[step] for step in drift}, context)
+    return {"drift": drift, "applied": applied}
+
+
+def bucket_exists(bucket_name: str) -> bool:
+    """
+    Check whether a bucket exists (and is ours to access).
+    
+    S3 reports the bucket's region with the answer, which is remembered for
+    bucket_client().
+    """
+    s3 = bucket_client(bucket_name)
+    
+    with metrics.timed("head_bucket"):
+        try:
+            response = s3.head_bucket(Bucket=bucket_name)
+        except s3.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] == "404":
+                return False
+            raise
+    
+    headers = response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+    remember_bucket_region(bucket_name, response.get("BucketRegion") or headers.get("x-amz-bucket-region"))
+    return True
+
+
+def wait_bucket_ready(bucket_name: str, context: Any = None) -> None:
+    """
+    Poll until a new bucket is visible.
+    
+    Polls at short, growing intervals (READY_POLL_INITIAL doubling up to
+    READY_POLL_MAX) rather than the bucket_exists waiter's fixed 5 seconds,
+    and raises DeadlineExceeded instead of outlasting the invocation.
+    """
+    s3 = bucket_client(bucket_name)
+    delay = READY_POLL_INITIAL
+    
+    with metrics.timed("wait_bucket_ready"):
+        while True:
+            try:
+                s3.head_bucket(Bucket=bucket_name)
+                return
+            except s3.exceptions.ClientError as e:
+                if e.response["Error"]["Code"] not in ("404", "NoSuchBucket"):
+                    raise
+            if remaining_seconds(context) - STEP_RESERVE_SECONDS < delay:
+                raise DeadlineExceeded(["wait_bucket_ready"])
+            time.sleep(delay)
+            delay = min(delay * 2, READY_POLL_MAX)
+
+
+def make_bucket(bucket_name: str, config: dict, context: Any = None, region: str = REGION) -> None:
+    """
+    Create a bucket in a region and apply its configuration.
+    
+    There is no separate wait for the new bucket: the configuration steps
+    retry NoSuchBucket until it is visible. Only a bucket created without
+    configuration is polled until ready.
+    """
+    remember_bucket_region(bucket_name, region)
+    s3 = bucket_client(bucket_name)
+    
+    create_params = {"Bucket": bucket_name}
+    if region != "us-east-1":
+        create_params["CreateBucketConfiguration"] = {"LocationConstraint": region}
+    
+    with metrics.timed("create_bucket"):
+        s3.create_bucket(**create_params)
+    print(f"Bucket created: {bucket_name}")
+    
+    if not config:
+        wait_bucket_ready(bucket_name, context)
+        return
+    
+    # Apply the bucket configuration concurrently
+    run_config_steps(bucket_name, config, context)
+
+
+def pause_provisioning(result: dict, error: DeadlineExceeded, runs: int = 0) -> dict:
+    """Turn a create result into a resumable "in_progress" result."""
+    if runs + 1 >= PROVISIONING_MAX_RUNS:
+        raise error
+    
+    print(f"Provisioning of {result['bucket']} paused before the deadline, pending: {', '.join(error.pending)}")
+    checkpoint = {
+        "bucket": result["bucket"],
+        "region": result["region"],
+        "storage_profile": result["storage_profile"],
+        "status": result["status"],
+        "pending": error.pending,
+        "runs": runs + 1
+    }
+    return dict(result, status="in_progress", checkpoint=checkpoint)
+
+
+def resume_provisioning(tenant_id: str, checkpoint: dict, context: Any = None) -> dict:
+    """Apply the configuration steps a paused provisioning left pending."""
+    bucket_name = checkpoint["bucket"]
+    region = checkpoint.get("region", REGION)
+    profile = checkpoint.get("storage_profile", STORAGE_PROFILE)
+    remember_bucket_region(bucket_name, region)
+    desired = desired_config(bucket_name, tenant_id, profile)
+    result = {"bucket": bucket_name, "region": region, "storage_profile": profile, "status": checkpoint["status"]}
+    
+    print(f"Resuming provisioning of {bucket_name}: {', '.join(checkpoint['pending'])}")
+    try:
+        run_config_steps(bucket_name, {step: desired[step] for step in checkpoint["pending"]}, context)
+    except DeadlineExceeded as e:
+        return pause_provisioning(result, e, checkpoint["runs"])
+    
+    return result
+
+
+def tenant_bucket_name(tenant_id: str) -> str:
+    """The tenant's bucket: its claimed pool bucket, else the derived name."""
+    if pool.STATE_BUCKET:
+        with metrics.timed("pool_lookup"):
+            assigned = pool.assigned_bucket(get_client("s3"), tenant_id)
+        if assigned:
+            return assigned
+    
+    return f"{TENANT_BUCKET_PREFIX}{tenant_id}-{ENVIRONMENT}"
+
+
+def claim_pool_bucket(tenant_id: str, context: Any = None, profile: str = STORAGE_PROFILE) -> dict | None:
+    """
+    Assign a pre-configured pool bucket to a tenant.
+    
+    Only the tenant tags remain to be applied, plus the lifecycle rules when
+    the tenant's storage profile is not the default one. A tenant that
+    already holds a pool bucket (a redelivered event) gets the same bucket
+    back. Returns None when the pool is empty, or when the tenant already
+    has a dedicated bucket (created while the pool was empty or disabled),
+    which create_bucket then reconciles instead.
+    """
+    s3 = get_client("s3")
+    
+    with metrics.timed("pool_lookup"):
+        bucket_name = pool.assigned_bucket(s3, tenant_id)
+    
+    if not bucket_name and bucket_exists(f"{TENANT_BUCKET_PREFIX}{tenant_id}-{ENVIRONMENT}"):
+        print(f"Tenant {tenant_id} already has a dedicated bucket, not claiming from the pool")
+        return None
+    
+    if bucket_name:
+        print(f"Tenant {tenant_id} already holds pool bucket {bucket_name}")
+        result = {"bucket": bucket_name, "region": REGION, "storage_profile": profile, "status": "exists"}
+        if RECONCILE_EXISTING_BUCKETS:
+            desired = desired_config(bucket_name, tenant_id, profile)
+            try:
+                result["reconciled"] = reconcile_bucket(bucket_name, desired, context=context)["applied"]
+            except DeadlineExceeded as e:
+                return pause_provisioning(result, e)
+        return result
+    
+    with metrics.timed("pool_claim"):
+        bucket_name = pool.claim_bucket(s3, tenant_id)
+    
+    if bucket_name is None:
+        print("Bucket pool is empty, creating a dedicated bucket")
+        return None
+    
+    print(f"Claimed pool bucket {bucket_name} for tenant {tenant_id}")
+    result = {"bucket": bucket_name, "region": REGION, "storage_profile": profile, "status": "claimed"}
+    desired = desired_config(bucket_name, tenant_id, profile)
+    steps = ["tagging"]
+    if profile != STORAGE_PROFILE:
+        steps.append("lifecycle")
+    if KMS_ENCRYPTION == "per_tenant":
+        # Pool buckets use SSE-S3 until claimed
+        steps.append("encryption")
+    try:
+        run_config_steps(bucket_name, {step: desired[step] for step in steps}, context)
+    except DeadlineExceeded as e:
+        return pause_provisioning(result, e)
+    
+    return result
+
+
+def create_bucket(
+    tenant_id: str,
+    context: Any = None,
+    checkpoint: dict | None = None,
+    region: str | None = None,
+    profile: str = STORAGE_PROFILE,
+) -> dict:
+    """
+    Create an S3 bucket for a tenant with secure configuration.
+    
+    The bucket goes into the tenant's preferred region (one of
+    ALLOWED_REGIONS), REGION by default, with the lifecycle rules of the
+    tenant's storage profile. With the bucket pool enabled a
+    pool bucket is claimed instead for tenants in REGION without a
+    dedicated bucket, falling back to creating one when the pool is empty. If the bucket already exists (e.g.
+    a retry after a partial failure) its configuration is reconciled against
+    the desired state instead, wherever it lives.
+    
+    With a Lambda context, work that would run past the deadline is not
+    started: the result has status "in_progress" and a checkpoint, and
+    calling again with that checkpoint applies the remaining steps.
+    """
+    if checkpoint:
+        return resume_provisioning(tenant_id, checkpoint, context)
+    
+    region = region or REGION
+    
+    # Pool buckets are created in REGION
+    if pool.pool_enabled() and region == REGION:
+        result = claim_pool_bucket(tenant_id, context, profile)
+        if result:
+            return result
+    
+    bucket_name = f"{TENANT_BUCKET_PREFIX}{tenant_id}-{ENVIRONMENT}"
+    desired = desired_config(bucket_name, tenant_id, profile, region)
+    
+    print(f"Creating bucket: {bucket_name} in region: {region}")
+    
+    # Check if bucket already exists
+    if bucket_exists(bucket_name):
+        existing_region = _bucket_regions.get(bucket_name, region)
+        print(f"Bucket {bucket_name} already exists in {existing_region}")
+        desired = desired_config(bucket_name, tenant_id, profile, existing_region)
+        result = {"bucket": bucket_name, "region": existing_region, "storage_profile": profile, "status": "exists"}
+        if RECONCILE_EXISTING_BUCKETS:
+            try:
+                result["reconciled"] = reconcile_bucket(bucket_name, desired, context=context)["applied"]
+            except DeadlineExceeded as e:
+                return pause_provisioning(result, e)
+        return result
+    
+    result = {"bucket": bucket_name, "region": region, "storage_profile": profile, "status": "created"}
+    
+    # Too late to create the bucket; start over in a new invocation
+    if remaining_seconds(context) < STEP_RESERVE_SECONDS:
+        print(f"Provisioning of {bucket_name} deferred, too little time left")
+        return dict(result, status="in_progress", checkpoint={})
+    
+    try:
+        make_bucket(bucket_name, desired, context, region)
+    except DeadlineExceeded as e:
+        return pause_provisioning(result, e)
+    
+    return result
+
+
+def delete_bucket(
+    tenant_id: str,
+    context: Any = None,
+    checkpoint: dict | None = None,
+    export_objects: bool = False,
+) -> dict:
+    """
+    Delete an S3 bucket and all its contents.
+    
+    With export_objects the current objects are first exported to the
+    retention bucket (see export.py). With a Lambda context the export and
+    the purge stop before the invocation deadline and return status
+    "in_progress" with a checkpoint; calling again with that checkpoint
+    continues where the previous run stopped. A container runs one export
+    at a time; a delete that cannot get its turn in time is deferred the
+    same way. The bucket's region is resolved from S3, so every request
+    goes to the right regional endpoint.
+    A deleted pool bucket is also removed from the pool registry.
+    """
+    bucket_name = tenant_bucket_name(tenant_id)
+    
+    print(f"Deleting bucket: {bucket_name}")
+    
+    # Check if bucket exists, learning its region
+    if not bucket_exists(bucket_name):
+        print(f"Bucket {bucket_name} does not exist")
+        if pool.is_pool_bucket(bucket_name):
+            pool.release_bucket(get_client("s3"), tenant_id, bucket_name)
+        if KMS_ENCRYPTION == "per_tenant":
+            retire_tenant_key(tenant_id, _bucket_regions.get(bucket_name, REGION))
+        return {"bucket": bucket_name, "status": "not_found"}
+    
+    s3 = bucket_client(bucket_name)
+    remaining_ms = context.get_remaining_time_in_millis if context else None
+    
+    # Checkpoints without a phase are purge checkpoints
+    checkpoint = checkpoint or {}
+    if "phase" not in checkpoint:
+        checkpoint = {"phase": "export" if export_objects and not checkpoint else "purge", "purge": checkpoint}
+    exported = checkpoint.get("exported")
+    
+    # Export current objects before they are deleted
+    if checkpoint["phase"] == "export":
+        import export
+        
+        # Deletes of one SQS batch run concurrently; wait for another export
+        # only while this invocation could still make progress after it
+        timeout = max(0, (remaining_ms() - export.EXPORT_RESERVE_MS) / 1000) if remaining_ms else None
+        if not _export_slot.acquire(timeout=timeout):
+            print(f"Export of {bucket_name} deferred, another export is running")
+            return {"bucket": bucket_name, "status": "in_progress", "checkpoint": checkpoint}
         
-        for version in page.get("Versions", []):
-            objects_to_delete.append({
-                "Key": version["Key"],
-                "VersionId": version["VersionId"]
-            })
+        try:
+            with metrics.timed("export"):
+                result = export.export_bucket(s3, get_client("s3"), bucket_name, tenant_id, checkpoint.get("export"), remaining_ms)
+        finally:
+            _export_slot.release()
         
-        for marker in page.get("DeleteMarkers", []):
-            objects_to_delete.append({
-                "Key": marker["Key"],
-                "VersionId": marker["VersionId"]
-            })
+        metrics.emit("export", {
+            "ObjectsExported": (result["exported"], "Count"),
+            "BytesExported": (result["bytes"], "Bytes"),
+            "Throughput": (result["bytes_per_second"], "Bytes/Second")
+        })
         
-        if objects_to_delete:
-            s3.delete_objects(
-                Bucket=bucket_name,
-                Delete={"Objects": objects_to_delete, "Quiet": True}
-            )
-            print(f"Deleted {len(objects_to_delete)} objects/versions")
+        if not result["complete"]:
+            print(f"Export of {bucket_name} paused after {result['total_exported']} objects")
+            return {
+                "bucket": bucket_name,
+                "status": "in_progress",
+                "checkpoint": {"phase": "export", "export": result["checkpoint"]},
+                "export": result
+            }
+        
+        print(f"Exported {bucket_name} to {result['manifest']}")
+        exported = {"manifest": result["manifest"], "objects": result["total_exported"], "bytes": result["total_bytes"]}
+    
+    # Delete all objects and versions
+    with metrics.timed("purge"):
+        purge = purge_bucket(s3, bucket_name, checkpoint=checkpoint.get("purge"), remaining_ms=remaining_ms)
+    
+    metrics.emit("purge", {
+        "ObjectsDeleted": (purge["deleted"], "Count"),
+        "Throughput": (purge["objects_per_second"], "Count/Second")
+    })
+    
+    if not purge["complete"]:
+        print(f"Teardown of {bucket_name} paused after {purge['total_deleted']} objects/versions")
+        return {
+            "bucket": bucket_name,
+            "status": "in_progress",
+            "checkpoint": {
+                "phase": "purge",
+                "purge": purge.pop("checkpoint"),
+                **({"exported": exported} if exported else {})
+            },
+            "purge": purge
+        }
     
     # Delete the bucket
-    s3.delete_bucket(Bucket=bucket_name)
+    with metrics.timed("delete_bucket"):
+        s3.delete_bucket(Bucket=bucket_name)
     print(f"Bucket {bucket_name} deleted")
     
-    return {"bucket": bucket_name, "status": "deleted"}
+    if pool.is_pool_bucket(bucket_name):
+        pool.release_bucket(get_client("s3"), tenant_id, bucket_name)
+    
+    if KMS_ENCRYPTION == "per_tenant":
+        retire_tenant_key(tenant_id, _bucket_regions.get(bucket_name, REGION))
+    
+    result = {"bucket": bucket_name, "status": "deleted", "purge": purge}
+    if exported:
+        result["export"] = exported
+    return result
 
 
-def lambda_handler(event: dict, context: Any) -> dict:
+def migration_target(tenant_id: str, detail: dict) -> tuple:
+    """The (tenant id, environment, bucket) a TenantMigrated event moves a tenant to."""
+    target_tenant_id = str(detail.get("target_tenant_id") or tenant_id)
+    target_environment = detail.get("target_environment") or ENVIRONMENT
+    return (
+        target_tenant_id,
+        target_environment,
+        f"{TENANT_BUCKET_PREFIX}{target_tenant_id}-{target_environment}"
+    )
+
+
+def kms_encrypted(bucket_name: str) -> bool:
+    """Whether a bucket's default encryption is SSE-KMS."""
+    config = read_config(bucket_name, "encryption") or {"Rules": []}
+    return any(
+        rule.get("ApplyServerSideEncryptionByDefault", {}).get("SSEAlgorithm", "").startswith("aws:kms")
+        for rule in config["Rules"]
+    )
+
+
+def migrate_tenant(tenant_id: str, detail: dict, context: Any = None, checkpoint: dict | None = None) -> dict:
     """
-    Main Lambda handler for EventBridge events.
+    Copy a tenant's objects to the bucket of its new id or environment.
+    
+    The target may be in another region ("region"), but only together with
+    a new id or environment: bucket names are global and derived from the
+    tenant id and environment, so the source bucket's name stays taken until
+    it is deleted. Moving a tenant to another region under the same name
+    would need a delete and re-create, not a copy.
+    
+    A migration runs in phases, each resumable with the checkpoint of an
+    "in_progress" result:
+    - provision: create the target bucket (target_tenant_id, "region" and
+      the source's storage profile). A target in another environment must
+      already have been provisioned there.
+    - copy:      server-side copy of every current object (migrate.copy_bucket)
+    - verify:    compare the listings of both buckets (migrate.verify_copy).
+                 ETags are compared unless either bucket uses SSE-KMS, whose
+                 ETags are not content hashes.
+    
+    Raises MigrationError if objects are missing from the target or differ.
+    The source bucket is left in place; deleting it is up to a TenantDeleted
+    for the old tenant.
+    """
+    import migrate
+    
+    checkpoint = checkpoint or {}
+    target_tenant_id, target_environment, target_bucket = migration_target(tenant_id, detail)
+    
+    if checkpoint:
+        source_bucket = checkpoint["source"]
+        remember_bucket_region(source_bucket, checkpoint["source_region"])
+        if "target" in checkpoint:
+            remember_bucket_region(checkpoint["target"], checkpoint["region"])
+    else:
+        source_bucket = tenant_bucket_name(tenant_id)
+        if not bucket_exists(source_bucket):
+            raise ValueError(f"Source bucket {source_bucket} does not exist")
+        checkpoint = {
+            "phase": "provision",
+            "source": source_bucket,
+            "source_region": _bucket_regions.get(source_bucket, REGION),
+            "runs": 0
+        }
+    
+    checkpoint = dict(checkpoint, runs=checkpoint["runs"] + 1)
+    remaining_ms = context.get_remaining_time_in_millis if context else None
+    print(f"Migrating {source_bucket} to tenant {target_tenant_id} in {target_environment} (run {checkpoint['runs']}, {checkpoint['phase']})")
+    
+    def paused(phase: str, **state: Any) -> dict:
+        return {
+            "bucket": checkpoint.get("target", target_bucket),
+            "source_bucket": source_bucket,
+            "status": "in_progress",
+            "checkpoint": dict(checkpoint, phase=phase, **state)
+        }
+    
+    if checkpoint["phase"] == "provision":
+        if target_environment == ENVIRONMENT:
+            created = create_bucket(
+                target_tenant_id,
+                context,
+                checkpoint.get("provisioning"),
+                detail.get("region"),
+                bucket_storage_profile(source_bucket)
+            )
+            if created["status"] == "in_progress":
+                return paused("provision", provisioning=created["checkpoint"])
+            target_bucket, region = created["bucket"], created["region"]
+        else:
+            if not bucket_exists(target_bucket):
+                raise ValueError(f"Target bucket {target_bucket} does not exist; provision it in {target_environment} first")
+            region = _bucket_regions.get(target_bucket, REGION)
+        
+        checkpoint.pop("provisioning", None)
+        checkpoint.update(phase="copy", target=target_bucket, region=region)
+    
+    target_bucket = checkpoint["target"]
+    source_s3, target_s3 = bucket_client(source_bucket), bucket_client(target_bucket)
+    
+    if checkpoint["phase"] == "copy":
+        with metrics.timed("copy"):
+            copied = migrate.copy_bucket(
+                source_s3, target_s3, source_bucket, target_bucket,
+                checkpoint=checkpoint.get("copy"), remaining_ms=remaining_ms
+            )
+        
+        metrics.emit("copy", {
+            "ObjectsCopied": (copied["copied"], "Count"),
+            "BytesCopied": (copied["bytes"], "Bytes"),
+            "Throughput": (copied["bytes_per_second"], "Bytes/Second")
+        })
+        
+        if not copied["complete"]:
+            return paused("copy", copy=copied["checkpoint"])
+        checkpoint.update(phase="verify", copy={"copied": copied["total_copied"], "bytes": copied["total_bytes"]})
+    
+    with metrics.timed("verify"):
+        verified = migrate.verify_copy(
+            source_s3, target_s3, source_bucket, target_bucket,
+            compare_etags=not (kms_encrypted(source_bucket) or kms_encrypted(target_bucket)),
+            checkpoint=checkpoint.get("verify"), remaining_ms=remaining_ms
+        )
+    
+    if not verified["complete"]:
+        return paused("verify", verify=verified["checkpoint"])
+    
+    problems = verified["missing"] + verified["mismatched"]
+    if problems:
+        raise migrate.MigrationError(source_bucket, target_bucket, verified["sample"], problems)
+    
+    print(f"Migration of {source_bucket} to {target_bucket} verified")
+    return {
+        "bucket": target_bucket,
+        "region": checkpoint["region"],
+        "source_bucket": source_bucket,
+        "status": "migrated",
+        "objects": verified["objects"],
+        "etag_verified": verified["etag_verified"],
+        "bytes": checkpoint["copy"]["bytes"],
+        "runs": checkpoint["runs"]
+    }
+
+
+def reinvoke(event: dict, context: Any, **detail: Any) -> None:
+    """Re-invoke this function asynchronously with the event, adding detail fields."""
+    payload = dict(event, detail=dict(event.get("detail", {}), **detail))
+    
+    get_client("lambda").invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType="Event",
+        Payload=json.dumps(payload).encode("utf-8")
+    )
+
+
+def continue_teardown(event: dict, context: Any, checkpoint: dict) -> None:
+    """Re-invoke this function asynchronously to resume a paused teardown."""
+    reinvoke(event, context, teardown_checkpoint=checkpoint)
+    runs = checkpoint.get(checkpoint["phase"], {}).get("runs", 0)
+    print(f"Scheduled teardown continuation (run {runs + 1})")
+
+
+def continue_provisioning(event: dict, context: Any, checkpoint: dict) -> None:
+    """Re-invoke this function asynchronously to resume a paused provisioning."""
+    reinvoke(event, context, provisioning_checkpoint=checkpoint)
+    print(f"Scheduled provisioning continuation (run {checkpoint.get('runs', 0) + 1})")
+
+
+def continue_migration(event: dict, context: Any, checkpoint: dict) -> None:
+    """Re-invoke this function asynchronously to resume a paused migration."""
+    reinvoke(event, context, migration_checkpoint=checkpoint)
+    print(f"Scheduled migration continuation (run {checkpoint['runs'] + 1})")
+
+
+# Metric action for each event type
+EVENT_ACTIONS = {
+    "TenantCreated": "create",
+    "TenantDeleted": "delete",
+    "TenantMigrated": "migrate",
+}
+
+
+def handle_event(event: dict, context: Any) -> dict:
+    """
+    Process a single EventBridge tenant event.
     
     Event structure:
     {
+        "id": "...",
         "source": "envelope.hq",
-        "detail-type": "TenantCreated" | "TenantDeleted",
+        "detail-type": "TenantCreated" | "TenantDeleted" | "TenantMigrated",
         "detail": {
             "tenant_id": "123",
             "subdomain": "acme",
+            "region": "eu-west-1",  # TenantCreated/TenantMigrated, optional; one of ALLOWED_REGIONS
+            "tier": "enterprise",  # TenantCreated only, optional; selects the storage profile
+            "target_tenant_id": "456",  # TenantMigrated only, optional; defaults to tenant_id
+            "target_environment": "staging",  # TenantMigrated only, optional; defaults to ENVIRONMENT
+            "export": true,  # TenantDeleted only, optional; defaults to EXPORT_ON_DELETE
+            "provisioning_checkpoint": {...},  # set on provisioning continuations
+            "teardown_checkpoint": {...},  # set on teardown continuations
+            "migration_checkpoint": {...},  # set on migration continuations
             ...
         }
     }
-    """
-    print(f"Received event: {json.dumps(event)}")
     
+    Successful outcomes whose callback was delivered are recorded for
+    IDEMPOTENCY_TTL_SECONDS; a redelivery of the same event returns the
+    recorded outcome straight away.
+    """
     detail_type = event.get("detail-type", "")
     detail = event.get("detail", {})
     tenant_id = str(detail.get("tenant_id", ""))
     
+    # Full event dumps are sampled; every event gets a one-line summary
+    if random.random() < LOG_EVENT_SAMPLE_RATE:
+        print(f"Received event: {json.dumps(event)}")
+    else:
+        print(f"Received {detail_type} for tenant {tenant_id or '-'}")
+    
+    metrics.set_action(EVENT_ACTIONS.get(detail_type, "unknown"))
+    
     if not tenant_id:
         return {"status": "error", "message": "tenant_id is required"}
     
-    try:
-        if detail_type == "TenantCreated":
-            # Create bucket
-            result = create_bucket(tenant_id)
+    region = detail.get("region")
+    if detail_type in ("TenantCreated", "TenantMigrated") and region and region not in ALLOWED_REGIONS:
+        return {"status": "error", "message": f"Region {region} is not allowed (allowed: {', '.join(ALLOWED_REGIONS)})"}
+    
+    if detail_type == "TenantDeleted" and detail.get("export", EXPORT_ON_DELETE) and not EXPORT_BUCKET:
+        return {"status": "error", "message": "Export requested but EXPORT_BUCKET is not configured"}
+    
+    if detail_type == "TenantMigrated" and migration_target(tenant_id, detail)[:2] == (tenant_id, ENVIRONMENT):
+        # Bucket names are global, so a region alone cannot move the bucket (see migrate_tenant)
+        return {"status": "error", "message": "TenantMigrated needs a target_tenant_id or target_environment; a region alone is not supported"}
+    
+    store = get_idempotency_store()
+    key = idempotency.event_key(event) if store else None
+    
+    if key:
+        try:
+            with metrics.timed("idempotency_lookup"):
+                outcome = store.get(key)
+        except Exception as e:
+            print(f"Idempotency lookup failed, processing event: {str(e)}")
+            outcome = None
+        
+        if outcome is not None:
+            print(f"Duplicate delivery of event {event['id']}, returning recorded outcome")
+            metrics.emit("duplicate", {"Duplicates": (1, "Count")})
+            return dict(outcome, duplicate=True)
+    
+    result = dispatch_event(event, context, detail_type, tenant_id, detail)
+    
+    if key and result.get("status") == "success" and result.get("callback", True):
+        try:
+            store.put(key, result, IDEMPOTENCY_TTL_SECONDS)
+        except Exception as e:
+            print(f"Could not record outcome of event {event['id']}: {str(e)}")
+    
+    return result
+
+
+def dispatch_event(event: dict, context: Any, detail_type: str, tenant_id: str, detail: dict) -> dict:
+    """Run the provisioning work for a validated tenant event."""
+    with metrics.timed("total"):
+        try:
+            if detail_type == "TenantCreated":
+                # Create bucket, resuming an earlier run if checkpointed
+                result = create_bucket(
+                    tenant_id,
+                    context,
+                    detail.get("provisioning_checkpoint"),
+                    detail.get("region"),
+                    storage_profile(detail.get("tier"))
+                )
+                
+                # Continue in a follow-up invocation before this one times out
+                if result["status"] == "in_progress":
+                    continue_provisioning(event, context, result["checkpoint"])
+                    return {"status": "in_progress", "action": "create", "result": result}
+                
+                # Update tenant via API callback
+                delivered = False
+                if result["status"] in ("created", "claimed", "exists"):
+                    delivered = call_api(tenant_id, "bucket_created", {
+                        "bucket": result["bucket"],
+                        "region": result["region"]
+                    }, context)
+                
+                return {"status": "success", "action": "create", "result": result, "callback": delivered}
             
-            # Update tenant via API callback
-            if result["status"] in ("created", "exists"):
-                call_api(tenant_id, "bucket_created", {
+            elif detail_type == "TenantDeleted":
+                # Delete bucket, resuming an earlier run if checkpointed
+                result = delete_bucket(
+                    tenant_id,
+                    context,
+                    detail.get("teardown_checkpoint"),
+                    detail.get("export", EXPORT_ON_DELETE)
+                )
+                
+                # Continue in a follow-up invocation before this one times out
+                if result["status"] == "in_progress":
+                    continue_teardown(event, context, result["checkpoint"])
+                    return {"status": "in_progress", "action": "delete", "result": result}
+                
+                # Update tenant via API callback
+                delivered = call_api(tenant_id, "bucket_deleted", {
+                    "bucket": result.get("bucket", ""),
+                    **({"export_manifest": result["export"]["manifest"]} if "export" in result else {})
+                }, context)
+                
+                return {"status": "success", "action": "delete", "result": result, "callback": delivered}
+            
+            elif detail_type == "TenantMigrated":
+                # Copy objects to the target bucket, resuming an earlier run if checkpointed
+                result = migrate_tenant(tenant_id, detail, context, detail.get("migration_checkpoint"))
+                
+                # Continue in a follow-up invocation before this one times out
+                if result["status"] == "in_progress":
+                    continue_migration(event, context, result["checkpoint"])
+                    return {"status": "in_progress", "action": "migrate", "result": result}
+                
+                # Update the target tenant via API callback
+                delivered = call_api(migration_target(tenant_id, detail)[0], "bucket_migrated", {
                     "bucket": result["bucket"],
-                    "region": result["region"]
-                })
+                    "region": result["region"],
+                    "source_bucket": result["source_bucket"],
+                    "objects": result["objects"],
+                    "bytes": result["bytes"]
+                }, context)
+                
+                return {"status": "success", "action": "migrate", "result": result, "callback": delivered}
             
-            return {"status": "success", "action": "create", "result": result}
+            else:
+                return {"status": "error", "message": f"Unknown detail-type: {detail_type}"}
         
-        elif detail_type == "TenantDeleted":
-            # Delete bucket
-            result = delete_bucket(tenant_id)
+        except Exception as e:
+            print(f"Error: {str(e)}")
             
-            # Update tenant via API callback
-            call_api(tenant_id, "bucket_deleted", {
-                "bucket": result.get("bucket", "")
-            })
+            # Try to update tenant with error status
+            try:
+                call_api(tenant_id, "bucket_error", {
+                    "error": str(e)
+                }, context)
+            except:
+                pass
             
-            return {"status": "success", "action": "delete", "result": result}
-        
+            raise
+
+
+def process_record(record: dict, context: Any) -> dict:
+    """Process one SQS record wrapping an EventBridge tenant event."""
+    try:
+        event = json.loads(record["body"])
+    except ValueError as e:
+        result = {"status": "error", "message": f"Message body is not valid JSON: {str(e)}"}
+    else:
+        if isinstance(event, dict):
+            result = handle_event(event, context)
         else:
-            return {"status": "error", "message": f"Unknown detail-type: {detail_type}"}
+            result = {"status": "error", "message": "Message body is not an event object"}
     
-    except Exception as e:
-        print(f"Error: {str(e)}")
-        
-        # Try to update tenant with error status
-        try:
-            call_api(tenant_id, "bucket_error", {
-                "error": str(e)
-            })
-        except:
-            pass
-        
-        raise
+    # Malformed events will never succeed, so they are not retried
+    if result.get("status") == "error":
+        print(f"Dropping record {record.get('messageId')}: {result['message']}")
+    
+    return result
+
 
+def handle_batch(records: list, context: Any) -> dict:
+    """
+    Process a batch of SQS records concurrently.
+    
+    Up to BATCH_CONCURRENCY records are handled at once. The response uses
+    the SQS partial batch format so only failed records are retried.
+    """
+    print(f"Received batch of {len(records)} records")
+    
+    failures = []
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY) as pool:
+        futures = {
+            pool.submit(process_record, record, context): record["messageId"]
+            for record in records
+        }
+        for future in as_completed(futures):
+            message_id = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Record {message_id} failed: {str(e)}")
+                failures.append({"itemIdentifier": message_id})
+    
+    print(f"Batch complete: {len(records) - len(failures)} succeeded, {len(failures)} failed")
+    
+    return {"batchItemFailures": failures}
+
+
+def handle_invocation(event: dict, context: Any) -> dict:
+    """Handle an SQS batch (batch mode) or a single EventBridge event."""
+    if "Records" in event:
+        return handle_batch(event["Records"], context)
+    
+    return handle_event(event, context)
+
+
+def lambda_handler(event: dict, context: Any) -> dict:
+    """
+    Main Lambda handler.
+    
+    Accepts either a single EventBridge event (see handle_event) or, in
+    batch mode, an SQS event whose records each carry an EventBridge event.
+    A sampled fraction of invocations is profiled (see profiling.py).
+    """
+    try:
+        if PROFILING_SAMPLE_RATE > 0:
+            import profiling
+            
+            with profiling.profiled(context, lambda: get_client("s3")):
+                return handle_invocation(event, context)
+        
+        return handle_invocation(event, context)
+    finally:
+        ratelimit.emit_metrics()
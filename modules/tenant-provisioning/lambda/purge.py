@@ -0,0 +1,209 @@
+"""
+Bucket Purge Engine
+
+Removes every object version and delete marker from a bucket so the bucket
+itself can be deleted. Listing runs in the calling thread while a worker pool
+issues delete_objects calls in full 1000-key chunks, so listing and deleting
+overlap and several deletes are in flight at once.
+
+delete_objects is called with Quiet mode, which only reports the keys that
+could not be deleted. Those per-key errors are retried with backoff instead
+of being silently ignored.
+
+A purge can be bounded by the invocation deadline. When the remaining time
+drops below PURGE_RESERVE_MS it stops at a page boundary, waits for the
+deletes already queued and returns a checkpoint holding the listing markers.
+Passing that checkpoint to a later purge_bucket call resumes from there.
+"""
+
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable
+
+PURGE_WORKERS = int(os.environ.get("PURGE_WORKERS", "8"))
+PURGE_MAX_ATTEMPTS = int(os.environ.get("PURGE_MAX_ATTEMPTS", "5"))
+PURGE_RESERVE_MS = int(os.environ.get("PURGE_RESERVE_MS", "15000"))
+
+# delete_objects accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+
+
+class PurgeError(Exception):
+    """Raised when some object versions could not be deleted."""
+
+    def __init__(self, bucket_name: str, errors: list):
+        self.bucket_name = bucket_name
+        self.errors = errors
+        sample = ", ".join(
+            f"{e['Key']} ({e.get('Code', 'Unknown')})" for e in errors[:5]
+        )
+        super().__init__(
+            f"Failed to delete {len(errors)} objects/versions from {bucket_name}: {sample}"
+        )
+
+
+def delete_chunk(s3: Any, bucket_name: str, objects: list) -> int:
+    """
+    Delete up to 1000 object versions, retrying keys reported in Errors.
+
+    Returns the number of versions deleted and raises PurgeError with the
+    remaining per-key errors once PURGE_MAX_ATTEMPTS is exhausted.
+    """
+    remaining = objects
+    deleted = 0
+
+    for attempt in range(1, PURGE_MAX_ATTEMPTS + 1):
+        response = s3.delete_objects(
+            Bucket=bucket_name,
+            Delete={"Objects": remaining, "Quiet": True}
+        )
+        errors = response.get("Errors", [])
+        deleted += len(remaining) - len(errors)
+
+        if not errors:
+            return deleted
+
+        if attempt == PURGE_MAX_ATTEMPTS:
+            raise PurgeError(bucket_name, errors)
+
+        print(f"Retrying {len(errors)} objects/versions (attempt {attempt})")
+        failed = {(e["Key"], e.get("VersionId")) for e in errors}
+        remaining = [o for o in remaining if (o["Key"], o.get("VersionId")) in failed]
+        time.sleep(random.uniform(0, min(2.0, 0.1 * 2 ** attempt)))
+
+    return deleted
+
+
+def iter_version_pages(s3: Any, bucket_name: str, key_marker: str = "", version_id_marker: str = ""):
+    """
+    Yield (entries, markers) for each list_object_versions page.
+
+    entries are delete_objects entries for every version and delete marker
+    on the page; markers are the listing markers of the next page, or None
+    after the last page.
+    """
+    while True:
+        params = {"Bucket": bucket_name}
+        if key_marker:
+            params["KeyMarker"] = key_marker
+        if version_id_marker:
+            params["VersionIdMarker"] = version_id_marker
+
+        page = s3.list_object_versions(**params)
+
+        entries = []
+        for version in page.get("Versions", []):
+            entries.append({"Key": version["Key"], "VersionId": version["VersionId"]})
+
+        for marker in page.get("DeleteMarkers", []):
+            entries.append({"Key": marker["Key"], "VersionId": marker["VersionId"]})
+
+        if not page.get("IsTruncated"):
+            yield entries, None
+            return
+
+        key_marker = page.get("NextKeyMarker", "")
+        version_id_marker = page.get("NextVersionIdMarker", "")
+        yield entries, {"key_marker": key_marker, "version_id_marker": version_id_marker}
+
+
+def purge_bucket(
+    s3: Any,
+    bucket_name: str,
+    workers: int = PURGE_WORKERS,
+    checkpoint: dict | None = None,
+    remaining_ms: Callable[[], int] | None = None,
+) -> dict:
+    """
+    Delete all object versions and delete markers from a bucket.
+
+    At most two chunks per worker are queued at any time, which bounds memory
+    for buckets with millions of versions. With remaining_ms (typically
+    context.get_remaining_time_in_millis) the purge stops before the deadline,
+    always after at least one page so every run makes progress.
+
+    Returns the number of versions deleted in this run, the elapsed time,
+    the throughput in objects/sec, whether the bucket is now empty and, if
+    not, the checkpoint to resume from. The checkpoint also carries the
+    running totals across runs.
+    """
+    checkpoint = checkpoint or {}
+    started = time.monotonic()
+    deleted = 0
+    errors = []
+    next_markers = None
+
+    def collect(done: set) -> None:
+        nonlocal deleted
+        for future in done:
+            try:
+                count = future.result()
+            except PurgeError as e:
+                errors.extend(e.errors)
+                continue
+            deleted += count
+            print(f"Deleted {count} objects/versions")
+
+    markers = (checkpoint.get("key_marker", ""), checkpoint.get("version_id_marker", ""))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            in_flight = set()
+            chunk = []
+
+            for entries, next_markers in iter_version_pages(s3, bucket_name, *markers):
+                for entry in entries:
+                    chunk.append(entry)
+                    if len(chunk) < DELETE_BATCH_SIZE:
+                        continue
+
+                    if len(in_flight) >= workers * 2:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    in_flight.add(pool.submit(delete_chunk, s3, bucket_name, chunk))
+                    chunk = []
+
+                if next_markers and remaining_ms and remaining_ms() < PURGE_RESERVE_MS:
+                    print(f"Stopping purge before deadline at key {next_markers['key_marker']}")
+                    break
+
+            if chunk:
+                in_flight.add(pool.submit(delete_chunk, s3, bucket_name, chunk))
+
+            done, _ = wait(in_flight)
+            collect(done)
+
+            # A resumed listing only covers keys after the checkpoint. Once it
+            # reaches the end, sweep once from the start to catch versions
+            # that straddled the checkpoint; everything else is already gone.
+            if next_markers or markers == ("", "") or errors:
+                break
+            markers = ("", "")
+            print("Sweeping from the start of the bucket")
+
+    elapsed = time.monotonic() - started
+    rate = deleted / elapsed if elapsed > 0 else 0.0
+    print(f"Purged {deleted} objects/versions in {elapsed:.2f}s ({rate:.0f} objects/sec)")
+
+    if errors:
+        raise PurgeError(bucket_name, errors)
+
+    result = {
+        "deleted": deleted,
+        "seconds": round(elapsed, 3),
+        "objects_per_second": round(rate, 1),
+        "complete": next_markers is None,
+        "total_deleted": checkpoint.get("deleted", 0) + deleted,
+        "runs": checkpoint.get("runs", 0) + 1
+    }
+
+    if next_markers:
+        result["checkpoint"] = {
+            **next_markers,
+            "deleted": result["total_deleted"],
+            "runs": result["runs"]
+        }
+
+    return result
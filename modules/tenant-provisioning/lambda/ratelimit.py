@@ -0,0 +1,232 @@
+"""
+Adaptive Rate Limiting for S3 Bucket-Level Calls
+
+S3 throttles the bucket-level APIs (CreateBucket, PutBucket*, DeleteObjects
+and friends) with SlowDown. When many events are handled at once, every call
+retrying on its own schedule turns a burst into a retry storm. Instead, every
+attempt of these calls, botocore's retries included, takes a token from a
+bucket shared by all threads of the container. There is one bucket per API
+family (see operation_family), since S3 limits the families separately.
+
+A family is not paced until S3 first throttles it. The rate then starts
+at DECREASE_FACTOR (70%) of the rate calls were being sent at, and keeps
+adapting: a throttle response cuts it to 70% again, at most once per
+DECREASE_INTERVAL so a wave of throttles from requests already in flight
+counts once, and every other response wins back a small step. A burst
+therefore settles near the highest rate S3 sustains instead of retrying
+blindly.
+
+attach() hooks the limiter into a boto3 client's event system, so any code
+path sharing that client is paced: creation, teardown, batches, the fleet
+audit and the pool refill. stats() returns the counters per family, and
+emit_metrics() reports them as metrics.
+
+S3_RATE_LIMITS optionally caps families at a fixed rate (requests per
+second), paced from the first call, e.g. "bucket=10,delete_objects=50".
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any
+
+import metrics
+
+S3_RATE_LIMIT_ENABLED = os.environ.get("S3_RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+API_FAMILIES = ("bucket", "bucket_config", "bucket_read", "delete_objects")
+
+# Error codes S3 (and other AWS APIs) answer when a caller is too fast
+THROTTLE_CODES = {
+    "SlowDown", "Throttling", "ThrottlingException", "ThrottledException",
+    "RequestLimitExceeded", "RequestThrottled", "TooManyRequestsException",
+}
+
+# The rate never drops below this, in requests per second
+MIN_RATE = 0.5
+
+# Throttles closer together than this lower the rate once
+DECREASE_INTERVAL = 1.0
+
+# Factor applied to the rate on throttle, and requests per second won back
+# per successful call (so the rate grows by 5% per second of success)
+DECREASE_FACTOR = 0.7
+INCREASE_STEP = 0.05
+
+
+def parse_rates(value: str) -> dict:
+    """Fixed ceilings from "family=rate,..."; families not listed have none."""
+    rates = dict.fromkeys(API_FAMILIES)
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        family, _, rate = item.partition("=")
+        if family not in rates:
+            raise ValueError(f"Unknown S3 API family in S3_RATE_LIMITS: {family}")
+        rates[family] = float(rate)
+    return rates
+
+
+def operation_family(operation: str) -> str | None:
+    """The API family of an S3 operation, or None for calls that are not limited."""
+    if operation in ("CreateBucket", "DeleteBucket"):
+        return "bucket"
+    if operation == "DeleteObjects":
+        return "delete_objects"
+    if operation.startswith(("PutBucket", "DeleteBucket")) or operation in ("PutPublicAccessBlock", "DeletePublicAccessBlock"):
+        return "bucket_config"
+    if operation.startswith("GetBucket") or operation in ("GetPublicAccessBlock", "HeadBucket", "ListBuckets"):
+        return "bucket_read"
+    return None
+
+
+class AdaptiveTokenBucket:
+    """
+    Token bucket whose rate adapts to throttle responses.
+
+    rate is None while the family is unpaced. Tokens are reserved rather
+    than waited for under the lock: acquire() takes a token even if it
+    drives the balance negative and sleeps for the debt, so callers are
+    served in arrival order.
+    """
+
+    def __init__(self, family: str, ceiling: float | None = None):
+        self.family = family
+        self.ceiling = ceiling
+        self.rate = ceiling
+        self.tokens = ceiling or 0.0
+        self.updated = time.monotonic()
+        self.decreased = 0.0
+        self.sent = deque()
+        self.requests = 0
+        self.throttles = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        # At most one second worth of tokens builds up while idle
+        self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> float:
+        """Take a token, sleeping until it is due. Returns the seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            self.requests += 1
+            if self.rate is None:
+                # Unpaced: remember send times to measure the rate on first throttle
+                self.sent.append(now)
+                while self.sent[0] < now - DECREASE_INTERVAL:
+                    self.sent.popleft()
+                return 0.0
+
+            self._refill(now)
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited += wait
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def throttled(self) -> None:
+        """Record a throttle response and slow down."""
+        with self._lock:
+            now = time.monotonic()
+            self.throttles += 1
+            if now - self.decreased < DECREASE_INTERVAL:
+                return
+
+            if self.rate is None:
+                self.rate = max(MIN_RATE, len(self.sent) / DECREASE_INTERVAL * DECREASE_FACTOR)
+                self.sent.clear()
+                self.tokens = 0.0
+                self.updated = now
+            else:
+                self._refill(now)
+                self.rate = max(MIN_RATE, self.rate * DECREASE_FACTOR)
+                self.tokens = min(self.tokens, 0.0)
+            self.decreased = now
+
+    def succeeded(self) -> None:
+        """Record a response that was not throttled and speed up a little."""
+        with self._lock:
+            if self.rate is not None and self.rate != self.ceiling:
+                self._refill(time.monotonic())
+                self.rate = min(self.ceiling or float("inf"), self.rate + INCREASE_STEP)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": round(self.rate, 2) if self.rate is not None else None,
+                "ceiling": self.ceiling,
+                "requests": self.requests,
+                "throttles": self.throttles,
+                "waited_seconds": round(self.waited, 3),
+            }
+
+
+# Limiters per family, shared by every client and thread of the container
+limiters = {
+    family: AdaptiveTokenBucket(family, rate)
+    for family, rate in parse_rates(os.environ.get("S3_RATE_LIMITS", "")).items()
+}
+
+# Counters already reported by emit_metrics()
+_reported = {}
+_reported_lock = threading.Lock()
+
+
+def _limiter(event_name: str) -> AdaptiveTokenBucket | None:
+    # Event names end in the operation, e.g. before-send.s3.PutBucketPolicy
+    return limiters.get(operation_family(event_name.rsplit(".", 1)[-1]))
+
+
+def _before_send(event_name: str, **kwargs: Any) -> None:
+    limiter = _limiter(event_name)
+    if limiter:
+        limiter.acquire()
+    # Returning None lets botocore send the request
+
+
+def _after_attempt(event_name: str, response: Any = None, **kwargs: Any) -> None:
+    limiter = _limiter(event_name)
+    if limiter is None or response is None:
+        return
+
+    parsed = response[1]
+    code = parsed.get("Error", {}).get("Code")
+    status = parsed.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    if code in THROTTLE_CODES or status in (429, 503):
+        limiter.throttled()
+    else:
+        limiter.succeeded()
+    # Returning None leaves the retry decision to botocore
+
+
+def attach(client: Any) -> Any:
+    """Pace a client's S3 calls through the shared limiters. Returns the client."""
+    if S3_RATE_LIMIT_ENABLED:
+        client.meta.events.register("before-send.s3", _before_send, unique_id="tenant-rate-limit-send")
+        client.meta.events.register("needs-retry.s3", _after_attempt, unique_id="tenant-rate-limit-observe")
+    return client
+
+
+def stats() -> dict:
+    """Current rate and counters of every API family."""
+    return {family: limiter.stats() for family, limiter in limiters.items()}
+
+
+def emit_metrics() -> None:
+    """Emit requests, throttles and wait time per family since the last call."""
+    with _reported_lock:
+        for family, current in stats().items():
+            previous = _reported.get(family, {"requests": 0, "throttles": 0, "waited_seconds": 0.0})
+            requests = current["requests"] - previous["requests"]
+            if requests:
+                metrics.emit(f"s3_rate_limit_{family}", {
+                    "Requests": (requests, "Count"),
+                    "Throttles": (current["throttles"] - previous["throttles"], "Count"),
+                    "WaitTime": (round((current["waited_seconds"] - previous["waited_seconds"]) * 1000, 1), "Milliseconds"),
+                    **({"Rate": (current["rate"], "Count/Second")} if current["rate"] is not None else {}),
+                })
+            _reported[family] = current
@@ -0,0 +1,158 @@
+"""
+Tenant Bucket Pool Refill
+
+Keeps BUCKET_POOL_SIZE pre-configured, unassigned buckets ready for
+TenantCreated to claim (see pool.py). Runs on a schedule; each run tops the
+pool up to its target size, creating buckets in parallel. A bucket is only
+offered to the pool once its whole configuration has been applied.
+
+Claims interrupted part-way (claim lock written but the claim never
+completed) are repaired: if the tenant assignment points at the bucket the
+claim is completed, otherwise the bucket is released back to the pool.
+
+Usable as a Lambda (handler refill.lambda_handler) or from the command line:
+
+    STATE_BUCKET=... BUCKET_POOL_SIZE=20 python refill.py
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import metrics
+import pool
+import ratelimit
+from provisioner import get_client, make_bucket, pool_config
+
+POOL_REFILL_WORKERS = int(os.environ.get("POOL_REFILL_WORKERS", "4"))
+
+# Claim locks older than this without a completed claim are repaired
+POOL_CLAIM_TIMEOUT_SECONDS = 300
+
+# Stop starting new buckets when less than this is left in the invocation
+POOL_RESERVE_MS = 60000
+
+
+def create_pool_bucket() -> str:
+    """Create and configure one pool bucket, then offer it to the pool."""
+    metrics.set_action("refill")
+    bucket_name = pool.new_bucket_name()
+    s3 = get_client("s3")
+
+    try:
+        make_bucket(bucket_name, pool_config(bucket_name))
+    except Exception:
+        # Never leave a half-configured bucket behind; it is still empty
+        try:
+            s3.delete_bucket(Bucket=bucket_name)
+        except Exception as e:
+            print(f"Could not remove incomplete pool bucket {bucket_name}: {str(e)}")
+        raise
+
+    pool.add_available(s3, bucket_name)
+    return bucket_name
+
+
+def repair_stale_claims() -> int:
+    """Complete or release claims that stopped part-way. Returns the number repaired."""
+    s3 = get_client("s3")
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=POOL_CLAIM_TIMEOUT_SECONDS)
+    available = set(pool.available_buckets(s3))
+
+    repaired = 0
+    for bucket_name, claimed_at in pool.list_keys(s3, pool.CLAIMED_PREFIX).items():
+        if bucket_name not in available or claimed_at > cutoff:
+            continue
+
+        tenant_id = pool.read(s3, f"{pool.CLAIMED_PREFIX}{bucket_name}")
+        if tenant_id and pool.assigned_bucket(s3, tenant_id) == bucket_name:
+            s3.delete_object(Bucket=pool.STATE_BUCKET, Key=f"{pool.AVAILABLE_PREFIX}{bucket_name}")
+            print(f"Completed interrupted claim of {bucket_name} by tenant {tenant_id}")
+        else:
+            s3.delete_object(Bucket=pool.STATE_BUCKET, Key=f"{pool.CLAIMED_PREFIX}{bucket_name}")
+            print(f"Released abandoned claim of {bucket_name}")
+        repaired += 1
+
+    return repaired
+
+
+def refill_pool(
+    size: int = pool.BUCKET_POOL_SIZE,
+    workers: int = POOL_REFILL_WORKERS,
+    context: Any = None,
+) -> dict:
+    """
+    Top the pool up to size buckets and return a report.
+
+    Inside Lambda, no new bucket is started once the invocation nears its
+    deadline; the next scheduled run creates the rest.
+    """
+    if not pool.STATE_BUCKET:
+        raise ValueError("STATE_BUCKET not configured")
+
+    started = time.monotonic()
+    repaired = repair_stale_claims()
+    available = len(pool.available_buckets(get_client("s3")))
+    missing = max(0, size - available)
+    print(f"Bucket pool has {available}/{size} buckets, creating {missing} with {workers} workers")
+
+    report = {"size": size, "available_before": available, "repaired": repaired, "created": [], "errors": []}
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = []
+        for _ in range(missing):
+            if context and context.get_remaining_time_in_millis() < POOL_RESERVE_MS:
+                break
+            futures.append(metrics.submit(executor, create_pool_bucket))
+
+        for future in as_completed(futures):
+            try:
+                report["created"].append(future.result())
+            except Exception as e:
+                print(f"Pool bucket creation failed: {str(e)}")
+                report["errors"].append(str(e))
+
+    report["available"] = available + len(report["created"])
+    report["seconds"] = round(time.monotonic() - started, 1)
+    report["s3_rate_limits"] = ratelimit.stats()
+    ratelimit.emit_metrics()
+    print(
+        f"Pool refill complete in {report['seconds']}s: {len(report['created'])} created, "
+        f"{len(report['errors'])} errors, {report['available']}/{size} available"
+    )
+
+    return report
+
+
+def lambda_handler(event: dict, context: Any) -> dict:
+    """
+    Lambda entry point, invoked on a schedule.
+
+    Event structure (all fields optional):
+    {
+        "size": 20,
+        "workers": 4
+    }
+    """
+    return refill_pool(
+        size=int(event.get("size", pool.BUCKET_POOL_SIZE)),
+        workers=int(event.get("workers", POOL_REFILL_WORKERS)),
+        context=context,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Top up the pre-warmed tenant bucket pool")
+    parser.add_argument("--size", type=int, default=pool.BUCKET_POOL_SIZE, help="target number of available buckets")
+    parser.add_argument("--workers", type=int, default=POOL_REFILL_WORKERS, help="buckets created in parallel")
+    args = parser.parse_args()
+
+    print(json.dumps(refill_pool(size=args.size, workers=args.workers), indent=2))
+
+
+if __name__ == "__main__":
+    main()
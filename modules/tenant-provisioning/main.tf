@@ -1,8 +1,19 @@
 locals {
   tenant_bucket_prefix = var.tenant_bucket_prefix != "" ? var.tenant_bucket_prefix : "${var.project_name}-tenant-"
   function_name        = "${var.project_name}-${var.environment}-tenant-provisioner"
+  fleet_function_name  = "${var.project_name}-${var.environment}-tenant-fleet-audit"
+  refill_function_name = "${var.project_name}-${var.environment}-tenant-pool-refill"
+  outbox_function_name = "${var.project_name}-${var.environment}-tenant-callback-outbox"
+  pool_enabled         = var.bucket_pool_size > 0
+  profiles_to_s3       = var.profiling_sample_rate > 0 && var.profiling_output == "s3"
+  state_bucket_enabled = local.pool_enabled || var.idempotency_backend == "s3" || local.profiles_to_s3
+  state_bucket_name    = "${local.function_name}-state"
+  export_bucket_name   = "${local.function_name}-exports"
+  s3_rate_limits       = join(",", [for family, rate in var.s3_rate_limits : "${family}=${rate}"])
 }
 
+data "aws_caller_identity" "current" {}
+
 # ============================================================================
 # EventBridge Event Bus (custom bus for application events)
 # ============================================================================
@@ -21,12 +32,9 @@ resource "aws_cloudwatch_event_bus" "app" {
 
 data "archive_file" "provisioner_lambda" {
   type        = "zip"
+  source_dir  = "${path.module}/lambda"
   output_path = "${path.module}/provisioner_lambda.zip"
-
-  source {
-    content  = file("${path.module}/lambda/provisioner.py")
-    filename = "provisioner.py"
-  }
+  excludes    = ["__pycache__"]
 }
 
 resource "aws_lambda_function" "provisioner" {
@@ -42,11 +50,32 @@ resource "aws_lambda_function" "provisioner" {
 
   environment {
     variables = {
-      TENANT_BUCKET_PREFIX    = local.tenant_bucket_prefix
-      ENVIRONMENT             = var.environment
-      REGION                  = var.region
-      API_CALLBACK_URL        = var.api_callback_url
-      API_CALLBACK_SECRET_ARN = var.api_callback_secret_arn
+      TENANT_BUCKET_PREFIX      = local.tenant_bucket_prefix
+      ENVIRONMENT               = var.environment
+      REGION                    = var.region
+      ALLOWED_REGIONS           = join(",", distinct(concat([var.region], var.allowed_regions)))
+      API_CALLBACK_URL          = var.api_callback_url
+      API_CALLBACK_SECRET_ARN   = var.api_callback_secret_arn
+      BATCH_CONCURRENCY         = var.batch_concurrency
+      API_TOKEN_TTL_SECONDS     = var.api_token_ttl_seconds
+      LOG_EVENT_SAMPLE_RATE     = var.log_event_sample_rate
+      STATE_BUCKET              = local.state_bucket_enabled ? aws_s3_bucket.provisioner_state[0].bucket : ""
+      BUCKET_POOL_SIZE          = var.bucket_pool_size
+      IDEMPOTENCY_BACKEND       = var.idempotency_backend
+      IDEMPOTENCY_TTL_SECONDS   = var.idempotency_ttl_seconds
+      CALLBACK_OUTBOX_URL       = var.callback_outbox_enabled ? aws_sqs_queue.callback_outbox[0].url : ""
+      S3_RATE_LIMIT_ENABLED     = var.s3_rate_limit_enabled
+      S3_RATE_LIMITS            = local.s3_rate_limits
+      PROFILING_SAMPLE_RATE     = var.profiling_sample_rate
+      PROFILING_OUTPUT          = var.profiling_output
+      STORAGE_PROFILE           = var.storage_profile
+      TIER_STORAGE_PROFILES     = jsonencode(var.tier_storage_profiles)
+      KMS_ENCRYPTION            = var.kms_encryption
+      KMS_KEY_ARNS              = jsonencode(var.kms_key_arns)
+      ACCOUNT_ID                = data.aws_caller_identity.current.account_id
+      EVENTBRIDGE_NOTIFICATIONS = var.eventbridge_notifications
+      EXPORT_BUCKET             = var.tenant_export_enabled ? aws_s3_bucket.tenant_exports[0].bucket : ""
+      EXPORT_ON_DELETE          = var.tenant_export_enabled && var.tenant_export_on_delete
     }
   }
 
@@ -62,6 +91,49 @@ resource "aws_cloudwatch_log_group" "provisioner_lambda" {
   tags = var.tags
 }
 
+# Fleet audit: checks (and optionally fixes) every existing tenant bucket
+# against the provisioner's desired configuration. Invoke manually with
+# {"apply": true} to roll a configuration change out to all tenants.
+resource "aws_lambda_function" "fleet_audit" {
+  function_name = local.fleet_function_name
+  role          = aws_iam_role.provisioner_lambda.arn
+  runtime       = "python3.11"
+  handler       = "fleet.lambda_handler"
+  filename      = data.archive_file.provisioner_lambda.output_path
+  timeout       = 900
+  memory_size   = 512
+
+  source_code_hash = data.archive_file.provisioner_lambda.output_base64sha256
+
+  environment {
+    variables = {
+      TENANT_BUCKET_PREFIX      = local.tenant_bucket_prefix
+      ENVIRONMENT               = var.environment
+      REGION                    = var.region
+      FLEET_WORKERS             = var.fleet_workers
+      STATE_BUCKET              = local.state_bucket_enabled ? aws_s3_bucket.provisioner_state[0].bucket : ""
+      S3_RATE_LIMIT_ENABLED     = var.s3_rate_limit_enabled
+      S3_RATE_LIMITS            = local.s3_rate_limits
+      STORAGE_PROFILE           = var.storage_profile
+      KMS_ENCRYPTION            = var.kms_encryption
+      KMS_KEY_ARNS              = jsonencode(var.kms_key_arns)
+      ACCOUNT_ID                = data.aws_caller_identity.current.account_id
+      EVENTBRIDGE_NOTIFICATIONS = var.eventbridge_notifications
+    }
+  }
+
+  tags = merge(var.tags, {
+    Name = local.fleet_function_name
+  })
+}
+
+resource "aws_cloudwatch_log_group" "fleet_audit_lambda" {
+  name              = "/aws/lambda/${local.fleet_function_name}"
+  retention_in_days = 30
+
+  tags = var.tags
+}
+
 # ============================================================================
 # IAM Role for Provisioner Lambda
 # ============================================================================
@@ -96,7 +168,18 @@ resource "aws_iam_role_policy" "provisioner_lambda" {
           "logs:CreateLogStream",
           "logs:PutLogEvents"
         ],
-        Resource = "arn:aws:logs:${var.region}:*:log-group:/aws/lambda/${local.function_name}:*"
+        Resource = [
+          "arn:aws:logs:${var.region}:*:log-group:/aws/lambda/${local.function_name}:*",
+          "arn:aws:logs:${var.region}:*:log-group:/aws/lambda/${local.fleet_function_name}:*",
+          "arn:aws:logs:${var.region}:*:log-group:/aws/lambda/${local.refill_function_name}:*",
+          "arn:aws:logs:${var.region}:*:log-group:/aws/lambda/${local.outbox_function_name}:*"
+        ]
+      },
+      # Tenant bucket discovery (fleet audit)
+      {
+        Effect   = "Allow",
+        Action   = ["s3:ListAllMyBuckets"],
+        Resource = "*"
       },
       # S3 Bucket Creation and Configuration
       {
@@ -110,11 +193,27 @@ resource "aws_iam_role_policy" "provisioner_lambda" {
           "s3:PutLifecycleConfiguration",
           "s3:PutBucketNotification",
           "s3:PutBucketTagging",
+          "s3:PutBucketCORS",
           "s3:GetBucketLocation",
           "s3:HeadBucket"
         ],
         Resource = "arn:aws:s3:::${local.tenant_bucket_prefix}*"
       },
+      # S3 Bucket Configuration Reads (for reconciliation)
+      {
+        Effect = "Allow",
+        Action = [
+          "s3:GetBucketVersioning",
+          "s3:GetEncryptionConfiguration",
+          "s3:GetBucketPublicAccessBlock",
+          "s3:GetLifecycleConfiguration",
+          "s3:GetBucketPolicy",
+          "s3:GetBucketTagging",
+          "s3:GetBucketCORS",
+          "s3:GetBucketNotification"
+        ],
+        Resource = "arn:aws:s3:::${local.tenant_bucket_prefix}*"
+      },
       # S3 Bucket Deletion (for tenant deletion)
       {
         Effect = "Allow",
@@ -130,6 +229,41 @@ resource "aws_iam_role_policy" "provisioner_lambda" {
           "arn:aws:s3:::${local.tenant_bucket_prefix}*/*"
         ]
       },
+      # Server-side object copies (TenantMigrated)
+      {
+        Effect = "Allow",
+        Action = [
+          "s3:GetObject",
+          "s3:GetObjectTagging",
+          "s3:PutObject",
+          "s3:PutObjectTagging",
+          "s3:AbortMultipartUpload"
+        ],
+        Resource = "arn:aws:s3:::${local.tenant_bucket_prefix}*/*"
+      },
+      # Copies of objects in SSE-KMS encrypted tenant buckets
+      {
+        Effect = "Allow",
+        Action = [
+          "kms:Decrypt",
+          "kms:GenerateDataKey"
+        ],
+        Resource = "*",
+        Condition = {
+          StringLike = {
+            "kms:ViaService"                   = "s3.*.amazonaws.com"
+            "kms:EncryptionContext:aws:s3:arn" = "arn:aws:s3:::${local.tenant_bucket_prefix}*"
+          }
+        }
+      },
+      # Self-invocation to continue long-running tenant teardowns and migrations
+      {
+        Effect = "Allow",
+        Action = [
+          "lambda:InvokeFunction"
+        ],
+        Resource = aws_lambda_function.provisioner.arn
+      },
       # Secrets Manager for API callback token
       {
         Effect = "Allow",
@@ -142,6 +276,56 @@ resource "aws_iam_role_policy" "provisioner_lambda" {
   })
 }
 
+# Tenant KMS keys (KMS_ENCRYPTION=per_tenant). Keys are created tagged
+# ManagedBy=tenant-provisioner-lambda, and only such keys can be managed.
+resource "aws_iam_role_policy" "provisioner_lambda_kms" {
+  count = var.kms_encryption == "per_tenant" ? 1 : 0
+
+  name = "${var.project_name}-${var.environment}-tenant-provisioner-kms-policy"
+  role = aws_iam_role.provisioner_lambda.id
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Effect = "Allow",
+        Action = [
+          "kms:CreateKey",
+          "kms:TagResource"
+        ],
+        Resource = "*",
+        Condition = {
+          StringEquals = {
+            "aws:RequestTag/ManagedBy" = "tenant-provisioner-lambda"
+          }
+        }
+      },
+      {
+        Effect = "Allow",
+        Action = [
+          "kms:DescribeKey",
+          "kms:CreateAlias",
+          "kms:EnableKey",
+          "kms:EnableKeyRotation",
+          "kms:ScheduleKeyDeletion",
+          "kms:CancelKeyDeletion"
+        ],
+        Resource = "arn:aws:kms:*:${data.aws_caller_identity.current.account_id}:key/*",
+        Condition = {
+          StringEquals = {
+            "aws:ResourceTag/ManagedBy" = "tenant-provisioner-lambda"
+          }
+        }
+      },
+      {
+        Effect   = "Allow",
+        Action   = ["kms:CreateAlias"],
+        Resource = "arn:aws:kms:*:${data.aws_caller_identity.current.account_id}:alias/${local.tenant_bucket_prefix}*"
+      }
+    ]
+  })
+}
+
 # ============================================================================
 # EventBridge Rules
 # ============================================================================
@@ -164,7 +348,7 @@ resource "aws_cloudwatch_event_target" "tenant_created" {
   rule           = aws_cloudwatch_event_rule.tenant_created.name
   event_bus_name = aws_cloudwatch_event_bus.app.name
   target_id      = "provisioner-lambda"
-  arn            = aws_lambda_function.provisioner.arn
+  arn            = var.batch_mode_enabled ? aws_sqs_queue.provisioning[0].arn : aws_lambda_function.provisioner.arn
 }
 
 resource "aws_lambda_permission" "tenant_created" {
@@ -193,7 +377,7 @@ resource "aws_cloudwatch_event_target" "tenant_deleted" {
   rule           = aws_cloudwatch_event_rule.tenant_deleted.name
   event_bus_name = aws_cloudwatch_event_bus.app.name
   target_id      = "provisioner-lambda"
-  arn            = aws_lambda_function.provisioner.arn
+  arn            = var.batch_mode_enabled ? aws_sqs_queue.provisioning[0].arn : aws_lambda_function.provisioner.arn
 }
 
 resource "aws_lambda_permission" "tenant_deleted" {
@@ -204,6 +388,480 @@ resource "aws_lambda_permission" "tenant_deleted" {
   source_arn    = aws_cloudwatch_event_rule.tenant_deleted.arn
 }
 
+# Rule for TenantMigrated event
+resource "aws_cloudwatch_event_rule" "tenant_migrated" {
+  name           = "${var.project_name}-${var.environment}-tenant-migrated"
+  description    = "Trigger object copy when a tenant moves to a new id or environment"
+  event_bus_name = aws_cloudwatch_event_bus.app.name
+
+  event_pattern = jsonencode({
+    source      = ["${var.project_name}.hq"],
+    detail-type = ["TenantMigrated"]
+  })
+
+  tags = var.tags
+}
+
+resource "aws_cloudwatch_event_target" "tenant_migrated" {
+  rule           = aws_cloudwatch_event_rule.tenant_migrated.name
+  event_bus_name = aws_cloudwatch_event_bus.app.name
+  target_id      = "provisioner-lambda"
+  arn            = var.batch_mode_enabled ? aws_sqs_queue.provisioning[0].arn : aws_lambda_function.provisioner.arn
+}
+
+resource "aws_lambda_permission" "tenant_migrated" {
+  statement_id  = "AllowExecutionFromEventBridgeTenantMigrated"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.provisioner.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.tenant_migrated.arn
+}
+
+# ============================================================================
+# Batch Mode: SQS Queue between EventBridge and the Lambda
+# ============================================================================
+
+resource "aws_sqs_queue" "provisioning_dlq" {
+  count = var.batch_mode_enabled ? 1 : 0
+
+  name                      = "${local.function_name}-dlq"
+  message_retention_seconds = 1209600
+
+  tags = var.tags
+}
+
+resource "aws_sqs_queue" "provisioning" {
+  count = var.batch_mode_enabled ? 1 : 0
+
+  name = "${local.function_name}-queue"
+
+  # Must be at least six times the Lambda timeout
+  visibility_timeout_seconds = 360
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.provisioning_dlq[0].arn
+    maxReceiveCount     = 5
+  })
+
+  tags = var.tags
+}
+
+resource "aws_sqs_queue_policy" "provisioning" {
+  count = var.batch_mode_enabled ? 1 : 0
+
+  queue_url = aws_sqs_queue.provisioning[0].id
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Effect    = "Allow",
+      Principal = { Service = "events.amazonaws.com" },
+      Action    = "sqs:SendMessage",
+      Resource  = aws_sqs_queue.provisioning[0].arn,
+      Condition = {
+        ArnEquals = {
+          "aws:SourceArn" = [
+            aws_cloudwatch_event_rule.tenant_created.arn,
+            aws_cloudwatch_event_rule.tenant_deleted.arn,
+            aws_cloudwatch_event_rule.tenant_migrated.arn
+          ]
+        }
+      }
+    }]
+  })
+}
+
+resource "aws_iam_role_policy" "provisioner_lambda_queue" {
+  count = var.batch_mode_enabled ? 1 : 0
+
+  name = "${var.project_name}-${var.environment}-tenant-provisioner-queue-policy"
+  role = aws_iam_role.provisioner_lambda.id
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Effect = "Allow",
+      Action = [
+        "sqs:ReceiveMessage",
+        "sqs:DeleteMessage",
+        "sqs:GetQueueAttributes"
+      ],
+      Resource = aws_sqs_queue.provisioning[0].arn
+    }]
+  })
+}
+
+resource "aws_lambda_event_source_mapping" "provisioning" {
+  count = var.batch_mode_enabled ? 1 : 0
+
+  event_source_arn                   = aws_sqs_queue.provisioning[0].arn
+  function_name                      = aws_lambda_function.provisioner.arn
+  batch_size                         = var.batch_size
+  maximum_batching_window_in_seconds = var.batch_window_seconds
+
+  # Only failed records are returned to the queue
+  function_response_types = ["ReportBatchItemFailures"]
+
+  depends_on = [aws_iam_role_policy.provisioner_lambda_queue]
+}
+
+# ============================================================================
+# Callback Outbox: queued API callbacks, delivered in batches
+# ============================================================================
+
+resource "aws_sqs_queue" "callback_outbox_dlq" {
+  count = var.callback_outbox_enabled ? 1 : 0
+
+  name                      = "${local.function_name}-callback-outbox-dlq"
+  message_retention_seconds = 1209600
+
+  tags = var.tags
+}
+
+resource "aws_sqs_queue" "callback_outbox" {
+  count = var.callback_outbox_enabled ? 1 : 0
+
+  name                      = "${local.function_name}-callback-outbox"
+  message_retention_seconds = 1209600
+
+  # Must be at least six times the flusher timeout
+  visibility_timeout_seconds = 360
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.callback_outbox_dlq[0].arn
+    maxReceiveCount     = 10
+  })
+
+  tags = var.tags
+}
+
+resource "aws_iam_role_policy" "provisioner_lambda_outbox" {
+  count = var.callback_outbox_enabled ? 1 : 0
+
+  name = "${var.project_name}-${var.environment}-tenant-provisioner-outbox-policy"
+  role = aws_iam_role.provisioner_lambda.id
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Effect = "Allow",
+      Action = [
+        "sqs:SendMessage",
+        "sqs:ReceiveMessage",
+        "sqs:DeleteMessage",
+        "sqs:GetQueueAttributes"
+      ],
+      Resource = aws_sqs_queue.callback_outbox[0].arn
+    }]
+  })
+}
+
+resource "aws_lambda_function" "callback_outbox" {
+  count = var.callback_outbox_enabled ? 1 : 0
+
+  function_name = local.outbox_function_name
+  role          = aws_iam_role.provisioner_lambda.arn
+  runtime       = "python3.11"
+  handler       = "outbox.lambda_handler"
+  filename      = data.archive_file.provisioner_lambda.output_path
+  timeout       = 60
+  memory_size   = 256
+
+  source_code_hash = data.archive_file.provisioner_lambda.output_base64sha256
+
+  environment {
+    variables = {
+      ENVIRONMENT             = var.environment
+      API_CALLBACK_URL        = var.api_callback_url
+      API_CALLBACK_SECRET_ARN = var.api_callback_secret_arn
+      API_TOKEN_TTL_SECONDS   = var.api_token_ttl_seconds
+    }
+  }
+
+  tags = merge(var.tags, {
+    Name = local.outbox_function_name
+  })
+}
+
+resource "aws_cloudwatch_log_group" "callback_outbox_lambda" {
+  count = var.callback_outbox_enabled ? 1 : 0
+
+  name              = "/aws/lambda/${local.outbox_function_name}"
+  retention_in_days = 30
+
+  tags = var.tags
+}
+
+resource "aws_lambda_event_source_mapping" "callback_outbox" {
+  count = var.callback_outbox_enabled ? 1 : 0
+
+  event_source_arn                   = aws_sqs_queue.callback_outbox[0].arn
+  function_name                      = aws_lambda_function.callback_outbox[0].arn
+  batch_size                         = var.callback_outbox_batch_size
+  maximum_batching_window_in_seconds = var.callback_outbox_window_seconds
+
+  # Only failed updates are returned to the queue
+  function_response_types = ["ReportBatchItemFailures"]
+
+  depends_on = [aws_iam_role_policy.provisioner_lambda_outbox]
+}
+
+# ============================================================================
+# Provisioner State Bucket (bucket pool registry, idempotency records, profiles)
+# ============================================================================
+
+resource "aws_s3_bucket" "provisioner_state" {
+  count = local.state_bucket_enabled ? 1 : 0
+
+  bucket = local.state_bucket_name
+
+  tags = merge(var.tags, {
+    Name = local.state_bucket_name
+  })
+}
+
+resource "aws_s3_bucket_server_side_encryption_configuration" "provisioner_state" {
+  count = local.state_bucket_enabled ? 1 : 0
+
+  bucket = aws_s3_bucket.provisioner_state[0].id
+
+  rule {
+    apply_server_side_encryption_by_default {
+      sse_algorithm = "AES256"
+    }
+  }
+}
+
+resource "aws_s3_bucket_public_access_block" "provisioner_state" {
+  count = local.state_bucket_enabled ? 1 : 0
+
+  bucket = aws_s3_bucket.provisioner_state[0].id
+
+  block_public_acls       = true
+  block_public_policy     = true
+  ignore_public_acls      = true
+  restrict_public_buckets = true
+}
+
+# Idempotency records are ignored once past their TTL; this removes them.
+# Profiles are kept for profile_retention_days.
+resource "aws_s3_bucket_lifecycle_configuration" "provisioner_state" {
+  count = local.state_bucket_enabled ? 1 : 0
+
+  bucket = aws_s3_bucket.provisioner_state[0].id
+
+  rule {
+    id     = "expire-idempotency-records"
+    status = "Enabled"
+
+    filter {
+      prefix = "idempotency/"
+    }
+
+    expiration {
+      days = ceil(var.idempotency_ttl_seconds / 86400) + 1
+    }
+  }
+
+  rule {
+    id     = "expire-profiles"
+    status = "Enabled"
+
+    filter {
+      prefix = "profiles/"
+    }
+
+    expiration {
+      days = var.profile_retention_days
+    }
+  }
+}
+
+resource "aws_iam_role_policy" "provisioner_lambda_state" {
+  count = local.state_bucket_enabled ? 1 : 0
+
+  name = "${var.project_name}-${var.environment}-tenant-provisioner-state-policy"
+  role = aws_iam_role.provisioner_lambda.id
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Effect = "Allow",
+      Action = [
+        "s3:ListBucket",
+        "s3:GetObject",
+        "s3:PutObject",
+        "s3:DeleteObject"
+      ],
+      Resource = [
+        aws_s3_bucket.provisioner_state[0].arn,
+        "${aws_s3_bucket.provisioner_state[0].arn}/*"
+      ]
+    }]
+  })
+}
+
+# ============================================================================
+# Tenant Exports: archives of departing tenants' objects (TenantDeleted)
+# ============================================================================
+
+resource "aws_s3_bucket" "tenant_exports" {
+  count = var.tenant_export_enabled ? 1 : 0
+
+  bucket = local.export_bucket_name
+
+  tags = merge(var.tags, {
+    Name = local.export_bucket_name
+  })
+}
+
+resource "aws_s3_bucket_server_side_encryption_configuration" "tenant_exports" {
+  count = var.tenant_export_enabled ? 1 : 0
+
+  bucket = aws_s3_bucket.tenant_exports[0].id
+
+  rule {
+    apply_server_side_encryption_by_default {
+      sse_algorithm = "AES256"
+    }
+  }
+}
+
+resource "aws_s3_bucket_public_access_block" "tenant_exports" {
+  count = var.tenant_export_enabled ? 1 : 0
+
+  bucket = aws_s3_bucket.tenant_exports[0].id
+
+  block_public_acls       = true
+  block_public_policy     = true
+  ignore_public_acls      = true
+  restrict_public_buckets = true
+}
+
+# Exports are kept for tenant_export_retention_days. Archive parts of
+# exports that failed midway are cleaned up after a day.
+resource "aws_s3_bucket_lifecycle_configuration" "tenant_exports" {
+  count = var.tenant_export_enabled ? 1 : 0
+
+  bucket = aws_s3_bucket.tenant_exports[0].id
+
+  rule {
+    id     = "expire-exports"
+    status = "Enabled"
+
+    filter {
+      prefix = "exports/"
+    }
+
+    expiration {
+      days = var.tenant_export_retention_days
+    }
+
+    abort_incomplete_multipart_upload {
+      days_after_initiation = 1
+    }
+  }
+}
+
+resource "aws_iam_role_policy" "provisioner_lambda_exports" {
+  count = var.tenant_export_enabled ? 1 : 0
+
+  name = "${var.project_name}-${var.environment}-tenant-provisioner-exports-policy"
+  role = aws_iam_role.provisioner_lambda.id
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Effect = "Allow",
+      Action = [
+        "s3:PutObject",
+        "s3:GetObject",
+        "s3:DeleteObject",
+        "s3:AbortMultipartUpload",
+        "s3:ListMultipartUploadParts"
+      ],
+      Resource = "${aws_s3_bucket.tenant_exports[0].arn}/exports/*"
+    }]
+  })
+}
+
+# ============================================================================
+# Bucket Pool: pre-configured buckets claimed on TenantCreated
+# ============================================================================
+
+# Refill: tops the pool up to bucket_pool_size on a schedule
+resource "aws_lambda_function" "pool_refill" {
+  count = local.pool_enabled ? 1 : 0
+
+  function_name = local.refill_function_name
+  role          = aws_iam_role.provisioner_lambda.arn
+  runtime       = "python3.11"
+  handler       = "refill.lambda_handler"
+  filename      = data.archive_file.provisioner_lambda.output_path
+  timeout       = 900
+  memory_size   = 256
+
+  source_code_hash = data.archive_file.provisioner_lambda.output_base64sha256
+
+  environment {
+    variables = {
+      TENANT_BUCKET_PREFIX      = local.tenant_bucket_prefix
+      ENVIRONMENT               = var.environment
+      REGION                    = var.region
+      STATE_BUCKET              = aws_s3_bucket.provisioner_state[0].bucket
+      BUCKET_POOL_SIZE          = var.bucket_pool_size
+      S3_RATE_LIMIT_ENABLED     = var.s3_rate_limit_enabled
+      S3_RATE_LIMITS            = local.s3_rate_limits
+      STORAGE_PROFILE           = var.storage_profile
+      KMS_ENCRYPTION            = var.kms_encryption
+      KMS_KEY_ARNS              = jsonencode(var.kms_key_arns)
+      ACCOUNT_ID                = data.aws_caller_identity.current.account_id
+      EVENTBRIDGE_NOTIFICATIONS = var.eventbridge_notifications
+    }
+  }
+
+  tags = merge(var.tags, {
+    Name = local.refill_function_name
+  })
+}
+
+resource "aws_cloudwatch_log_group" "pool_refill_lambda" {
+  count = local.pool_enabled ? 1 : 0
+
+  name              = "/aws/lambda/${local.refill_function_name}"
+  retention_in_days = 30
+
+  tags = var.tags
+}
+
+resource "aws_cloudwatch_event_rule" "pool_refill" {
+  count = local.pool_enabled ? 1 : 0
+
+  name                = "${var.project_name}-${var.environment}-tenant-pool-refill"
+  description         = "Top up the pre-configured tenant bucket pool"
+  schedule_expression = var.bucket_pool_refill_schedule
+
+  tags = var.tags
+}
+
+resource "aws_cloudwatch_event_target" "pool_refill" {
+  count = local.pool_enabled ? 1 : 0
+
+  rule      = aws_cloudwatch_event_rule.pool_refill[0].name
+  target_id = "pool-refill-lambda"
+  arn       = aws_lambda_function.pool_refill[0].arn
+}
+
+resource "aws_lambda_permission" "pool_refill" {
+  count = local.pool_enabled ? 1 : 0
+
+  statement_id  = "AllowExecutionFromEventBridgePoolRefill"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.pool_refill[0].function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.pool_refill[0].arn
+}
+
 # ============================================================================
 # IAM Policy for Application to Publish Events
 # ============================================================================
@@ -18,6 +18,11 @@ output "lambda_function_arn" {
   value       = aws_lambda_function.provisioner.arn
 }
 
+output "fleet_audit_function_name" {
+  description = "Name of the tenant bucket fleet audit Lambda function"
+  value       = aws_lambda_function.fleet_audit.function_name
+}
+
 output "eventbridge_publisher_policy_arn" {
   description = "ARN of the IAM policy for publishing events"
   value       = aws_iam_policy.eventbridge_publisher.arn
@@ -28,3 +33,33 @@ output "tenant_bucket_prefix" {
   value       = local.tenant_bucket_prefix
 }
 
+
+output "provisioning_queue_arn" {
+  description = "ARN of the provisioning queue (batch mode only)"
+  value       = var.batch_mode_enabled ? aws_sqs_queue.provisioning[0].arn : null
+}
+
+output "provisioning_dlq_arn" {
+  description = "ARN of the provisioning dead-letter queue (batch mode only)"
+  value       = var.batch_mode_enabled ? aws_sqs_queue.provisioning_dlq[0].arn : null
+}
+
+output "pool_refill_function_name" {
+  description = "Name of the bucket pool refill Lambda function (bucket pool only)"
+  value       = local.pool_enabled ? aws_lambda_function.pool_refill[0].function_name : null
+}
+
+output "callback_outbox_queue_arn" {
+  description = "ARN of the callback outbox queue (callback outbox only)"
+  value       = var.callback_outbox_enabled ? aws_sqs_queue.callback_outbox[0].arn : null
+}
+
+output "callback_outbox_dlq_arn" {
+  description = "ARN of the callback outbox dead-letter queue (callback outbox only)"
+  value       = var.callback_outbox_enabled ? aws_sqs_queue.callback_outbox_dlq[0].arn : null
+}
+
+output "tenant_exports_bucket_name" {
+  description = "Name of the retention bucket holding tenant exports (tenant exports only)"
+  value       = var.tenant_export_enabled ? aws_s3_bucket.tenant_exports[0].bucket : null
+}
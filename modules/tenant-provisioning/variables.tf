@@ -23,12 +23,225 @@ variable "api_callback_secret_arn" {
   description = "ARN of the Secrets Manager secret containing the API callback token"
 }
 
+variable "api_token_ttl_seconds" {
+  type        = number
+  description = "How long the Lambda caches the API callback token between Secrets Manager reads"
+  default     = 300
+}
+
+variable "log_event_sample_rate" {
+  type        = number
+  description = "Fraction of provisioner invocations that log the full incoming event (0-1)"
+  default     = 0.05
+}
+
 variable "tenant_bucket_prefix" {
   type        = string
   description = "Prefix for tenant S3 buckets"
   default     = ""
 }
 
+variable "batch_mode_enabled" {
+  type        = bool
+  description = "Route tenant events through an SQS queue so the Lambda processes them in batches"
+  default     = false
+}
+
+variable "batch_size" {
+  type        = number
+  description = "Maximum number of queued tenant events per Lambda invocation in batch mode"
+  default     = 10
+}
+
+variable "batch_window_seconds" {
+  type        = number
+  description = "Maximum time to gather a batch of queued tenant events before invoking the Lambda"
+  default     = 5
+}
+
+variable "batch_concurrency" {
+  type        = number
+  description = "Number of tenant events processed in parallel within one batch"
+  default     = 5
+}
+
+variable "fleet_workers" {
+  type        = number
+  description = "Number of tenant buckets the fleet audit Lambda checks in parallel"
+  default     = 16
+}
+
+variable "bucket_pool_size" {
+  type        = number
+  description = "Number of pre-configured, unassigned tenant buckets kept ready for new tenants (0 disables the pool)"
+  default     = 0
+}
+
+variable "bucket_pool_refill_schedule" {
+  type        = string
+  description = "Schedule expression for topping up the tenant bucket pool"
+  default     = "rate(5 minutes)"
+}
+
+variable "idempotency_backend" {
+  type        = string
+  description = "Where completed tenant event outcomes are recorded to answer redeliveries: s3 (state bucket), memory (per container) or none"
+  default     = "s3"
+
+  validation {
+    condition     = contains(["s3", "memory", "none"], var.idempotency_backend)
+    error_message = "idempotency_backend must be s3, memory or none."
+  }
+}
+
+variable "idempotency_ttl_seconds" {
+  type        = number
+  description = "How long a completed tenant event outcome is kept for answering redeliveries"
+  default     = 86400
+}
+
+variable "callback_outbox_enabled" {
+  type        = bool
+  description = "Queue API callbacks and deliver them in batches to the bulk provisioning endpoint"
+  default     = false
+}
+
+variable "callback_outbox_batch_size" {
+  type        = number
+  description = "Maximum number of queued callbacks delivered in one bulk API request"
+  default     = 100
+}
+
+variable "callback_outbox_window_seconds" {
+  type        = number
+  description = "Maximum time to gather queued callbacks before delivering them"
+  default     = 5
+}
+
+variable "allowed_regions" {
+  type        = list(string)
+  description = "Additional regions tenants may choose for their bucket in TenantCreated (region is always allowed)"
+  default     = []
+}
+
+variable "storage_profile" {
+  type        = string
+  description = "Default storage profile of tenant buckets: intelligent_tiering, standard or archive_instant"
+  default     = "intelligent_tiering"
+
+  validation {
+    condition     = contains(["intelligent_tiering", "standard", "archive_instant"], var.storage_profile)
+    error_message = "storage_profile must be intelligent_tiering, standard or archive_instant."
+  }
+}
+
+variable "tier_storage_profiles" {
+  type        = map(string)
+  description = "Storage profile per tenant tier (TenantCreated detail.tier); other tiers get storage_profile"
+  default     = {}
+
+  validation {
+    condition     = alltrue([for profile in values(var.tier_storage_profiles) : contains(["intelligent_tiering", "standard", "archive_instant"], profile)])
+    error_message = "tier_storage_profiles values must be intelligent_tiering, standard or archive_instant."
+  }
+}
+
+variable "kms_encryption" {
+  type        = string
+  description = "Default encryption of tenant buckets: aes256 (SSE-S3), shared (SSE-KMS with kms_key_arns) or per_tenant (SSE-KMS with a key per tenant); KMS modes enable S3 Bucket Keys"
+  default     = "aes256"
+
+  validation {
+    condition     = contains(["aes256", "shared", "per_tenant"], var.kms_encryption)
+    error_message = "kms_encryption must be aes256, shared or per_tenant."
+  }
+}
+
+variable "kms_key_arns" {
+  type        = map(string)
+  description = "Shared KMS key ARN per region, used when kms_encryption is shared; needs a key for region and each of allowed_regions"
+  default     = {}
+
+  validation {
+    condition     = alltrue([for arn in values(var.kms_key_arns) : can(regex("^arn:aws[a-z-]*:kms:", arn))])
+    error_message = "kms_key_arns values must be KMS key ARNs."
+  }
+}
+
+variable "eventbridge_notifications" {
+  type        = bool
+  description = "Enable EventBridge delivery of object events on tenant buckets (feeds the malware scan rule of the s3 module)"
+  default     = true
+}
+
+variable "tenant_export_enabled" {
+  type        = bool
+  description = "Create a retention bucket for archives of departing tenants' objects, exported before their bucket is deleted"
+  default     = false
+}
+
+variable "tenant_export_on_delete" {
+  type        = bool
+  description = "Export every tenant on TenantDeleted (when tenant_export_enabled); events can override this with detail.export"
+  default     = true
+}
+
+variable "tenant_export_retention_days" {
+  type        = number
+  description = "Days tenant exports are kept in the retention bucket"
+  default     = 90
+
+  validation {
+    condition     = var.tenant_export_retention_days >= 1
+    error_message = "tenant_export_retention_days must be at least 1."
+  }
+}
+
+variable "s3_rate_limit_enabled" {
+  type        = bool
+  description = "Pace bucket-level S3 calls with adaptive per-API rate limits that back off on SlowDown"
+  default     = true
+}
+
+variable "s3_rate_limits" {
+  type        = map(number)
+  description = "Optional fixed ceilings in requests per second per S3 API family (bucket, bucket_config, bucket_read, delete_objects)"
+  default     = {}
+
+  validation {
+    condition     = alltrue([for family in keys(var.s3_rate_limits) : contains(["bucket", "bucket_config", "bucket_read", "delete_objects"], family)])
+    error_message = "s3_rate_limits keys must be bucket, bucket_config, bucket_read or delete_objects."
+  }
+}
+
+variable "profiling_sample_rate" {
+  type        = number
+  description = "Fraction of provisioner invocations profiled (wall/CPU stack samples and tracemalloc); 0 disables profiling"
+  default     = 0
+
+  validation {
+    condition     = var.profiling_sample_rate >= 0 && var.profiling_sample_rate <= 1
+    error_message = "profiling_sample_rate must be between 0 and 1."
+  }
+}
+
+variable "profiling_output" {
+  type        = string
+  description = "Where profiles go: log (compact summary in the log stream) or s3 (full profile under profiles/ in the state bucket)"
+  default     = "log"
+
+  validation {
+    condition     = contains(["log", "s3"], var.profiling_output)
+    error_message = "profiling_output must be log or s3."
+  }
+}
+
+variable "profile_retention_days" {
+  type        = number
+  description = "Days profiles written to the state bucket are kept"
+  default     = 14
+}
+
 variable "tags" {
   type        = map(string)
   description = "Tags to apply to resources"